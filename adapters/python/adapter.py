@@ -1,24 +1,205 @@
 import asyncio
 import websockets
 import json
+import os
 import sys
 import io
+import time
+import math
+import signal
+import hashlib
+import contextlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 
+try:
+    import resource  # POSIX only; memory limits are skipped without it
+except ImportError:
+    resource = None
+
+from unikernal import codec
+
 # -------------------------------
 # Configuration
 # -------------------------------
 KERNEL_URL = "ws://localhost:3000/ws?serviceId=python-python"
 ADAPTER_ID = "python-python"  # This must match the target you use from Node
 
+# Execution pool for `invoke` code
+EXEC_WORKERS = int(os.environ.get("PYTHON_EXEC_WORKERS", "0")) or (os.cpu_count() or 1)
+EXEC_TIME_LIMIT = float(os.environ.get("PYTHON_EXEC_TIMEOUT", "10"))         # seconds per snippet
+EXEC_MEMORY_LIMIT_MB = int(os.environ.get("PYTHON_EXEC_MEMORY_MB", "512"))   # address space per worker
+CODE_CACHE_SIZE = int(os.environ.get("PYTHON_EXEC_CACHE_SIZE", "256"))       # compiled snippets per worker
+STDOUT_CHUNK_SIZE = int(os.environ.get("PYTHON_EXEC_CHUNK_SIZE", str(64 * 1024)))
+EXEC_GRACE_SECONDS = 2.0  # parent-side backstop on top of the in-worker time limit
+
 
 def now_iso():
     return datetime.utcnow().isoformat() + "Z"
 
 
+# -------------------------------
+# Execution workers (run in child processes)
+# -------------------------------
+_code_cache = OrderedDict()  # sha256(source) -> code object, LRU order
+
+
+class ExecutionTimeout(BaseException):
+    """Raised by SIGALRM inside a worker; BaseException so snippets can't swallow it."""
+
+
+def _on_alarm(signum, frame):
+    raise ExecutionTimeout()
+
+
+def init_exec_worker(memory_limit_mb):
+    if resource is not None and memory_limit_mb > 0:
+        limit = memory_limit_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ValueError, OSError) as e:
+            print(f"[Python] Could not apply memory limit: {e}", file=sys.stderr)
+    if hasattr(signal, "SIGALRM"):
+        signal.signal(signal.SIGALRM, _on_alarm)
+
+
+def compile_cached(code: str):
+    key = hashlib.sha256(code.encode("utf-8")).hexdigest()
+    compiled = _code_cache.get(key)
+    if compiled is not None:
+        _code_cache.move_to_end(key)
+        return compiled, True
+
+    compiled = compile(code, f"<invoke:{key[:12]}>", "exec")
+    _code_cache[key] = compiled
+    if len(_code_cache) > CODE_CACHE_SIZE:
+        _code_cache.popitem(last=False)
+    return compiled, False
+
+
+def run_snippet(code: str, time_limit: float) -> dict:
+    """
+    Execute one snippet with its own stdout buffer and a wall-clock limit.
+    Runs in a pool process, so output never mixes with other snippets.
+    """
+    stdout_capture = io.StringIO()
+    exec_error = None
+    cache_hit = False
+    start = time.perf_counter()
+    use_alarm = time_limit > 0 and hasattr(signal, "setitimer")
+
+    try:
+        compiled, cache_hit = compile_cached(code)
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, time_limit)
+        try:
+            with contextlib.redirect_stdout(stdout_capture):
+                # Very basic exec – demo only, not secure for untrusted code
+                exec(compiled, {}, {})
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    except ExecutionTimeout:
+        exec_error = f"Execution exceeded time limit of {time_limit}s"
+    except MemoryError:
+        exec_error = "Execution exceeded memory limit"
+    except (Exception, SystemExit) as e:
+        exec_error = str(e)
+
+    return {
+        "stdout": stdout_capture.getvalue(),
+        "error": exec_error,
+        "cache_hit": cache_hit,
+        "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def failed_run(error: str) -> dict:
+    return {"stdout": "", "error": error, "cache_hit": False}
+
+
+class CodeExecutor:
+    """
+    Process pool for `invoke` snippets. A worker that blows through the
+    parent-side backstop (or dies) takes the pool down with it, so the
+    pool is rebuilt and the caller gets an error instead of a hang. Other
+    snippets queued or running on that pool get an error result as well.
+    """
+
+    def __init__(self, workers=EXEC_WORKERS, time_limit=EXEC_TIME_LIMIT, memory_limit_mb=EXEC_MEMORY_LIMIT_MB):
+        self.workers = workers
+        self.time_limit = time_limit
+        self.memory_limit_mb = memory_limit_mb
+        self.pool = self._new_pool()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=init_exec_worker,
+            initargs=(self.memory_limit_mb,),
+        )
+
+    def _recycle(self, old):
+        # Several callers can see the same broken pool; only the first rebuilds it
+        if old is not self.pool:
+            return
+        self.pool = self._new_pool()
+        for process in list(getattr(old, "_processes", {}).values()):
+            process.terminate()
+        old.shutdown(wait=False, cancel_futures=True)
+
+    def time_limit_for(self, requested) -> float:
+        """
+        A caller's `timeout` may lower the configured limit, never lift it.
+        Raises ValueError for anything but a positive number of seconds.
+        """
+        if requested is None:
+            return self.time_limit
+        try:
+            limit = float(requested)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid timeout {requested!r}: expected seconds") from None
+        if not math.isfinite(limit) or limit <= 0:
+            raise ValueError(f"Invalid timeout {requested!r}: must be greater than 0")
+        return min(limit, self.time_limit) if self.time_limit > 0 else limit
+
+    async def run(self, code: str, time_limit=None) -> dict:
+        try:
+            limit = self.time_limit_for(time_limit)
+        except ValueError as e:
+            return failed_run(str(e))
+
+        pool = self.pool
+        try:
+            future = asyncio.wrap_future(pool.submit(run_snippet, code, limit))
+            return await asyncio.wait_for(future, limit + EXEC_GRACE_SECONDS if limit > 0 else None)
+        except asyncio.TimeoutError:
+            self._recycle(pool)
+            return failed_run(f"Execution exceeded time limit of {limit}s")
+        except BrokenProcessPool:
+            if pool is not self.pool:
+                return failed_run("Execution worker pool was restarted after another snippet failed")
+            self._recycle(pool)
+            return failed_run("Execution worker crashed (memory limit or fatal error)")
+        except asyncio.CancelledError:
+            # Queued behind a snippet that got its pool recycled; our own
+            # cancellation (adapter shutdown) still propagates
+            if pool is self.pool:
+                raise
+            return failed_run("Execution worker pool was restarted after another snippet failed")
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
 class PythonAdapter:
     def __init__(self):
         self.ws = None
+        self.encoding = codec.JSON  # upgraded when the kernel acks register_adapter
+        self.executor = CodeExecutor()
+        self.tasks = set()
 
     async def connect(self):
         print(f"[Python] Connecting to Kernel at {KERNEL_URL}...")
@@ -42,6 +223,7 @@ class PythonAdapter:
                     "adapterId": ADAPTER_ID,
                     "capabilities": ["execute", "eval"],
                     "runtime": sys.version,
+                    "encodings": codec.supported_encodings(),
                 },
             })
 
@@ -62,21 +244,28 @@ class PythonAdapter:
 
             print("[Python] Waiting for envelopes from Kernel...")
 
-            # 3) Main receive loop – handle UDM v8 envelopes
+            # 3) Main receive loop – each envelope is handled in its own task,
+            #    so a slow snippet never blocks the socket
             async for raw in websocket:
-                await self.handle_envelope(raw)
+                task = asyncio.create_task(self.handle_envelope(raw))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
 
     async def send(self, envelope: dict):
-        text = json.dumps(envelope)
-        await self.ws.send(text)
-
-    async def handle_envelope(self, raw: str):
-        print("[Python] Received raw:", raw)
+        await self.ws.send(codec.encode(envelope, self.encoding))
 
+    async def handle_envelope(self, raw):
         try:
-            envelope = json.loads(raw)
+            envelope = codec.decode(raw)
         except Exception as e:
-            print("[Python] Failed to parse JSON:", e)
+            print("[Python] Failed to decode envelope:", e)
+            return
+
+        if envelope.get("action") == "register_adapter_ack":
+            self.encoding = envelope.get("encoding") or codec.JSON
+            if self.encoding not in codec.supported_encodings():
+                self.encoding = codec.JSON
+            print(f"[Python] Registered; using {self.encoding} encoding")
             return
 
         intent = envelope.get("intent")
@@ -102,23 +291,30 @@ class PythonAdapter:
             return
 
         print(f"[Python] Executing code for trace_id={trace_id} from {source}...")
-        stdout_capture = io.StringIO()
-        exec_error = None
-
-        try:
-            # Capture stdout
-            old_stdout = sys.stdout
-            sys.stdout = stdout_capture
-
-            # Very basic exec – demo only, not secure for untrusted code
-            exec(code, {}, {})
-
-        except Exception as e:
-            exec_error = str(e)
-        finally:
-            sys.stdout = old_stdout
+        result = await self.executor.run(code, payload.get("timeout"))
+        exec_error = result["error"]
+        output = result["stdout"]
 
-        output = stdout_capture.getvalue()
+        # Large outputs go out as ordered chunks ahead of the final response
+        chunks = 0
+        if len(output) > STDOUT_CHUNK_SIZE:
+            for offset in range(0, len(output), STDOUT_CHUNK_SIZE):
+                await self.send({
+                    "version": "8.0",
+                    "source": ADAPTER_ID,
+                    "target": source,
+                    "intent": "response_chunk",
+                    "meta": {
+                        "timestamp": now_iso(),
+                        "trace_id": trace_id,
+                    },
+                    "payload": {
+                        "index": chunks,
+                        "stdout": output[offset:offset + STDOUT_CHUNK_SIZE],
+                    },
+                })
+                chunks += 1
+            output = None
 
         # Build UDM v8 response envelope
         reply = {
@@ -135,13 +331,14 @@ class PythonAdapter:
                 "language": "python",
                 "runtime": sys.version,
                 "stdout": output,
+                "stdout_chunks": chunks,
                 "error": exec_error,
-                "original_code": code,
+                "cache_hit": result["cache_hit"],
+                "duration_ms": result.get("duration_ms"),
             },
         }
 
-        print("[Python] Sending response envelope:")
-        print(json.dumps(reply, indent=2))
+        print(f"[Python] Responding to trace_id={trace_id} status={reply['payload']['status']}")
 
         try:
             await self.send(reply)
@@ -155,3 +352,5 @@ if __name__ == "__main__":
         asyncio.run(adapter.connect())
     except KeyboardInterrupt:
         print("[Python] Stopped")
+    finally:
+        adapter.executor.shutdown()
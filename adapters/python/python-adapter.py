@@ -1,7 +1,122 @@
+import os
+import re
 import sys
 import json
 import time
-from typing import Dict, Any, List
+import array
+import mmap
+import base64
+import asyncio
+import inspect
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait as futures_wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from functools import partial
+from typing import Dict, Any, List, Callable, Optional
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; batch math falls back to pure Python
+    np = None
+
+
+# Number of tasks the adapter may execute at the same time.
+MAX_CONCURRENCY = int(os.environ.get("PYTHON_ADAPTER_CONCURRENCY", "0")) or min(32, (os.cpu_count() or 1) + 4)
+
+# Number of processes used for CPU-bound handlers. The kernel's PythonWorkerPool
+# sets this per worker (cores / workers), so a pool does not start cores x cores.
+MAX_PROCESSES = int(os.environ.get("PYTHON_ADAPTER_PROCESSES", "0")) or (os.cpu_count() or 1)
+
+
+# ========= TASK HANDLER REGISTRY =========
+
+# How a handler is scheduled by the adapter's main loop
+INLINE = "inline"  # cheap: runs on the reader thread, no hand-off
+IO = "io"          # blocking I/O: thread pool, or the asyncio loop for coroutines
+CPU = "cpu"        # CPU-bound: process pool, so it never holds the GIL of the reader
+
+HANDLER_KINDS = (INLINE, IO, CPU)
+
+# Comma-separated modules to import for extra handlers, plus an entry-point group.
+# A plugin exposes `register(registry)`; an entry point names that callable directly.
+PLUGIN_MODULES_ENV = "PYTHON_ADAPTER_PLUGINS"
+PLUGIN_ENTRY_POINT_GROUP = "unikernal.python_adapter.tasks"
+
+
+@dataclass(frozen=True)
+class TaskHandler:
+    name: str
+    func: Callable[[Dict[str, Any]], Any]
+    kind: str = INLINE
+
+    @property
+    def is_async(self) -> bool:
+        return inspect.iscoroutinefunction(self.func)
+
+
+class TaskRegistry:
+    """
+    Maps task_name -> TaskHandler. Plugins are imported lazily, the first
+    time a task name is not found among the built-in handlers.
+    """
+
+    def __init__(self):
+        self.handlers: Dict[str, TaskHandler] = {}
+        self.plugins_loaded = False
+        self.lock = threading.Lock()
+
+    def register(self, name: str, func: Callable, kind: str = INLINE) -> TaskHandler:
+        if kind not in HANDLER_KINDS:
+            raise ValueError(f"Unknown handler kind '{kind}' for task {name}")
+        handler = TaskHandler(name, func, kind)
+        self.handlers[name] = handler
+        return handler
+
+    def task(self, name: str, kind: str = INLINE):
+        """Decorator form of register()."""
+        def decorator(func):
+            self.register(name, func, kind)
+            return func
+        return decorator
+
+    def get(self, name: Optional[str]) -> Optional[TaskHandler]:
+        handler = self.handlers.get(name)
+        if handler is None and not self.plugins_loaded:
+            self.load_plugins()
+            handler = self.handlers.get(name)
+        return handler
+
+    def load_plugins(self) -> None:
+        with self.lock:
+            if self.plugins_loaded:
+                return
+            self.plugins_loaded = True
+
+            for module_name in filter(None, (m.strip() for m in os.environ.get(PLUGIN_MODULES_ENV, "").split(","))):
+                try:
+                    module = importlib.import_module(module_name)
+                    if hasattr(module, "register"):
+                        module.register(self)
+                except Exception as e:
+                    print(f"[PYTHON ADAPTER] Failed to load plugin {module_name}: {e}", file=sys.stderr, flush=True)
+
+            try:
+                from importlib.metadata import entry_points
+                eps = entry_points()
+                group = eps.select(group=PLUGIN_ENTRY_POINT_GROUP) if hasattr(eps, "select") else eps.get(PLUGIN_ENTRY_POINT_GROUP, [])
+            except Exception:
+                group = []
+            for ep in group:
+                try:
+                    ep.load()(self)
+                except Exception as e:
+                    print(f"[PYTHON ADAPTER] Failed to load entry point {ep.name}: {e}", file=sys.stderr, flush=True)
+
+
+registry = TaskRegistry()
+task = registry.task
 
 
 # ========= LIST-BASED MATH HELPERS =========
@@ -66,6 +181,8 @@ def handle_list_math(task_name: str, data: Dict[str, Any]) -> Dict[str, Any]:
 
     # Normalize to float list
     try:
+        if "shm" in data:
+            values = read_shared_buffer(data["shm"], data.get("dtype", "float64"))
         values = [float(v) for v in values]
     except Exception:
         return {
@@ -73,25 +190,8 @@ def handle_list_math(task_name: str, data: Dict[str, Any]) -> Dict[str, Any]:
             "error": "Inputs must be numeric"
         }
 
-    if task_name == "math.sum":
-        result = math_sum(values)
-        op = "sum"
-    elif task_name == "math.product":
-        result = math_product(values)
-        op = "product"
-    elif task_name == "math.average":
-        result = math_average(values)
-        op = "average"
-    elif task_name == "math.min":
-        result = math_min(values)
-        op = "min"
-    elif task_name == "math.max":
-        result = math_max(values)
-        op = "max"
-    elif task_name == "math.subtract":
-        result = math_subtract(values)
-        op = "subtract"
-    elif task_name == "math.divide":
+    op = task_name[len("math."):] if task_name else ""
+    if op == "divide":
         div_result = math_divide(values)
         if div_result.get("status") == "error":
             return {
@@ -100,25 +200,293 @@ def handle_list_math(task_name: str, data: Dict[str, Any]) -> Dict[str, Any]:
                 "error": div_result["error"]
             }
         result = div_result["result"]
-        op = "divide"
+    elif op in LIST_MATH_HELPERS:
+        result = LIST_MATH_HELPERS[op](values)
     else:
         return {
             "status": "error",
             "error": f"Unknown math task_name: {task_name}"
         }
 
-    return {
+    response = {
         "status": "ok",
         "kind": "list",
         "operation": op,
-        "inputs": values,
         "result": result,
         "executed_by": "python-adapter"
     }
+    if data.get("include_inputs", True):
+        response["inputs"] = values
+    return response
+
+
+# ========= BATCH (VECTORIZED) MATH =========
+
+BATCH_OPERATIONS = ("sum", "product", "average", "min", "max", "subtract", "divide")
+
+# dtype name -> array.array typecode for the pure-Python buffer decoder
+BUFFER_DTYPES = {
+    "float64": "d",
+    "float32": "f",
+    "int32": "i",
+    "int64": "q",
+    "uint8": "B",
+}
+
+
+def buffer_values(raw, dtype: str):
+    """
+    Interpret little-endian packed bytes (bytes, mmap or memoryview) as numbers.
+    Returns a NumPy view when NumPy is available, else a float list.
+    """
+    if dtype not in BUFFER_DTYPES:
+        raise ValueError(f"Unsupported buffer dtype: {dtype}")
+
+    if np is not None:
+        # Integer buffers are widened so products don't overflow; float64 stays zero-copy
+        return np.frombuffer(raw, dtype=np.dtype(dtype).newbyteorder("<")).astype(np.float64, copy=False)
+
+    values = array.array(BUFFER_DTYPES[dtype])
+    values.frombytes(raw)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return [float(v) for v in values]
+
+
+def decode_buffer(encoded: str, dtype: str):
+    """Decode a base64, little-endian packed numeric buffer."""
+    return buffer_values(base64.b64decode(encoded), dtype)
+
+
+# Shared-memory rings mapped by this process, keyed by path. The kernel
+# (SharedPayloadRing.js) owns the file; a mapping lives as long as the worker.
+SHARED_RINGS: Dict[str, mmap.mmap] = {}
+SHARED_RINGS_LOCK = threading.Lock()
+
+
+def shared_ring(path: str) -> mmap.mmap:
+    ring = SHARED_RINGS.get(path)
+    if ring is None:
+        with SHARED_RINGS_LOCK:
+            ring = SHARED_RINGS.get(path)
+            if ring is None:
+                with open(path, "rb") as f:
+                    ring = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                SHARED_RINGS[path] = ring
+    return ring
+
+
+def read_shared_buffer(handle: Dict[str, Any], dtype: str):
+    """
+    Map a {path, offset, length} shared-memory handle sent by the kernel.
+    With NumPy the result is a view into the ring (no copy); it must not be
+    kept after the reply, since the kernel reuses the region.
+    """
+    ring = shared_ring(handle["path"])
+    offset, length = int(handle["offset"]), int(handle["length"])
+    if offset < 0 or offset + length > len(ring):
+        raise ValueError(f"Shared buffer [{offset}, {offset + length}) is outside the ring")
+    return buffer_values(memoryview(ring)[offset:offset + length], dtype)
+
+
+def batch_vectors(data: Dict[str, Any]):
+    """
+    Build the list of input vectors for a batch task from either
+    `vectors` (list of number lists), `inputs` (one number list) or
+    `buffer` / `shm` + `dtype` (+ optional `shape: [rows, cols]` or `lengths`).
+    """
+    if "buffer" in data or "shm" in data:
+        if "shm" in data:
+            flat = read_shared_buffer(data["shm"], data.get("dtype", "float64"))
+        else:
+            flat = decode_buffer(data["buffer"], data.get("dtype", "float64"))
+        shape = data.get("shape")
+        lengths = data.get("lengths")
+        if shape:
+            rows, cols = int(shape[0]), int(shape[1])
+            if rows * cols != len(flat):
+                raise ValueError(f"Buffer holds {len(flat)} values, shape {rows}x{cols} needs {rows * cols}")
+            if np is not None:
+                return flat.reshape(rows, cols)
+            return [flat[r * cols:(r + 1) * cols] for r in range(rows)]
+        if lengths:
+            if sum(lengths) != len(flat):
+                raise ValueError(f"Buffer holds {len(flat)} values, lengths add up to {sum(lengths)}")
+            vectors, offset = [], 0
+            for n in lengths:
+                vectors.append(flat[offset:offset + n])
+                offset += n
+            return vectors
+        return [flat]
+
+    if "vectors" in data:
+        raw_vectors = data["vectors"]
+    else:
+        raw_vectors = [data.get("inputs", [])]
+
+    if np is not None:
+        vectors = [np.asarray(v, dtype=np.float64) for v in raw_vectors]
+        lengths = {len(v) for v in vectors}
+        if len(vectors) > 1 and len(lengths) == 1 and 0 not in lengths:
+            return np.stack(vectors)
+        return vectors
+    return [[float(x) for x in v] for v in raw_vectors]
+
+
+def batch_numpy(vectors, operations: List[str]) -> List[Dict[str, Any]]:
+    """
+    NumPy path. A 2-D array is reduced along axis 1 so every vector is
+    handled by one ufunc call per operation.
+    """
+    matrix = vectors if isinstance(vectors, np.ndarray) and vectors.ndim == 2 else None
+    groups = [matrix] if matrix is not None else [v.reshape(1, -1) for v in vectors]
+
+    results = []
+    for group in groups:
+        rows, length = group.shape
+        columns: Dict[str, Any] = {}
+        errors: List[Dict[str, str]] = [{} for _ in range(rows)]
+
+        if length == 0:
+            empty = {"sum": 0, "product": 1, "average": 0, "min": 0, "max": 0, "subtract": 0}
+            for op in operations:
+                if op == "divide":
+                    columns[op] = [None] * rows
+                    for e in errors:
+                        e[op] = "No values provided for division"
+                else:
+                    columns[op] = [empty[op]] * rows
+        else:
+            for op in operations:
+                if op == "sum":
+                    columns[op] = group.sum(axis=1)
+                elif op == "product":
+                    columns[op] = group.prod(axis=1)
+                elif op == "average":
+                    columns[op] = group.mean(axis=1)
+                elif op == "min":
+                    columns[op] = group.min(axis=1)
+                elif op == "max":
+                    columns[op] = group.max(axis=1)
+                elif op == "subtract":
+                    columns[op] = np.subtract.reduce(group, axis=1)
+                elif op == "divide":
+                    zero_rows = (group[:, 1:] == 0).any(axis=1)
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        quotient = np.divide.reduce(group, axis=1)
+                    columns[op] = [None if z else q for z, q in zip(zero_rows.tolist(), quotient.tolist())]
+                    for row in np.flatnonzero(zero_rows).tolist():
+                        errors[row][op] = "Division by zero"
+
+        for row in range(rows):
+            entry = {"length": int(length)}
+            for op in operations:
+                value = columns[op][row]
+                entry[op] = None if value is None else float(value)
+            if errors[row]:
+                entry["errors"] = errors[row]
+            results.append(entry)
+    return results
+
+
+def batch_python(vectors, operations: List[str]) -> List[Dict[str, Any]]:
+    """Pure-Python fallback used when NumPy is not installed."""
+    results = []
+    for values in vectors:
+        entry: Dict[str, Any] = {"length": len(values)}
+        for op in operations:
+            if op == "divide":
+                div_result = math_divide(values)
+                if div_result["status"] == "error":
+                    entry[op] = None
+                    entry.setdefault("errors", {})[op] = div_result["error"]
+                else:
+                    entry[op] = div_result["result"]
+            else:
+                entry[op] = LIST_MATH_HELPERS[op](values)
+        results.append(entry)
+    return results
+
+
+@task("math.batch", kind=CPU)
+def handle_batch_math(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Vectorized batch task:
+    {
+        "task_name": "math.batch",
+        "data": {
+            "vectors": [[1, 2, 3], [4, 5, 6]],     # or "inputs": [...]
+            # or "buffer": "<base64>", "dtype": "float64", "shape": [2, 3]
+            # or "shm": {"path", "offset", "length"} in place of "buffer"
+            "operations": ["sum", "max"],          # default: all
+            "include_inputs": false                # default: false
+        }
+    }
+    """
+    operations = data.get("operations") or list(BATCH_OPERATIONS)
+    unknown = [op for op in operations if op not in BATCH_OPERATIONS]
+    if unknown:
+        return {
+            "status": "error",
+            "error": f"Unknown batch operations: {', '.join(map(str, unknown))}"
+        }
+
+    try:
+        vectors = batch_vectors(data)
+        if np is not None:
+            results = batch_numpy(vectors, operations)
+        else:
+            results = batch_python(vectors, operations)
+    except (TypeError, ValueError) as e:
+        return {
+            "status": "error",
+            "error": f"Invalid batch inputs: {e}"
+        }
+
+    response = {
+        "status": "ok",
+        "kind": "batch",
+        "operations": operations,
+        "count": len(results),
+        "results": results,
+        "backend": "numpy" if np is not None else "python",
+        "executed_by": "python-adapter"
+    }
+    if data.get("include_inputs", False):
+        response["inputs"] = [list(map(float, v)) for v in vectors]
+    return response
+
+
+LIST_MATH_HELPERS = {
+    "sum": math_sum,
+    "product": math_product,
+    "average": math_average,
+    "min": math_min,
+    "max": math_max,
+    "subtract": math_subtract,
+}
+
+for _op in (*LIST_MATH_HELPERS, "divide"):
+    registry.register(f"math.{_op}", partial(handle_list_math, f"math.{_op}"))
 
 
 # ========= CALCULATOR (a, b, op) =========
 
+# op alias -> (function, error message when b == 0 or None)
+CALC_OPERATORS = {}
+for _aliases, _func, _zero_error in (
+    (("add", "+"), lambda a, b: a + b, None),
+    (("sub", "-"), lambda a, b: a - b, None),
+    (("mul", "*", "x"), lambda a, b: a * b, None),
+    (("div", "/", "÷"), lambda a, b: a / b, "Division by zero"),
+    (("mod", "%"), lambda a, b: a % b, "Modulo by zero"),
+    (("pow", "^"), lambda a, b: a ** b, None),
+):
+    for _alias in _aliases:
+        CALC_OPERATORS[_alias] = (_func, _zero_error)
+
+
+@task("calc.binary")
 def handle_calculator_task(data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Calculator-style task:
@@ -144,34 +512,21 @@ def handle_calculator_task(data: Dict[str, Any]) -> Dict[str, Any]:
             "error": "Calculator inputs a and b must be numeric"
         }
 
-    if op in ("add", "+"):
-        result = a + b
-    elif op in ("sub", "-"):
-        result = a - b
-    elif op in ("mul", "*", "x"):
-        result = a * b
-    elif op in ("div", "/", "÷"):
-        if b == 0:
-            return {
-                "status": "error",
-                "error": "Division by zero"
-            }
-        result = a / b
-    elif op in ("mod", "%"):
-        if b == 0:
-            return {
-                "status": "error",
-                "error": "Modulo by zero"
-            }
-        result = a % b
-    elif op in ("pow", "^"):
-        result = a ** b
-    else:
+    operator = CALC_OPERATORS.get(op)
+    if operator is None:
         return {
             "status": "error",
             "error": f"Unknown calculator operator: {op}"
         }
 
+    func, zero_error = operator
+    if zero_error and b == 0:
+        return {
+            "status": "error",
+            "error": zero_error
+        }
+    result = func(a, b)
+
     return {
         "status": "ok",
         "kind": "calc",
@@ -186,62 +541,224 @@ def handle_calculator_task(data: Dict[str, Any]) -> Dict[str, Any]:
 
 # ========= MAIN TASK ROUTER =========
 
-def handle_task(udm: Dict[str, Any]) -> Dict[str, Any]:
-    start_time = time.time()
-    
-    task_name = udm.get("task_name")
-    data = udm.get("data", {})
-
-    response = {}
-
-    # list math
+def unknown_task(task_name: Optional[str]) -> Dict[str, Any]:
     if task_name and task_name.startswith("math."):
-        response = handle_list_math(task_name, data)
-    # calculator mode
-    elif task_name == "calc.binary":
-        response = handle_calculator_task(data)
-    else:
-        response = {
+        return {
             "status": "error",
-            "error": f"Unknown task_name: {task_name}"
+            "error": f"Unknown math task_name: {task_name}"
         }
+    return {
+        "status": "error",
+        "error": f"Unknown task_name: {task_name}"
+    }
 
+
+def finalize_response(response: Dict[str, Any], start_time: float) -> Dict[str, Any]:
     # Add v3 metadata
     duration_ms = (time.time() - start_time) * 1000
-    
+
     # Ensure standard fields
     if "executed_by" not in response:
         response["executed_by"] = "python-adapter"
-    
+
     response["meta"] = {
         "duration_ms": round(duration_ms, 2),
         "adapter_version": "3.0.0"
     }
-    
+
     return response
 
 
+def handle_task(udm: Dict[str, Any]) -> Dict[str, Any]:
+    start_time = time.time()
+
+    task_name = udm.get("task_name")
+    data = udm.get("data", {})
+
+    handler = registry.get(task_name)
+    if handler is None:
+        response = unknown_task(task_name)
+    elif handler.is_async:
+        response = asyncio.run(handler.func(data))
+    else:
+        response = handler.func(data)
+
+    return finalize_response(response, start_time)
+
+
+async def handle_task_async(udm: Dict[str, Any], handler: TaskHandler) -> Dict[str, Any]:
+    start_time = time.time()
+    response = await handler.func(udm.get("data", {}))
+    return finalize_response(response, start_time)
+
+
+# Request id of a frame that is not valid JSON; the kernel writes it first
+FRAME_ID_PATTERN = re.compile(r'"id"\s*:\s*("(?:[^"\\]|\\.)*"|-?\d+)')
+
+
+def frame_id(line: str) -> Any:
+    """Best-effort request id of an unparseable frame, or None if there is none."""
+    match = FRAME_ID_PATTERN.search(line)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(1))
+    except ValueError:
+        return None
+
+
+def error_response(e: BaseException) -> Dict[str, Any]:
+    return {
+        "status": "error",
+        "error": f"Unhandled adapter error: {e}",
+        "executed_by": "python-adapter"
+    }
+
+
+class ReplyWriter:
+    """
+    Serializes reply frames onto stdout. Replies are produced by several
+    worker threads at once, so every line is written under one lock.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def write(self, frame: Dict[str, Any]) -> None:
+        line = json.dumps(frame) + "\n"
+        with self.lock:
+            self.stream.write(line)
+            self.stream.flush()
+
+
+class TaskScheduler:
+    """
+    Runs each framed request according to its handler's declared kind:
+    inline on the reader thread, on the thread pool / asyncio loop for I/O,
+    or on the process pool for CPU-bound work. Executors start lazily.
+    """
+
+    def __init__(self, writer: ReplyWriter):
+        self.writer = writer
+        self.threads = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY)
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_pending = set()
+
+    @property
+    def processes(self) -> ProcessPoolExecutor:
+        if self._processes is None:
+            self._processes = ProcessPoolExecutor(max_workers=MAX_PROCESSES)
+        return self._processes
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, name="adapter-asyncio", daemon=True).start()
+        return self._loop
+
+    def reply(self, request_id: Any, response: Dict[str, Any]) -> None:
+        self.writer.write({"id": request_id, "response": response})
+
+    def reply_when_done(self, request_id: Any, future) -> None:
+        def done(f):
+            try:
+                response = f.result()
+            except Exception as e:
+                response = error_response(e)
+            self.reply(request_id, response)
+        future.add_done_callback(done)
+
+    def submit(self, request_id: Any, udm: Dict[str, Any]) -> None:
+        # Runs on the reader thread: whatever goes wrong becomes this request's reply
+        try:
+            if not isinstance(udm, dict):
+                raise TypeError(f"udm must be an object, not {type(udm).__name__}")
+            self.dispatch(request_id, udm)
+        except Exception as e:
+            self.reply(request_id, error_response(e))
+
+    def dispatch(self, request_id: Any, udm: Dict[str, Any]) -> None:
+        handler = registry.get(udm.get("task_name"))
+
+        if handler is None or handler.kind == INLINE and not handler.is_async:
+            try:
+                response = handle_task(udm)
+            except Exception as e:
+                response = error_response(e)
+            self.reply(request_id, response)
+        elif handler.kind == CPU:
+            try:
+                future = self.processes.submit(handle_task, udm)
+            except BrokenProcessPool:
+                # A pool process died (crash, OOM kill); replace the pool
+                broken, self._processes = self._processes, None
+                broken.shutdown(wait=False)
+                future = self.processes.submit(handle_task, udm)
+            self.reply_when_done(request_id, future)
+        elif handler.is_async:
+            future = asyncio.run_coroutine_threadsafe(handle_task_async(udm, handler), self.loop)
+            self._async_pending.add(future)
+            future.add_done_callback(self._async_pending.discard)
+            self.reply_when_done(request_id, future)
+        else:
+            self.reply_when_done(request_id, self.threads.submit(handle_task, udm))
+
+    def shutdown(self) -> None:
+        self.threads.shutdown(wait=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=True)
+        if self._loop is not None:
+            futures_wait(list(self._async_pending))
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+
 def main():
     # IMPORTANT: log to stderr, JSON to stdout
     print("[PYTHON ADAPTER] Started and waiting for tasks...", file=sys.stderr, flush=True)
 
-    for line in sys.stdin:
-        line = line.strip()
-        if not line:
-            continue
-
-        try:
-            udm = json.loads(line)
-        except json.JSONDecodeError as e:
-            print(json.dumps({
-                "status": "error",
-                "error": f"Invalid JSON: {e}"
-            }), flush=True)
-            continue
+    writer = ReplyWriter(sys.stdout)
+    scheduler = TaskScheduler(writer)
 
-        response = handle_task(udm)
-        print(json.dumps(response), flush=True)
+    # Framed requests ({"id": ..., "udm": ...}) are scheduled by handler kind and
+    # may be answered out of order; bare UDM lines keep the old inline behaviour.
+    try:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                frame = json.loads(line)
+            except json.JSONDecodeError as e:
+                error = {"status": "error", "error": f"Invalid JSON: {e}"}
+                request_id = frame_id(line)
+                if request_id is not None:
+                    writer.write({"id": request_id, "response": error})
+                else:
+                    # Nothing to correlate: the caller (if any) is released by its timeout
+                    print(f"[PYTHON ADAPTER] Unreadable frame without a request id: {line[:200]}",
+                          file=sys.stderr, flush=True)
+                    writer.write(error)
+                continue
+
+            if isinstance(frame, dict) and "id" in frame and "udm" in frame:
+                scheduler.submit(frame["id"], frame["udm"] or {})
+            else:
+                try:
+                    response = handle_task(frame)
+                except Exception as e:
+                    response = error_response(e)
+                writer.write(response)
+    finally:
+        scheduler.shutdown()
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except (BrokenPipeError, KeyboardInterrupt):
+        # Kernel closed our pipes (shutdown or worker recycle)
+        pass
@@ -8,4 +8,8 @@ setup(
         "requests",
         "websockets",
     ],
+    extras_require={
+        "async": ["aiohttp"],
+        "msgpack": ["msgpack"],
+    },
 )
@@ -1,2 +1,2 @@
-from .client import UnikernalClient
+from .client import UnikernalClient, UnikernalError
 from .config import Config
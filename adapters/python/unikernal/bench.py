@@ -0,0 +1,333 @@
+"""
+Load generator and latency benchmark for the kernel's Python paths.
+
+Drives a configurable mix of tasks over HTTP or WebSocket with a fixed
+number of in-flight requests, then reports latency percentiles,
+throughput and kernel memory as a JSON-serializable dict.
+
+Python API:
+
+    from unikernal.bench import run_benchmark
+    result = run_benchmark(transport="ws", concurrency=64, duration=10,
+                           mix={"math.sum": 3, "calc.binary": 1}, start_kernel=True)
+
+Command line (also available as `unikernal bench ...`):
+
+    python -m unikernal.bench --transport http --concurrency 32 --duration 10 \
+        --mix math.sum=3,calc.binary=1,echo-service=1 --start-kernel --output run.json
+    python -m unikernal.bench ... --compare baseline.json --tolerance 0.1
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+import urllib.request
+from urllib.parse import urlsplit, urlunsplit
+
+from .client import UnikernalClient, UnikernalError
+from .config import Config
+
+# Task kinds accepted in a mix. Any "math.<op>" name is accepted as well.
+TASK_KINDS = ("math.sum", "math.product", "math.average", "math.min", "math.max",
+              "math.subtract", "math.divide", "math.batch", "calc.binary", "echo-service", "invoke")
+
+DEFAULT_MIX = {"math.sum": 2, "calc.binary": 2, "echo-service": 1}
+
+# Target ids the tasks are routed to
+PYTHON_ADAPTER_TARGET = "python-adapter"   # kernel/src/pythonAdapter.js worker pool
+INVOKE_TARGET = "python-python"            # adapters/python/adapter.py
+
+KERNEL_SCRIPT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "kernel", "src", "server.js"))
+
+
+def build_task(kind, size, rng):
+    """
+    Return (target, intent, payload) for one task of the given kind.
+    `size` is the number of numeric inputs (math) or bytes of text (echo).
+    """
+    if kind.startswith("math."):
+        inputs = [rng.uniform(1, 100) for _ in range(max(1, size))]
+        return PYTHON_ADAPTER_TARGET, "invoke", {
+            "task_name": kind,
+            "data": {"inputs": inputs, "include_inputs": False},
+        }
+    if kind == "calc.binary":
+        return PYTHON_ADAPTER_TARGET, "invoke", {
+            "task_name": "calc.binary",
+            "data": {"op": rng.choice(("add", "sub", "mul", "div")), "a": rng.uniform(1, 100), "b": rng.uniform(1, 100)},
+        }
+    if kind == "echo-service":
+        return "echo-service", "invoke", {"message": "x" * size}
+    if kind == "invoke":
+        return INVOKE_TARGET, "invoke", {"code": "print(sum(range(100)))"}
+    raise ValueError(f"Unknown task kind: {kind}")
+
+
+def parse_mix(text):
+    """
+    Parse "math.sum=3,calc.binary=1" into {"math.sum": 3.0, "calc.binary": 1.0}.
+    """
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in TASK_KINDS and not name.startswith("math."):
+            raise ValueError(f"Unknown task kind in mix: {name}")
+        mix[name] = float(weight) if weight else 1.0
+    return mix
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies_ms):
+    values = sorted(latencies_ms)
+
+    def ms(value):
+        return round(value, 3) if value is not None else None
+
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values), 3) if values else None,
+        "p50_ms": ms(percentile(values, 0.50)),
+        "p99_ms": ms(percentile(values, 0.99)),
+        "p999_ms": ms(percentile(values, 0.999)),
+        "max_ms": ms(values[-1] if values else None),
+    }
+
+
+def _health_url(http_url):
+    parts = urlsplit(http_url)
+    return urlunsplit((parts.scheme, parts.netloc, "/health", "", ""))
+
+
+def kernel_rss_bytes(http_url, timeout=2.0):
+    """
+    Resident set size reported by the kernel's /health endpoint, or None.
+    """
+    try:
+        with urllib.request.urlopen(_health_url(http_url), timeout=timeout) as response:
+            return json.loads(response.read()).get("memory", {}).get("rss")
+    except Exception:
+        return None
+
+
+def start_local_kernel(port, script=KERNEL_SCRIPT, wait=15.0):
+    """
+    Start `node kernel/src/server.js` on `port` and wait until /health answers.
+    Returns the Popen handle; the caller terminates it.
+    """
+    env = dict(os.environ, PORT=str(port))
+    process = subprocess.Popen(["node", script], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    http_url = f"http://127.0.0.1:{port}/udl"
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Kernel exited during startup with code {process.returncode}")
+        if kernel_rss_bytes(http_url, timeout=0.5) is not None:
+            return process
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Kernel did not become healthy on port {port} within {wait}s")
+
+
+def _is_error(reply):
+    if not isinstance(reply, dict):
+        return True
+    payload = reply.get("payload") if isinstance(reply.get("payload"), dict) and "intent" in reply else reply
+    return bool(payload.get("error")) or payload.get("status") == "error"
+
+
+async def _drive(client, transport, mix, concurrency, duration, requests, size, timeout, seed):
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    rng = random.Random(seed)
+
+    latencies = {kind: [] for kind in kinds}
+    errors = {kind: 0 for kind in kinds}
+    issued = 0
+    deadline = time.perf_counter() + duration if duration else None
+
+    def next_kind():
+        nonlocal issued
+        if requests is not None and issued >= requests:
+            return None
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        issued += 1
+        return rng.choices(kinds, weights)[0]
+
+    async def worker():
+        while True:
+            kind = next_kind()
+            if kind is None:
+                return
+            target, intent, payload = build_task(kind, size, rng)
+            start = time.perf_counter()
+            try:
+                if transport == "ws":
+                    reply = await client.call(target, intent, payload, timeout=timeout)
+                else:
+                    reply = await client.post_udl_async(client.create_message(target, intent, payload), timeout=timeout)
+                failed = _is_error(reply)
+            except (UnikernalError, asyncio.TimeoutError):
+                failed = True
+            latencies[kind].append((time.perf_counter() - start) * 1000)
+            if failed:
+                errors[kind] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def run_benchmark_async(transport="http", concurrency=16, duration=10.0, requests=None,
+                              mix=None, size=16, timeout=10.0, http_url=None, ws_url=None,
+                              start_kernel=False, port=3900, seed=None):
+    """
+    Run one benchmark and return the result dict. With `start_kernel`, a
+    kernel is started on `port` for the duration of the run.
+    """
+    if transport not in ("http", "ws"):
+        raise ValueError("transport must be 'http' or 'ws'")
+    mix = mix or dict(DEFAULT_MIX)
+    if not duration and requests is None:
+        raise ValueError("Set a duration or a request count")
+
+    kernel = None
+    if start_kernel:
+        kernel = start_local_kernel(port)
+        http_url = f"http://127.0.0.1:{port}/udl"
+        ws_url = f"ws://127.0.0.1:{port}/ws"
+    http_url = http_url or Config.KERNEL_HTTP_URL
+    ws_url = ws_url or Config.KERNEL_WS_URL
+
+    client = UnikernalClient(http_url=http_url, ws_url=ws_url,
+                             service_id=f"bench-{os.getpid()}", max_retries=0,
+                             pool_size=max(concurrency, Config.HTTP_POOL_SIZE))
+    try:
+        if transport == "ws":
+            await client.connect_ws(auto_reconnect=False)
+            if client.ws is None:
+                raise RuntimeError(f"Could not connect to {ws_url}")
+            client.set_on_message(lambda message: None)
+
+        rss_before = kernel_rss_bytes(http_url)
+        latencies, errors, elapsed = await _drive(client, transport, mix, concurrency,
+                                                  duration, requests, size, timeout, seed)
+        rss_after = kernel_rss_bytes(http_url)
+    finally:
+        if transport == "ws":
+            await client.close_ws()
+        await client.aclose()
+        if kernel is not None:
+            kernel.terminate()
+            kernel.wait(timeout=10)
+
+    all_latencies = [v for values in latencies.values() for v in values]
+    total = len(all_latencies)
+    return {
+        "config": {
+            "transport": transport,
+            "concurrency": concurrency,
+            "duration_s": duration,
+            "requests": requests,
+            "mix": mix,
+            "size": size,
+            "url": ws_url if transport == "ws" else http_url,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "messages": total,
+        "errors": sum(errors.values()),
+        "messages_per_second": round(total / elapsed, 1) if elapsed else 0.0,
+        "latency": summarize(all_latencies),
+        "tasks": {kind: dict(summarize(values), errors=errors[kind]) for kind, values in latencies.items()},
+        "kernel_rss_bytes": {"before": rss_before, "after": rss_after},
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def run_benchmark(**kwargs):
+    """
+    Blocking wrapper around run_benchmark_async(); same arguments.
+    """
+    return asyncio.run(run_benchmark_async(**kwargs))
+
+
+def compare(baseline, current, tolerance=0.10):
+    """
+    Compare two benchmark results. Returns a list of human-readable
+    regressions: throughput down, or p50/p99 latency up, by more than
+    `tolerance` (a fraction).
+    """
+    regressions = []
+    base_rate, rate = baseline.get("messages_per_second"), current.get("messages_per_second")
+    if base_rate and rate is not None and rate < base_rate * (1 - tolerance):
+        regressions.append(f"throughput {rate} msg/s vs {base_rate} msg/s baseline")
+
+    for key in ("p50_ms", "p99_ms"):
+        base, value = baseline.get("latency", {}).get(key), current.get("latency", {}).get(key)
+        if base and value is not None and value > base * (1 + tolerance):
+            regressions.append(f"{key} {value:.3f} vs {base:.3f} baseline")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="unikernal bench", description="Benchmark the kernel's Python paths.")
+    parser.add_argument("--transport", choices=("http", "ws"), default="http")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run (0 to use --requests)")
+    parser.add_argument("--requests", type=int, default=None, help="stop after this many requests")
+    parser.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()),
+                        help="weighted task mix, e.g. math.sum=3,calc.binary=1,echo-service=1,invoke=1")
+    parser.add_argument("--size", type=int, default=16, help="numeric inputs per math task / echo bytes")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--http-url", default=None)
+    parser.add_argument("--ws-url", default=None)
+    parser.add_argument("--start-kernel", action="store_true", help="start a local kernel for the run")
+    parser.add_argument("--port", type=int, default=3900, help="port for --start-kernel")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="write the JSON result to this file")
+    parser.add_argument("--compare", help="baseline JSON result to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(
+        transport=args.transport,
+        concurrency=args.concurrency,
+        duration=args.duration or None,
+        requests=args.requests,
+        mix=parse_mix(args.mix),
+        size=args.size,
+        timeout=args.timeout,
+        http_url=args.http_url,
+        ws_url=args.ws_url,
+        start_kernel=args.start_kernel,
+        port=args.port,
+        seed=args.seed,
+    )
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), result, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
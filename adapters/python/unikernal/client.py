@@ -1,26 +1,140 @@
 import json
+import time
+import random
 import requests
 import asyncio
 import websockets
 import uuid
 import datetime
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError, ConnectTimeoutError
 from .config import Config
+from . import codec
+
+try:
+    import aiohttp
+except ImportError:  # optional: the async API falls back to the pooled sync session
+    aiohttp = None
+
+
+# HTTP statuses that mean the kernel turned the message away (busy / overloaded)
+RETRYABLE_STATUS = {429, 503}
+
+# Statuses that leave it open whether the kernel got the message (a proxy in
+# front of it failed); retried only with retry_on_timeout
+AMBIGUOUS_STATUS = {502, 504}
+
+
+def request_not_sent(error):
+    """
+    True when a requests error happened before the request went out, so
+    sending again cannot deliver the message twice.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError):
+        return False
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, "reason", reason)  # urllib3 MaxRetryError wraps the cause
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class UnikernalError(Exception):
+    """
+    Raised when a UDL message could not be delivered to the Kernel.
+    """
+
+    def __init__(self, message, status=None, attempts=0):
+        super().__init__(message)
+        self.status = status
+        self.attempts = attempts
 
 
 class UnikernalClient:
     """
     Simple client for talking to the Unikernal Kernel over HTTP and WebSocket.
+
+    HTTP calls share one keep-alive connection pool and can be sent in bulk
+    with send_many() / send_many_async(). They are retried with exponential
+    backoff only when the kernel provably did not get the message (failed
+    connect, 429/503). UDL messages are not assumed idempotent: read timeouts,
+    dropped connections and 502/504 are retried only with retry_on_timeout.
     """
 
-    def __init__(self, http_url=None, ws_url=None, service_id=None):
+    def __init__(self, http_url=None, ws_url=None, service_id=None,
+                 timeout=None, max_retries=None, backoff=None, pool_size=None,
+                 retry_on_timeout=None):
         # Allow explicit values or fall back to Config defaults
         self.http_url = http_url or Config.KERNEL_HTTP_URL
         self.ws_url = ws_url or Config.KERNEL_WS_URL
         self.service_id = service_id or Config.SERVICE_ID
 
+        self.timeout = timeout if timeout is not None else Config.HTTP_TIMEOUT
+        self.max_retries = max_retries if max_retries is not None else Config.HTTP_MAX_RETRIES
+        self.backoff = backoff if backoff is not None else Config.HTTP_BACKOFF
+        self.pool_size = pool_size or Config.HTTP_POOL_SIZE
+        self.retry_on_timeout = retry_on_timeout if retry_on_timeout is not None else Config.HTTP_RETRY_ON_TIMEOUT
+
+        self._session = None
+        self._async_session = None
+
         self.ws = None
         self.on_message_callback = None
 
+        # Envelope encoding for WebSocket sends, upgraded by the register ack
+        self.encoding = codec.JSON
+
+        # WebSocket RPC state
+        self.auto_reconnect = Config.WS_AUTO_RECONNECT
+        self._closing = False
+        self._pending = {}          # correlation key -> asyncio.Future
+        self._listen_task = None
+        self._dispatch_task = None
+        self._dispatch_queue = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    @property
+    def session(self):
+        """
+        Shared requests.Session with a keep-alive pool sized for send_many().
+        """
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session = session
+        return self._session
+
+    def close(self):
+        """
+        Close pooled HTTP connections.
+        """
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    async def aclose(self):
+        """
+        Close pooled HTTP connections, including the async session.
+        """
+        if self._async_session is not None:
+            await self._async_session.close()
+            self._async_session = None
+        self.close()
+
     def create_message(self, target, intent, payload, correlation_id=None):
         """
         Build a UDL message with standard fields.
@@ -38,68 +152,331 @@ class UnikernalClient:
             },
         }
 
-    def send_udl_http(self, message):
+    def _retry_delay(self, attempt):
+        delay = self.backoff * (2 ** attempt)
+        return delay + random.uniform(0, delay / 2)
+
+    def _retryable_status(self, status, retry_on_timeout):
+        return status in RETRYABLE_STATUS or (retry_on_timeout and status in AMBIGUOUS_STATUS)
+
+    def post_udl(self, message, timeout=None, retry_on_timeout=None):
+        """
+        Send a UDL message via HTTP and return the decoded JSON response.
+        Retries failed connects and 429/503 responses with backoff; with
+        retry_on_timeout (for idempotent messages) also read timeouts, dropped
+        connections and 502/504. Raises UnikernalError once it gives up.
+        """
+        timeout = timeout if timeout is not None else self.timeout
+        retry_on_timeout = self.retry_on_timeout if retry_on_timeout is None else retry_on_timeout
+        last_error = None
+        status = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self._retry_delay(attempt - 1))
+            try:
+                response = self.session.post(self.http_url, json=message, timeout=timeout)
+                status = response.status_code
+                if self._retryable_status(status, retry_on_timeout):
+                    last_error = f"HTTP {status}"
+                    continue
+                response.raise_for_status()
+                return response.json()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if not (retry_on_timeout or request_not_sent(e)):
+                    # The kernel may have the message already; sending again could deliver it twice
+                    raise UnikernalError(f"HTTP request failed: {e}", status=status, attempts=attempt + 1) from e
+                last_error = str(e)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                # 4xx or a non-JSON body: retrying will not help
+                raise UnikernalError(f"HTTP request failed: {e}", status=status, attempts=attempt + 1) from e
+
+        raise UnikernalError(f"HTTP request failed after {self.max_retries + 1} attempts: {last_error}",
+                             status=status, attempts=self.max_retries + 1)
+
+    def send_udl_http(self, message, timeout=None):
         """
         Send a UDL message via HTTP to the Kernel.
         Returns the JSON response (dict) or None on error.
         """
         try:
-            response = requests.post(self.http_url, json=message, timeout=5)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            return self.post_udl(message, timeout=timeout)
+        except UnikernalError as e:
             print(f"[UnikernalClient] Error sending HTTP request: {e}")
             return None
 
-    async def connect_ws(self):
+    def send_many(self, messages, concurrency=None, timeout=None):
         """
-        Connect to the Kernel over WebSocket and register this service.
-        Also starts a background listener task.
+        Send a batch of UDL messages over the pooled HTTP session with at most
+        `concurrency` requests in flight. Returns one entry per message, in
+        input order: the response dict, or the UnikernalError that message hit.
+        """
+        messages = list(messages)
+        if not messages:
+            return []
+        concurrency = min(concurrency or Config.SEND_MANY_CONCURRENCY, len(messages))
+
+        def send_one(message):
+            try:
+                return self.post_udl(message, timeout=timeout)
+            except UnikernalError as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(send_one, messages))
+
+    async def _get_async_session(self):
+        if self._async_session is None or self._async_session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self._async_session = aiohttp.ClientSession(connector=connector)
+        return self._async_session
+
+    async def post_udl_async(self, message, timeout=None, retry_on_timeout=None):
+        """
+        asyncio variant of post_udl(). Uses aiohttp when it is installed,
+        otherwise runs the pooled sync session in a worker thread.
+        """
+        if aiohttp is None:
+            return await asyncio.to_thread(self.post_udl, message, timeout, retry_on_timeout)
+
+        timeout = timeout if timeout is not None else self.timeout
+        retry_on_timeout = self.retry_on_timeout if retry_on_timeout is None else retry_on_timeout
+        session = await self._get_async_session()
+        last_error = None
+        status = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self._retry_delay(attempt - 1))
+            try:
+                async with session.post(self.http_url, json=message,
+                                        timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    status = response.status
+                    if self._retryable_status(status, retry_on_timeout):
+                        last_error = f"HTTP {status}"
+                        continue
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if not (retry_on_timeout or isinstance(e, aiohttp.ClientConnectorError)):
+                    raise UnikernalError(f"HTTP request failed: {e or type(e).__name__}",
+                                         status=status, attempts=attempt + 1) from e
+                last_error = str(e) or type(e).__name__
+            except (aiohttp.ClientError, ValueError) as e:
+                raise UnikernalError(f"HTTP request failed: {e}", status=status, attempts=attempt + 1) from e
+
+        raise UnikernalError(f"HTTP request failed after {self.max_retries + 1} attempts: {last_error}",
+                             status=status, attempts=self.max_retries + 1)
+
+    async def send_udl_http_async(self, message, timeout=None):
+        """
+        asyncio variant of send_udl_http(): returns the response dict or None on error.
         """
         try:
-            self.ws = await websockets.connect(self.ws_url)
-            print(f"[UnikernalClient] Connected to Kernel at {self.ws_url}")
+            return await self.post_udl_async(message, timeout=timeout)
+        except UnikernalError as e:
+            print(f"[UnikernalClient] Error sending HTTP request: {e}")
+            return None
+
+    async def send_many_async(self, messages, concurrency=None, timeout=None):
+        """
+        asyncio variant of send_many(): bounded concurrency, results in input order.
+        """
+        semaphore = asyncio.Semaphore(concurrency or Config.SEND_MANY_CONCURRENCY)
+
+        async def send_one(message):
+            async with semaphore:
+                try:
+                    return await self.post_udl_async(message, timeout=timeout)
+                except UnikernalError as e:
+                    return e
+
+        return await asyncio.gather(*(send_one(m) for m in messages))
+
+    def _registration_message(self):
+        return {
+            "version": "8.0",
+            "source": self.service_id,
+            "target": "kernel",
+            "intent": "register_adapter",
+            "meta": {
+                "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+                "trace_id": str(uuid.uuid4()),
+                "language": "python",
+            },
+            "payload": {
+                "adapterId": self.service_id,
+                "encodings": codec.supported_encodings(),
+            },
+        }
 
-            # Registration message
-            reg_msg = self.create_message(
-                target="unikernal-core",
-                intent="REGISTER",
-                payload={"service_id": self.service_id},
-            )
-            await self.ws.send(json.dumps(reg_msg))
+    async def _open_ws(self):
+        # Until the kernel acks the new registration, speak JSON
+        self.encoding = codec.JSON
+        self.ws = await websockets.connect(self.ws_url)
+        print(f"[UnikernalClient] Connected to Kernel at {self.ws_url}")
 
-            # Start listener in the background
-            asyncio.create_task(self._listen())
+        # Register so replies addressed to this service id are routed back here
+        await self.ws.send(json.dumps(self._registration_message()))
 
+    async def connect_ws(self, auto_reconnect=None):
+        """
+        Connect to the Kernel over WebSocket and register this service.
+        Also starts a background listener task, which reconnects and
+        re-registers automatically if the socket drops.
+        """
+        self._closing = False
+        self.auto_reconnect = Config.WS_AUTO_RECONNECT if auto_reconnect is None else auto_reconnect
+        try:
+            await self._open_ws()
         except Exception as e:
             print(f"[UnikernalClient] WebSocket connection failed: {e}")
+            return
+
+        # Start listener and callback dispatcher in the background
+        if self._dispatch_queue is None:
+            self._dispatch_queue = asyncio.Queue()
+        if self._dispatch_task is None or self._dispatch_task.done():
+            self._dispatch_task = asyncio.create_task(self._dispatch())
+        self._listen_task = asyncio.create_task(self._listen())
+
+    async def close_ws(self):
+        """
+        Close the WebSocket, stop reconnecting and fail any pending calls.
+        """
+        self._closing = True
+        if self.ws is not None:
+            await self.ws.close()
+            self.ws = None
+        for task in (self._listen_task, self._dispatch_task):
+            if task is not None:
+                task.cancel()
+        self._listen_task = self._dispatch_task = None
+        self._fail_pending(UnikernalError("WebSocket closed"))
+
+    @staticmethod
+    def _correlation_key(data):
+        meta = data.get("meta") or {}
+        payload = data.get("payload") if isinstance(data.get("payload"), dict) else {}
+        return (meta.get("correlation_id") or meta.get("trace_id")
+                or data.get("trace_id") or payload.get("trace_id"))
+
+    @staticmethod
+    def _is_routing_ack(data):
+        # The kernel acknowledges forwarded messages with {ok, routed}; the
+        # real answer comes later from the target service under the same trace id.
+        payload = data.get("payload")
+        return isinstance(payload, dict) and payload.get("routed") is True and payload.get("ok") is True
+
+    @staticmethod
+    def _is_partial(data):
+        # Streamed output chunks precede the final response; they go to the callback
+        return data.get("intent") == "response_chunk"
+
+    def _fail_pending(self, error):
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
 
     async def _listen(self):
         """
-        Internal listener loop for incoming WebSocket messages.
+        Internal listener loop for incoming WebSocket messages. Replies to
+        call() resolve their pending future here; everything else is queued
+        for the callback dispatcher so slow callbacks never stall reads.
         """
-        try:
-            async for message in self.ws:
+        delay = Config.WS_RECONNECT_DELAY
+        while True:
+            try:
+                async for message in self.ws:
+                    delay = Config.WS_RECONNECT_DELAY
+                    try:
+                        data = codec.decode(message)
+                    except Exception:
+                        print(f"[UnikernalClient] Received undecodable message: {message!r:.200}")
+                        continue
+
+                    if isinstance(data, dict) and data.get("action") == "register_adapter_ack":
+                        encoding = data.get("encoding")
+                        if encoding in codec.supported_encodings():
+                            self.encoding = encoding
+
+                    if isinstance(data, dict) and self._pending:
+                        future = self._pending.get(self._correlation_key(data))
+                        if future is not None and not self._is_partial(data):
+                            if not self._is_routing_ack(data) and not future.done():
+                                future.set_result(data)
+                            continue
+
+                    self._dispatch_queue.put_nowait(data)
+            except Exception as e:
+                print(f"[UnikernalClient] WebSocket listener error: {e}")
+
+            # Replies to in-flight calls cannot arrive on a new connection
+            self._fail_pending(UnikernalError("WebSocket connection lost"))
+            if self._closing or not self.auto_reconnect:
+                return
+
+            while not self._closing:
+                await asyncio.sleep(delay)
                 try:
-                    data = json.loads(message)
-                except json.JSONDecodeError:
-                    print(f"[UnikernalClient] Received non-JSON message: {message}")
-                    continue
+                    await self._open_ws()
+                    break
+                except Exception as e:
+                    print(f"[UnikernalClient] Reconnect failed: {e}")
+                    delay = min(delay * 2, Config.WS_RECONNECT_MAX_DELAY)
 
+    async def _dispatch(self):
+        """
+        Hand queued messages to on_message_callback in arrival order.
+        Coroutine callbacks are awaited; plain callbacks are called directly.
+        """
+        while True:
+            data = await self._dispatch_queue.get()
+            try:
                 if self.on_message_callback:
-                    self.on_message_callback(data)
+                    result = self.on_message_callback(data)
+                    if asyncio.iscoroutine(result):
+                        await result
                 else:
                     print("[UnikernalClient] Received UDL message:")
                     print(json.dumps(data, indent=2))
-        except Exception as e:
-            print(f"[UnikernalClient] WebSocket listener error: {e}")
+            except Exception as e:
+                print(f"[UnikernalClient] on_message callback error: {e}")
+
+    async def call(self, target, intent, payload, timeout=None):
+        """
+        Send a UDL message over the WebSocket and await the matching reply
+        (by meta.trace_id / correlation_id). Many calls may be in flight on
+        one socket. Returns the reply envelope; raises UnikernalError if the
+        socket is down or drops, and asyncio.TimeoutError on timeout.
+        """
+        if self.ws is None:
+            raise UnikernalError("WebSocket not connected")
+
+        message = self.create_message(target, intent, payload)
+        key = message["meta"]["trace_id"]
+        message["meta"]["correlation_id"] = key
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            try:
+                await self.ws.send(codec.encode(message, self.encoding))
+            except websockets.exceptions.ConnectionClosed as e:
+                # Dropped and not reconnected yet
+                raise UnikernalError("WebSocket not connected") from e
+            return await asyncio.wait_for(future, timeout if timeout is not None else Config.RPC_TIMEOUT)
+        finally:
+            if self._pending.get(key) is future:
+                del self._pending[key]
 
     async def send_udl_ws(self, message):
         """
         Send a UDL message via WebSocket.
         """
         if self.ws:
-            await self.ws.send(json.dumps(message))
+            await self.ws.send(codec.encode(message, self.encoding))
         else:
             print("[UnikernalClient] WebSocket not connected")
 
@@ -107,5 +484,6 @@ class UnikernalClient:
         """
         Set a callback to be invoked when a UDL message is received over WebSocket.
         The callback should accept one argument: the decoded JSON dict.
+        It may be a coroutine function; replies to call() never reach it.
         """
         self.on_message_callback = callback
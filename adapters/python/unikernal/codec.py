@@ -0,0 +1,123 @@
+"""
+Envelope encodings shared by the SDK and the Python adapters.
+
+JSON travels in WebSocket text frames and is always available. MessagePack
+(when the optional ``msgpack`` package is installed) travels in binary
+frames and is negotiated through ``register_adapter``: the adapter offers
+``payload.encodings`` and the kernel's ack names the chosen ``encoding``.
+
+Numeric arrays (``array.array`` or 1-D NumPy arrays) are sent in MessagePack
+as a typed-array extension holding the raw little-endian element bytes:
+
+    ext type 1: [dtype code: u8][element bytes]
+"""
+import sys
+import json
+import array
+
+try:
+    import msgpack
+except ImportError:  # optional: without it only JSON is offered
+    msgpack = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+TYPED_ARRAY_EXT = 1
+
+# dtype code -> (dtype name, array.array typecode); codes shared with the kernel
+DTYPES = {
+    1: ("float64", "d"),
+    2: ("float32", "f"),
+    3: ("int32", "i"),
+    4: ("int64", "q"),
+    5: ("uint8", "B"),
+}
+DTYPE_CODES = {name: code for code, (name, _) in DTYPES.items()}
+TYPECODE_CODES = {typecode: code for code, (_, typecode) in DTYPES.items()}
+
+
+def supported_encodings():
+    """
+    Encodings this process can speak, most preferred first.
+    """
+    return [MSGPACK, JSON] if msgpack is not None else [JSON]
+
+
+def typed_array(values, dtype="float64"):
+    """
+    Wrap numbers so they travel as a raw typed buffer under MessagePack
+    (and as a plain list under JSON).
+    """
+    if np is not None:
+        return np.asarray(values, dtype=dtype)
+    return array.array(DTYPES[DTYPE_CODES[dtype]][1], values)
+
+
+def _pack_typed(obj):
+    if np is not None and isinstance(obj, np.ndarray):
+        code = DTYPE_CODES.get(obj.dtype.name)
+        if code is None or obj.ndim != 1:
+            return obj.tolist()
+        data = obj.astype(obj.dtype.newbyteorder("<"), copy=False).tobytes()
+        return msgpack.ExtType(TYPED_ARRAY_EXT, bytes([code]) + data)
+
+    if isinstance(obj, array.array):
+        code = TYPECODE_CODES.get(obj.typecode)
+        if code is None:
+            return obj.tolist()
+        if sys.byteorder != "little":
+            obj = array.array(obj.typecode, obj)
+            obj.byteswap()
+        return msgpack.ExtType(TYPED_ARRAY_EXT, bytes([code]) + obj.tobytes())
+
+    if np is not None and isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Cannot encode object of type {type(obj).__name__}")
+
+
+def _unpack_typed(code, data):
+    if code != TYPED_ARRAY_EXT or not data:
+        return msgpack.ExtType(code, data)
+
+    name, typecode = DTYPES[data[0]]
+    if np is not None:
+        return np.frombuffer(data, dtype=np.dtype(name).newbyteorder("<"), offset=1)
+    values = array.array(typecode)
+    values.frombytes(data[1:])
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def _json_default(obj):
+    if isinstance(obj, array.array) or (np is not None and isinstance(obj, (np.ndarray, np.generic))):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def encode(envelope, encoding=JSON):
+    """
+    Encode an envelope: ``str`` for JSON (send as a text frame),
+    ``bytes`` for MessagePack (send as a binary frame).
+    """
+    if encoding == MSGPACK and msgpack is not None:
+        return msgpack.packb(envelope, default=_pack_typed, use_bin_type=True)
+    return json.dumps(envelope, default=_json_default)
+
+
+def decode(raw):
+    """
+    Decode a WebSocket frame. Binary frames are MessagePack, text is JSON.
+    """
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        if msgpack is None:
+            raise ValueError("Received a binary frame but msgpack is not installed")
+        return msgpack.unpackb(raw, ext_hook=_unpack_typed, raw=False)
+    return json.loads(raw)
@@ -2,3 +2,17 @@ class Config:
     KERNEL_HTTP_URL = "http://localhost:4000/udl"
     KERNEL_WS_URL = "ws://localhost:4000/ws"
     SERVICE_ID = "python-test-service"
+
+    # HTTP transport
+    HTTP_TIMEOUT = 5.0            # seconds, per attempt
+    HTTP_MAX_RETRIES = 3          # extra attempts after the first one
+    HTTP_BACKOFF = 0.2            # seconds, doubled on every retry
+    HTTP_RETRY_ON_TIMEOUT = False # also retry sends the kernel may have received (idempotent messages only)
+    HTTP_POOL_SIZE = 32           # keep-alive connections kept per host
+    SEND_MANY_CONCURRENCY = 16    # default in-flight requests for send_many()
+
+    # WebSocket RPC
+    RPC_TIMEOUT = 10.0            # seconds, default for call()
+    WS_AUTO_RECONNECT = True
+    WS_RECONNECT_DELAY = 0.5      # seconds, doubled per failed attempt
+    WS_RECONNECT_MAX_DELAY = 10.0
@@ -1,7 +1,12 @@
 // Unikernal v8 - Rust Accelerated Routing Engine
 // This is a Rust module that provides high-performance routing
+//
+// Route selection and metrics aggregation for SmartRouter. The JS fallback
+// (kernel/src/RouteTable.js, kernel/src/LatencyHistogram.js) implements the
+// same algorithms, so both paths pick the same adapters and report the same
+// quantiles.
 
-use std::collections::HashMap;
+use std::collections::{HashMap, HashSet};
 use serde::{Deserialize, Serialize};
 
 #[derive(Serialize, Deserialize, Debug, Clone)]
@@ -20,92 +25,266 @@ pub struct RouteResult {
     pub latency_us: u64,
 }
 
-pub struct RustRoutingEngine {
-    routes: HashMap<String, Vec<String>>, // target -> adapter_ids
-    metrics: HashMap<String, RouteMetrics>,
+// Canary share is expressed in basis points (1/100 of a percent)
+pub const CANARY_SCALE: u32 = 10_000;
+
+// Latency buckets: 8 per power of two from 1us, as in LatencyHistogram.js
+const MIN_MS: f64 = 0.001;
+const BUCKETS_PER_DOUBLING: f64 = 8.0;
+pub const BUCKET_COUNT: usize = 8 * 27;
+
+// Snapshot layout: [total, errors, count, sum_ms, min_ms, max_ms, buckets...]
+pub const SNAPSHOT_HEADER: usize = 6;
+
+fn bucket_index(ms: f64) -> usize {
+    if !(ms > MIN_MS) {
+        return 0;
+    }
+    let growth = (2f64).powf(1.0 / BUCKETS_PER_DOUBLING);
+    let index = ((ms / MIN_MS).ln() / growth.ln() - 1e-9).ceil() as usize;
+    index.min(BUCKET_COUNT - 1)
+}
+
+struct Backend {
+    id: String,
+    weight: i64,
+    current: i64,
+}
+
+#[derive(Default)]
+struct Route {
+    backends: Vec<Backend>,
+    canary: Option<String>,
+    canary_bp: u32,
+    canary_acc: u32,
 }
 
 #[derive(Clone)]
-struct RouteMetrics {
-    total_requests: u64,
+struct ServiceMetrics {
+    total: u64,
     errors: u64,
-    avg_latency_us: u64,
+    count: u64,
+    sum_ms: f64,
+    min_ms: f64,
+    max_ms: f64,
+    buckets: Vec<f64>,
+}
+
+impl ServiceMetrics {
+    fn new() -> Self {
+        ServiceMetrics {
+            total: 0,
+            errors: 0,
+            count: 0,
+            sum_ms: 0.0,
+            min_ms: f64::INFINITY,
+            max_ms: 0.0,
+            buckets: vec![0.0; BUCKET_COUNT],
+        }
+    }
+
+    fn record(&mut self, latency_ms: f64, error: bool) {
+        self.total += 1;
+        if error {
+            self.errors += 1;
+        }
+        if latency_ms > 0.0 {
+            self.buckets[bucket_index(latency_ms)] += 1.0;
+            self.count += 1;
+            self.sum_ms += latency_ms;
+            if latency_ms < self.min_ms {
+                self.min_ms = latency_ms;
+            }
+            if latency_ms > self.max_ms {
+                self.max_ms = latency_ms;
+            }
+        }
+    }
+}
+
+pub struct RustRoutingEngine {
+    routes: HashMap<String, Route>,
+    unavailable: HashSet<String>,
+    slots: HashMap<String, u32>,
+    metrics: Vec<ServiceMetrics>,
 }
 
 impl RustRoutingEngine {
     pub fn new() -> Self {
         RustRoutingEngine {
             routes: HashMap::new(),
-            metrics: HashMap::new(),
+            unavailable: HashSet::new(),
+            slots: HashMap::new(),
+            metrics: Vec::new(),
         }
     }
 
+    /// Add an adapter to a target with weight 1.
     pub fn register_route(&mut self, target: &str, adapter_id: &str) {
-        self.routes
-            .entry(target.to_string())
-            .or_insert_with(Vec::new)
-            .push(adapter_id.to_string());
+        let route = self.routes.entry(target.to_string()).or_default();
+        if !route.backends.iter().any(|b| b.id == adapter_id) {
+            route.backends.push(Backend { id: adapter_id.to_string(), weight: 1, current: 0 });
+        }
     }
 
-    pub fn route(&mut self, message: &Message) -> RouteResult {
-        let start = std::time::Instant::now();
+    /// Replace the weighted adapters of a target. An empty list removes the route.
+    pub fn set_backends(&mut self, target: &str, ids: &[String], weights: &[u32]) {
+        if ids.is_empty() {
+            self.routes.remove(target);
+            return;
+        }
+        let route = self.routes.entry(target.to_string()).or_default();
+        route.backends = ids
+            .iter()
+            .enumerate()
+            .map(|(i, id)| Backend {
+                id: id.clone(),
+                weight: weights.get(i).copied().unwrap_or(1) as i64,
+                current: 0,
+            })
+            .collect();
+    }
 
-        if let Some(adapters) = self.routes.get(&message.target) {
-            if adapters.is_empty() {
-                return RouteResult {
-                    success: false,
-                    adapter_id: None,
-                    error: Some("No adapters available".to_string()),
-                    latency_us: start.elapsed().as_micros() as u64,
+    /// Send `basis_points` / 10000 of a target's traffic to a canary adapter.
+    pub fn set_canary(&mut self, target: &str, adapter_id: Option<&str>, basis_points: u32) {
+        let route = self.routes.entry(target.to_string()).or_default();
+        route.canary = adapter_id.map(|id| id.to_string());
+        route.canary_bp = basis_points.min(CANARY_SCALE);
+        route.canary_acc = 0;
+    }
+
+    /// Mark an adapter as (un)available; unavailable adapters are skipped.
+    pub fn set_available(&mut self, adapter_id: &str, available: bool) {
+        if available {
+            self.unavailable.remove(adapter_id);
+        } else {
+            self.unavailable.insert(adapter_id.to_string());
+        }
+    }
+
+    /// Pick an adapter for `target`. With a key (e.g. a hashed trace id) the
+    /// canary decision is sticky per key; without one the canary gets an
+    /// exact share of calls. Other calls use smooth weighted round-robin.
+    pub fn select(&mut self, target: &str, key: Option<u32>) -> Option<String> {
+        let unavailable = &self.unavailable;
+        let route = self.routes.get_mut(target)?;
+
+        if let Some(canary) = &route.canary {
+            if route.canary_bp > 0 && !unavailable.contains(canary) {
+                let hit = match key {
+                    Some(k) => k % CANARY_SCALE < route.canary_bp,
+                    None => {
+                        route.canary_acc += route.canary_bp;
+                        if route.canary_acc >= CANARY_SCALE {
+                            route.canary_acc -= CANARY_SCALE;
+                            true
+                        } else {
+                            false
+                        }
+                    }
                 };
+                if hit {
+                    return Some(canary.clone());
+                }
+            }
+        }
+
+        let mut total = 0;
+        let mut best: Option<(usize, i64)> = None;
+        for (i, backend) in route.backends.iter_mut().enumerate() {
+            if backend.weight <= 0 || unavailable.contains(&backend.id) {
+                continue;
+            }
+            backend.current += backend.weight;
+            total += backend.weight;
+            if best.map_or(true, |(_, current)| backend.current > current) {
+                best = Some((i, backend.current));
             }
+        }
+        let (best, _) = best?;
+        route.backends[best].current -= total;
+        Some(route.backends[best].id.clone())
+    }
 
-            // Select best adapter (round-robin for now, ML-based in future)
-            let adapter_id = &adapters[0];
+    /// Slot index for a metrics series, created on first use.
+    pub fn slot(&mut self, name: &str) -> u32 {
+        if let Some(&index) = self.slots.get(name) {
+            return index;
+        }
+        let index = self.metrics.len() as u32;
+        self.metrics.push(ServiceMetrics::new());
+        self.slots.insert(name.to_string(), index);
+        index
+    }
 
-            // Update metrics
-            self.update_metrics(adapter_id, true, start.elapsed().as_micros() as u64);
+    /// Aggregate a batch of (slot, latency ms, error) records.
+    pub fn record_batch(&mut self, slots: &[u32], latencies_ms: &[f64], errors: &[u8]) {
+        let n = slots.len().min(latencies_ms.len()).min(errors.len());
+        for i in 0..n {
+            if let Some(metrics) = self.metrics.get_mut(slots[i] as usize) {
+                metrics.record(latencies_ms[i], errors[i] != 0);
+            }
+        }
+    }
 
-            RouteResult {
-                success: true,
-                adapter_id: Some(adapter_id.clone()),
-                error: None,
-                latency_us: start.elapsed().as_micros() as u64,
+    /// [total, errors, count, sum_ms, min_ms, max_ms, bucket counts...]
+    pub fn snapshot(&self, slot: u32) -> Vec<f64> {
+        let mut out = Vec::with_capacity(SNAPSHOT_HEADER + BUCKET_COUNT);
+        match self.metrics.get(slot as usize) {
+            Some(m) => {
+                out.extend_from_slice(&[m.total as f64, m.errors as f64, m.count as f64, m.sum_ms, m.min_ms, m.max_ms]);
+                out.extend_from_slice(&m.buckets);
             }
-        } else {
-            RouteResult {
+            None => {
+                out.extend_from_slice(&[0.0, 0.0, 0.0, 0.0, f64::INFINITY, 0.0]);
+                out.resize(SNAPSHOT_HEADER + BUCKET_COUNT, 0.0);
+            }
+        }
+        out
+    }
+
+    pub fn route(&mut self, message: &Message) -> RouteResult {
+        let start = std::time::Instant::now();
+
+        if !self.routes.contains_key(&message.target) {
+            return RouteResult {
                 success: false,
                 adapter_id: None,
                 error: Some(format!("Target '{}' not found", message.target)),
                 latency_us: start.elapsed().as_micros() as u64,
-            }
+            };
         }
-    }
 
-    fn update_metrics(&mut self, adapter_id: &str, success: bool, latency_us: u64) {
-        let metrics = self.metrics
-            .entry(adapter_id.to_string())
-            .or_insert(RouteMetrics {
-                total_requests: 0,
-                errors: 0,
-                avg_latency_us: 0,
-            });
-
-        metrics.total_requests += 1;
-        if !success {
-            metrics.errors += 1;
+        match self.select(&message.target, None) {
+            Some(adapter_id) => {
+                let slot = self.slot(&adapter_id);
+                let latency_us = start.elapsed().as_micros() as u64;
+                self.record_batch(&[slot], &[latency_us as f64 / 1000.0], &[0]);
+                RouteResult {
+                    success: true,
+                    adapter_id: Some(adapter_id),
+                    error: None,
+                    latency_us,
+                }
+            }
+            None => RouteResult {
+                success: false,
+                adapter_id: None,
+                error: Some("No adapters available".to_string()),
+                latency_us: start.elapsed().as_micros() as u64,
+            },
         }
-        
-        // Running average
-        metrics.avg_latency_us = 
-            (metrics.avg_latency_us * (metrics.total_requests - 1) + latency_us) 
-            / metrics.total_requests;
     }
 
+    /// adapter id -> (total requests, errors, average latency in microseconds)
     pub fn get_metrics(&self) -> HashMap<String, (u64, u64, u64)> {
-        self.metrics
+        self.slots
             .iter()
-            .map(|(k, v)| (k.clone(), (v.total_requests, v.errors, v.avg_latency_us)))
+            .map(|(name, &slot)| {
+                let m = &self.metrics[slot as usize];
+                let avg_us = if m.count > 0 { (m.sum_ms * 1000.0 / m.count as f64) as u64 } else { 0 };
+                (name.clone(), (m.total, m.errors, avg_us))
+            })
             .collect()
     }
 }
@@ -117,6 +296,9 @@ mod napi_exports {
     use napi::bindgen_prelude::*;
     use napi_derive::napi;
 
+    /// Native SmartRouter engine. Methods mirror kernel/src/RouteTable.js;
+    /// the *Batch methods take typed arrays so one boundary crossing covers
+    /// many calls.
     #[napi]
     pub struct RoutingEngine {
         inner: RustRoutingEngine,
@@ -136,11 +318,70 @@ mod napi_exports {
             self.inner.register_route(&target, &adapter_id);
         }
 
+        #[napi]
+        pub fn set_backends(&mut self, target: String, ids: Vec<String>, weights: Vec<u32>) {
+            self.inner.set_backends(&target, &ids, &weights);
+        }
+
+        #[napi]
+        pub fn set_canary(&mut self, target: String, adapter_id: Option<String>, basis_points: u32) {
+            self.inner.set_canary(&target, adapter_id.as_deref(), basis_points);
+        }
+
+        #[napi]
+        pub fn set_available(&mut self, adapter_id: String, available: bool) {
+            self.inner.set_available(&adapter_id, available);
+        }
+
+        #[napi]
+        pub fn select(&mut self, target: String, key: Option<u32>) -> Option<String> {
+            self.inner.select(&target, key)
+        }
+
+        /// Select for many targets at once; `keys` is optional (0xFFFFFFFF = no key).
+        #[napi]
+        pub fn select_batch(&mut self, targets: Vec<String>, keys: Option<Uint32Array>) -> Vec<Option<String>> {
+            let keys: &[u32] = keys.as_deref().unwrap_or(&[]);
+            targets
+                .iter()
+                .enumerate()
+                .map(|(i, target)| {
+                    let key = keys.get(i).copied().filter(|&k| k != u32::MAX);
+                    self.inner.select(target, key)
+                })
+                .collect()
+        }
+
+        #[napi]
+        pub fn slot(&mut self, name: String) -> u32 {
+            self.inner.slot(&name)
+        }
+
+        /// Aggregate the first `count` records of the batch buffers.
+        #[napi]
+        pub fn record_batch(&mut self, slots: Uint32Array, latencies_ms: Float64Array, errors: Uint8Array, count: u32) {
+            let n = count as usize;
+            let n = n.min(slots.len()).min(latencies_ms.len()).min(errors.len());
+            self.inner.record_batch(&slots[..n], &latencies_ms[..n], &errors[..n]);
+        }
+
+        #[napi]
+        pub fn snapshot(&self, slot: u32) -> Float64Array {
+            Float64Array::new(self.inner.snapshot(slot))
+        }
+
         #[napi]
         pub fn route(&mut self, message_json: String) -> String {
-            let message: Message = serde_json::from_str(&message_json).unwrap();
-            let result = self.inner.route(&message);
-            serde_json::to_string(&result).unwrap()
+            let result = match serde_json::from_str::<Message>(&message_json) {
+                Ok(message) => self.inner.route(&message),
+                Err(err) => RouteResult {
+                    success: false,
+                    adapter_id: None,
+                    error: Some(format!("Invalid message: {}", err)),
+                    latency_us: 0,
+                },
+            };
+            serde_json::to_string(&result).unwrap_or_default()
         }
     }
 }
@@ -166,4 +407,44 @@ mod tests {
         assert_eq!(result.adapter_id.unwrap(), "adapter-1");
         assert!(result.latency_us < 1000); // < 1ms
     }
+
+    #[test]
+    fn test_weighted_selection() {
+        let mut engine = RustRoutingEngine::new();
+        engine.set_backends("svc", &["a".to_string(), "b".to_string(), "c".to_string()], &[5, 1, 1]);
+        let picks: Vec<String> = (0..7).map(|_| engine.select("svc", None).unwrap()).collect();
+        assert_eq!(picks, vec!["a", "a", "b", "a", "c", "a", "a"]);
+
+        engine.set_available("a", false);
+        let picks: Vec<String> = (0..4).map(|_| engine.select("svc", None).unwrap()).collect();
+        assert!(picks.iter().all(|p| p != "a"));
+        assert!(engine.select("missing", None).is_none());
+    }
+
+    #[test]
+    fn test_canary_share() {
+        let mut engine = RustRoutingEngine::new();
+        engine.set_backends("svc", &["stable".to_string()], &[1]);
+        engine.set_canary("svc", Some("canary"), 1_000); // 10%
+        let canary = (0..1000).filter(|_| engine.select("svc", None).unwrap() == "canary").count();
+        assert_eq!(canary, 100);
+
+        // Keyed selection is sticky
+        assert_eq!(engine.select("svc", Some(10_005)).unwrap(), "canary");
+        assert_eq!(engine.select("svc", Some(5_000)).unwrap(), "stable");
+    }
+
+    #[test]
+    fn test_metrics_batch() {
+        let mut engine = RustRoutingEngine::new();
+        let slot = engine.slot("svc");
+        assert_eq!(engine.slot("svc"), slot);
+        engine.record_batch(&[slot, slot, slot], &[1.0, 2.0, 0.0], &[0, 1, 0]);
+        let snap = engine.snapshot(slot);
+        assert_eq!(&snap[..4], &[3.0, 1.0, 2.0, 3.0]);
+        assert_eq!(snap[4], 1.0);
+        assert_eq!(snap[5], 2.0);
+        assert_eq!(snap[SNAPSHOT_HEADER..].iter().sum::<f64>(), 2.0);
+        assert_eq!(bucket_index(1.0), 80);
+    }
 }
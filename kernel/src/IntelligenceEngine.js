@@ -22,6 +22,7 @@ class IntelligenceEngine {
         }
 
         logger.debug("[Intelligence] Analyzing system health...");
+        if (this.smartRouter.syncMetrics) this.smartRouter.syncMetrics();
 
         for (const [serviceId, metrics] of this.smartRouter.metrics.entries()) {
             if (!metrics) continue;
@@ -41,8 +42,8 @@ class IntelligenceEngine {
             }
 
             // Latency Analysis
-            if (metrics.latency && metrics.latency.length > 0) {
-                const avgLatency = metrics.latency.reduce((a, b) => a + b, 0) / metrics.latency.length;
+            if (metrics.latency && metrics.latency.count > 0) {
+                const avgLatency = metrics.latency.mean();
                 if (avgLatency > 500) { // > 500ms is slow
                     logger.warn(`[Intelligence] 🐢 High latency for ${serviceId}: ${avgLatency.toFixed(0)}ms`);
                     this.suggestAction(serviceId, "optimize_or_scale");
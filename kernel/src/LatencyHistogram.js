@@ -0,0 +1,104 @@
+// kernel/src/LatencyHistogram.js
+
+// Log-spaced buckets: 8 per power of two from 1µs to ~1.5 minutes, so any
+// recorded value is within ~9% of its bucket bound whatever its magnitude.
+const MIN_MS = 0.001;
+const BUCKETS_PER_DOUBLING = 8;
+const BUCKET_COUNT = BUCKETS_PER_DOUBLING * 27;
+const GROWTH = Math.pow(2, 1 / BUCKETS_PER_DOUBLING);
+const LOG_GROWTH = Math.log(GROWTH);
+
+// Upper bound (ms) of each fine bucket; the last bucket also takes overflow
+const UPPER_BOUNDS = Float64Array.from({ length: BUCKET_COUNT }, (_, i) => MIN_MS * Math.pow(GROWTH, i));
+
+// Coarse `le` boundaries (seconds) used when exporting Prometheus histograms
+const EXPORT_BOUNDS_SECONDS = [
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60,
+];
+
+function bucketIndex(ms) {
+    if (!(ms > MIN_MS)) return 0;
+    const index = Math.ceil(Math.log(ms / MIN_MS) / LOG_GROWTH - 1e-9);
+    return index < BUCKET_COUNT ? index : BUCKET_COUNT - 1;
+}
+
+/**
+ * Constant-memory latency histogram (values in milliseconds). Recording is
+ * O(1) with no allocation; quantiles are read from the bucket counts.
+ */
+class LatencyHistogram {
+    constructor() {
+        this.counts = new Float64Array(BUCKET_COUNT);
+        this.count = 0;
+        this.sum = 0;
+        this.min = Infinity;
+        this.max = 0;
+    }
+
+    record(ms) {
+        if (!(ms >= 0)) return;
+        this.counts[bucketIndex(ms)] += 1;
+        this.count += 1;
+        this.sum += ms;
+        if (ms < this.min) this.min = ms;
+        if (ms > this.max) this.max = ms;
+    }
+
+    mean() {
+        return this.count ? this.sum / this.count : 0;
+    }
+
+    /**
+     * Value at quantile q (0..1), reported as the upper bound of the bucket
+     * holding it and clamped to the observed min/max.
+     */
+    quantile(q) {
+        if (this.count === 0) return 0;
+        const rank = Math.max(1, Math.ceil(q * this.count));
+        let seen = 0;
+        for (let i = 0; i < BUCKET_COUNT; i++) {
+            seen += this.counts[i];
+            if (seen >= rank) {
+                return Math.min(this.max, Math.max(this.min, UPPER_BOUNDS[i]));
+            }
+        }
+        return this.max;
+    }
+
+    /**
+     * Cumulative counts at EXPORT_BOUNDS_SECONDS, at fine-bucket resolution.
+     * @returns {Array<[number, number]>} [le seconds, cumulative count]
+     */
+    cumulativeBuckets() {
+        const result = [];
+        let i = 0;
+        let seen = 0;
+        for (const le of EXPORT_BOUNDS_SECONDS) {
+            const leMs = le * 1000;
+            while (i < BUCKET_COUNT && UPPER_BOUNDS[i] <= leMs * (1 + 1e-9)) {
+                seen += this.counts[i];
+                i++;
+            }
+            result.push([le, seen]);
+        }
+        return result;
+    }
+
+    snapshot() {
+        return {
+            count: this.count,
+            mean_ms: this.mean(),
+            min_ms: this.count ? this.min : 0,
+            max_ms: this.max,
+            p50_ms: this.quantile(0.5),
+            p90_ms: this.quantile(0.9),
+            p99_ms: this.quantile(0.99),
+            p999_ms: this.quantile(0.999),
+        };
+    }
+}
+
+LatencyHistogram.EXPORT_BOUNDS_SECONDS = EXPORT_BOUNDS_SECONDS;
+
+module.exports = LatencyHistogram;
@@ -0,0 +1,390 @@
+// kernel/src/PythonWorkerPool.js
+const { spawn } = require("child_process");
+const os = require("os");
+const logger = require("./logger");
+const smartRouter = require("./SmartRouter");
+
+const pythonCmd = "python"; // or "python.exe" if needed on Windows
+
+const POLICIES = ["least-outstanding", "round-robin"];
+
+/**
+ * One warm python-adapter.py child process speaking the framed
+ * {id, udm} / {id, response} NDJSON protocol over stdin/stdout.
+ */
+class PythonWorker {
+    constructor(index, script, callbacks, options = {}) {
+        this.index = index;
+        this.script = script;
+        this.callbacks = callbacks;
+        this.command = options.command || pythonCmd;
+        this.processes = options.processes || 1;
+        this.process = null;
+        this.buffer = "";
+        this.pending = new Map(); // id -> request entry
+        this.restarts = 0;
+        this.answered = false;  // has the current process sent a frame yet
+        this.failedStarts = 0;  // consecutive processes that died before answering
+        this.gaveUp = false;    // too many failed starts: no longer restarted
+    }
+
+    get alive() {
+        return this.process !== null;
+    }
+
+    // Includes requests that timed out but are still executing in the child
+    get outstanding() {
+        return this.pending.size;
+    }
+
+    start() {
+        if (this.process) return;
+
+        const child = spawn(this.command, [this.script], {
+            stdio: ["pipe", "pipe", "inherit"], // stdin, stdout, stderr
+            // Each worker runs its own process pool for CPU-bound tasks; split the
+            // cores between workers instead of starting cores x cores processes
+            env: { ...process.env, PYTHON_ADAPTER_PROCESSES: process.env.PYTHON_ADAPTER_PROCESSES || String(this.processes) },
+        });
+        this.process = child;
+        this.buffer = "";
+        this.answered = false;
+
+        logger.info(`[PythonWorkerPool] Started worker #${this.index} (pid ${child.pid})`);
+
+        child.stdout.on("data", (data) => this.onData(data));
+        child.stdin.on("error", (err) => {
+            logger.warn(`[PythonWorkerPool] Worker #${this.index} stdin error`, { error: err.message });
+        });
+        child.on("error", (err) => {
+            logger.error(`[PythonWorkerPool] Worker #${this.index} process error`, { error: err.message });
+            // A failed spawn (e.g. ENOENT) emits no 'exit'
+            if (child.pid === undefined) this.onGone(child, err.code);
+        });
+        child.on("exit", (code) => this.onGone(child, code));
+    }
+
+    onGone(child, code) {
+        if (this.process !== child) return;
+        this.process = null;
+        this.buffer = "";
+        // A spawn error or a process that never answered (bad interpreter path,
+        // broken script) is a failed start; the pool backs off on those
+        if (!this.answered) this.failedStarts += 1;
+        const orphaned = Array.from(this.pending.values());
+        this.pending.clear();
+        this.callbacks.onExit(this, code, orphaned, child.pid === undefined);
+    }
+
+    stop() {
+        const orphaned = Array.from(this.pending.values());
+        this.pending.clear();
+        if (this.process) {
+            const child = this.process;
+            this.process = null;
+            child.kill();
+        }
+        return orphaned;
+    }
+
+    send(entry) {
+        this.pending.set(entry.id, entry);
+        entry.worker = this;
+        entry.sentAt = process.hrtime.bigint();
+
+        const line = JSON.stringify({ id: entry.id, udm: entry.udm }) + "\n";
+        // A failed write means the child is going away; its exit handler
+        // re-dispatches everything still pending, so nothing to do here.
+        this.process.stdin.write(line, "utf8");
+    }
+
+    onData(data) {
+        this.buffer += data.toString("utf8");
+
+        // A single chunk may carry several frames, or only part of one
+        let newline;
+        while ((newline = this.buffer.indexOf("\n")) !== -1) {
+            const line = this.buffer.slice(0, newline).trim();
+            this.buffer = this.buffer.slice(newline + 1);
+            if (line) this.onFrame(line);
+        }
+    }
+
+    onFrame(line) {
+        let frame;
+        try {
+            frame = JSON.parse(line);
+        } catch (err) {
+            logger.error(`[PythonWorkerPool] Worker #${this.index} sent invalid JSON`, { line });
+            return;
+        }
+        this.answered = true;
+        this.failedStarts = 0;
+
+        if (!frame || frame.id === undefined || frame.id === null) {
+            logger.warn(`[PythonWorkerPool] Worker #${this.index} sent message without request id`, { frame });
+            return;
+        }
+
+        const entry = this.pending.get(frame.id);
+        if (!entry) {
+            logger.debug(`[PythonWorkerPool] Worker #${this.index} replied to unknown request id ${frame.id}`);
+            return;
+        }
+        this.pending.delete(frame.id);
+        this.callbacks.onReply(this, entry, null, frame.response);
+    }
+}
+
+/**
+ * Pool of pre-forked python-adapter.py workers with least-outstanding-requests
+ * (or round-robin) dispatch. Requests in flight on a crashed worker are
+ * re-dispatched to a live worker instead of being dropped. Workers that keep
+ * dying before they answer are restarted with exponential backoff and given
+ * up on after maxFailedStarts; once all are, requests are rejected.
+ */
+class PythonWorkerPool {
+    /**
+     * @param {Object} options
+     * @param {string} options.script - Path to the adapter script
+     * @param {string} [options.name] - Service id prefix used for metrics
+     * @param {string} [options.command] - Interpreter to run the script with (default "python")
+     * @param {number} [options.size] - Number of warm workers
+     * @param {string} [options.policy] - "least-outstanding" | "round-robin"
+     * @param {number} [options.timeoutMs] - Per-request timeout (0 disables)
+     * @param {number} [options.maxAttempts] - Dispatch attempts per request across crashes
+     * @param {number} [options.restartDelayMs] - Delay before respawning a crashed worker
+     * @param {number} [options.maxRestartDelayMs] - Backoff cap for workers that fail to start
+     * @param {number} [options.maxFailedStarts] - Consecutive failed starts before a worker is given up
+     * @param {number} [options.cores] - CPU cores for this pool (default: all)
+     * @param {number} [options.processesPerWorker] - CPU task processes per worker (default: cores / size)
+     */
+    constructor(options = {}) {
+        if (!options.script) {
+            throw new Error("PythonWorkerPool requires a script path");
+        }
+        const policy = options.policy || "least-outstanding";
+        if (!POLICIES.includes(policy)) {
+            throw new Error(`Unknown PythonWorkerPool policy: ${policy}`);
+        }
+
+        this.script = options.script;
+        this.name = options.name || "python-adapter";
+        this.size = Math.max(1, options.size || 1);
+        this.policy = policy;
+        this.timeoutMs = options.timeoutMs !== undefined ? options.timeoutMs : 30000;
+        this.maxAttempts = Math.max(1, options.maxAttempts || 3);
+        this.restartDelayMs = options.restartDelayMs !== undefined ? options.restartDelayMs : 250;
+        this.maxRestartDelayMs = options.maxRestartDelayMs || 30000;
+        this.maxFailedStarts = Math.max(1, options.maxFailedStarts || 5);
+
+        this.workers = [];
+        this.waiting = []; // requests parked while no worker is alive
+        this.nextRequestId = 1;
+        this.rrCursor = 0;
+        this.started = false;
+        this.closed = false;
+
+        const workerOptions = {
+            command: options.command,
+            processes: options.processesPerWorker || Math.max(1, Math.floor((options.cores || os.cpus().length) / this.size)),
+        };
+        const callbacks = {
+            onReply: (worker, entry, err, response) => this.onReply(worker, entry, err, response),
+            onExit: (worker, code, orphaned, spawnFailed) => this.onWorkerExit(worker, code, orphaned, spawnFailed),
+        };
+        for (let i = 0; i < this.size; i++) {
+            this.workers.push(new PythonWorker(i, this.script, callbacks, workerOptions));
+        }
+    }
+
+    start() {
+        if (this.started) return;
+        this.started = true;
+        this.closed = false;
+        for (const worker of this.workers) {
+            worker.failedStarts = 0;
+            worker.gaveUp = false;
+            worker.start();
+        }
+    }
+
+    // Every worker was given up on: nothing will ever answer
+    get failed() {
+        return this.workers.every(w => w.gaveUp);
+    }
+
+    failedError() {
+        return new Error(`Python adapter workers failed to start ${this.maxFailedStarts} times in a row (${this.workers[0].command} ${this.script})`);
+    }
+
+    /**
+     * Send a task to the pool.
+     * @param {Object} udm - Task for python-adapter.py
+     * @param {Object} [options]
+     * @param {number} [options.timeoutMs]
+     * @returns {Promise<Object>} The adapter's response
+     */
+    send(udm, options = {}) {
+        if (!this.started) this.start();
+        if (this.failed) return Promise.reject(this.failedError());
+
+        return new Promise((resolve, reject) => {
+            const entry = {
+                id: this.nextRequestId++,
+                udm,
+                resolve,
+                reject,
+                attempts: 0,
+                timer: null,
+                worker: null,
+                done: false,
+            };
+
+            const timeoutMs = options.timeoutMs ?? this.timeoutMs;
+            if (timeoutMs > 0) {
+                // The entry stays in worker.pending until the late reply (or the
+                // worker's exit), so a stuck worker keeps counting as busy
+                entry.timer = setTimeout(() => {
+                    this.finish(entry, new Error(`Python adapter request ${entry.id} timed out after ${timeoutMs}ms`));
+                }, timeoutMs);
+            }
+
+            this.dispatch(entry);
+        });
+    }
+
+    pickWorker() {
+        const live = this.workers.filter(w => w.alive);
+        if (live.length === 0) return null;
+
+        if (this.policy === "round-robin") {
+            const worker = live[this.rrCursor % live.length];
+            this.rrCursor = (this.rrCursor + 1) % live.length;
+            return worker;
+        }
+
+        // least-outstanding: rotate the starting point so ties spread evenly
+        const start = this.rrCursor++ % live.length;
+        let best = live[start];
+        for (let i = 1; i < live.length; i++) {
+            const candidate = live[(start + i) % live.length];
+            if (candidate.outstanding < best.outstanding) best = candidate;
+        }
+        return best;
+    }
+
+    dispatch(entry) {
+        if (entry.done) return;
+
+        const worker = this.pickWorker();
+        if (!worker) {
+            this.waiting.push(entry);
+            return;
+        }
+
+        entry.attempts += 1;
+        worker.send(entry);
+    }
+
+    finish(entry, err, response) {
+        if (entry.done) return;
+        entry.done = true;
+        if (entry.timer) clearTimeout(entry.timer);
+        if (err) entry.reject(err);
+        else entry.resolve(response);
+    }
+
+    onReply(worker, entry, err, response) {
+        const latencyMs = Number(process.hrtime.bigint() - entry.sentAt) / 1e6;
+        const isError = !!err || (response && response.status === "error");
+        smartRouter.recordMessage(`${this.name}#${worker.index}`, isError, latencyMs, {
+            queueDepth: worker.outstanding,
+        });
+        this.finish(entry, err, response);
+    }
+
+    onWorkerExit(worker, code, orphaned, spawnFailed) {
+        logger.error(`[PythonWorkerPool] Worker #${worker.index} exited with code ${code}`, {
+            orphaned: orphaned.length,
+        });
+        smartRouter.recordMessage(`${this.name}#${worker.index}`, true, 0, { queueDepth: 0 });
+
+        if (this.closed) {
+            for (const entry of orphaned) this.finish(entry, new Error("Python adapter pool closed"));
+            return;
+        }
+
+        // Re-dispatch work the dead worker never answered
+        for (const entry of orphaned) {
+            // A process that never spawned never saw the request
+            if (spawnFailed) entry.attempts -= 1;
+            if (entry.attempts >= this.maxAttempts) {
+                this.finish(entry, new Error(`Python adapter exited (after ${entry.attempts} attempts)`));
+            } else {
+                this.dispatch(entry);
+            }
+        }
+
+        if (worker.failedStarts >= this.maxFailedStarts) {
+            worker.gaveUp = true;
+            logger.error(`[PythonWorkerPool] Worker #${worker.index} failed to start ${worker.failedStarts} times in a row; not restarting it`);
+            if (this.failed) {
+                const parked = this.waiting;
+                this.waiting = [];
+                for (const entry of parked) this.finish(entry, this.failedError());
+            }
+            return;
+        }
+
+        // Back off exponentially while a worker keeps failing to start
+        const delay = worker.failedStarts > 0
+            ? Math.min(this.maxRestartDelayMs, this.restartDelayMs * 2 ** (worker.failedStarts - 1))
+            : this.restartDelayMs;
+        worker.restarts += 1;
+        setTimeout(() => {
+            if (this.closed || worker.alive) return;
+            worker.start();
+            this.drainWaiting();
+        }, delay);
+    }
+
+    drainWaiting() {
+        const parked = this.waiting;
+        this.waiting = [];
+        for (const entry of parked) this.dispatch(entry);
+    }
+
+    /**
+     * Per-worker snapshot of load for diagnostics.
+     */
+    getStats() {
+        return {
+            name: this.name,
+            policy: this.policy,
+            size: this.size,
+            waiting: this.waiting.length,
+            workers: this.workers.map(w => ({
+                index: w.index,
+                pid: w.process ? w.process.pid : null,
+                alive: w.alive,
+                outstanding: w.outstanding,
+                restarts: w.restarts,
+                failedStarts: w.failedStarts,
+                gaveUp: w.gaveUp,
+            })),
+        };
+    }
+
+    close() {
+        this.closed = true;
+        this.started = false;
+        for (const worker of this.workers) {
+            for (const entry of worker.stop()) this.finish(entry, new Error("Python adapter pool closed"));
+        }
+        for (const entry of this.waiting) this.finish(entry, new Error("Python adapter pool closed"));
+        this.waiting = [];
+    }
+}
+
+module.exports = PythonWorkerPool;
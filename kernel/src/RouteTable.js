@@ -0,0 +1,115 @@
+// kernel/src/RouteTable.js
+
+// Canary share is expressed in basis points (1/100 of a percent)
+const CANARY_SCALE = 10000;
+
+/**
+ * Weighted / canary adapter selection per target. JS fallback for the native
+ * RoutingEngine (kernel/rust/src/routing_engine.rs): same methods, same
+ * algorithm, so both pick the same adapters in the same order.
+ *
+ * Backends are chosen by smooth weighted round-robin, skipping unavailable
+ * adapters. A canary takes `basis_points` / 10000 of the traffic: sticky per
+ * key when a key is given, an exact share of calls otherwise.
+ */
+class RouteTable {
+    constructor() {
+        this.routes = new Map();        // target -> { backends, canary, canaryBp, canaryAcc }
+        this.unavailable = new Set();
+    }
+
+    _route(target) {
+        let route = this.routes.get(target);
+        if (!route) {
+            route = { backends: [], canary: null, canaryBp: 0, canaryAcc: 0 };
+            this.routes.set(target, route);
+        }
+        return route;
+    }
+
+    registerRoute(target, adapterId) {
+        const route = this._route(target);
+        if (!route.backends.some(b => b.id === adapterId)) {
+            route.backends.push({ id: adapterId, weight: 1, current: 0 });
+        }
+    }
+
+    /**
+     * Replace the weighted adapters of a target. An empty list removes the route.
+     */
+    setBackends(target, ids, weights = []) {
+        if (ids.length === 0) {
+            this.routes.delete(target);
+            return;
+        }
+        this._route(target).backends = ids.map((id, i) => ({
+            id,
+            weight: weights[i] !== undefined ? weights[i] : 1,
+            current: 0,
+        }));
+    }
+
+    setCanary(target, adapterId, basisPoints) {
+        const route = this._route(target);
+        route.canary = adapterId || null;
+        route.canaryBp = Math.min(CANARY_SCALE, basisPoints >>> 0);
+        route.canaryAcc = 0;
+    }
+
+    setAvailable(adapterId, available) {
+        if (available) this.unavailable.delete(adapterId);
+        else this.unavailable.add(adapterId);
+    }
+
+    /**
+     * @param {string} target
+     * @param {number} [key] - uint32, e.g. a hashed trace id
+     * @returns {string|null} Adapter id, or null when the target has no route
+     */
+    select(target, key) {
+        const route = this.routes.get(target);
+        if (!route) return null;
+
+        if (route.canary && route.canaryBp > 0 && !this.unavailable.has(route.canary)) {
+            let hit;
+            if (key !== undefined && key !== null) {
+                hit = key % CANARY_SCALE < route.canaryBp;
+            } else {
+                route.canaryAcc += route.canaryBp;
+                hit = route.canaryAcc >= CANARY_SCALE;
+                if (hit) route.canaryAcc -= CANARY_SCALE;
+            }
+            if (hit) return route.canary;
+        }
+
+        let total = 0;
+        let best = null;
+        for (const backend of route.backends) {
+            if (backend.weight <= 0 || this.unavailable.has(backend.id)) continue;
+            backend.current += backend.weight;
+            total += backend.weight;
+            if (!best || backend.current > best.current) best = backend;
+        }
+        if (!best) return null;
+        best.current -= total;
+        return best.id;
+    }
+
+    /**
+     * @param {string[]} targets
+     * @param {Uint32Array} [keys] - 0xFFFFFFFF means no key
+     * @returns {Array<string|null>}
+     */
+    selectBatch(targets, keys) {
+        const out = new Array(targets.length);
+        for (let i = 0; i < targets.length; i++) {
+            const key = keys && i < keys.length && keys[i] !== 0xFFFFFFFF ? keys[i] : undefined;
+            out[i] = this.select(targets[i], key);
+        }
+        return out;
+    }
+}
+
+RouteTable.CANARY_SCALE = CANARY_SCALE;
+
+module.exports = RouteTable;
@@ -0,0 +1,112 @@
+// kernel/src/SharedPayloadRing.js
+const fs = require("fs");
+const os = require("os");
+const path = require("path");
+const logger = require("./logger");
+
+// tmpfs-backed where available, so the ring never touches disk
+const SHM_DIR = fs.existsSync("/dev/shm") ? "/dev/shm" : os.tmpdir();
+const ALIGN = 8;
+
+let ringSequence = 0;
+
+/**
+ * Fixed-size ring buffer in a memory-mapped file shared with co-located
+ * python-adapter.py workers. Large payloads are written here once and the
+ * envelope only carries a {path, offset, length} handle, which the Python
+ * side maps without copying. Regions are released after the reply; space is
+ * reclaimed in allocation order, so one slow request holds back later ones.
+ */
+class SharedPayloadRing {
+    /**
+     * @param {Object} options
+     * @param {number} options.size - Ring size in bytes
+     * @param {string} [options.name] - Used in the backing file name
+     * @param {string} [options.dir] - Directory for the backing file
+     */
+    constructor(options = {}) {
+        if (!(options.size > 0)) {
+            throw new Error("SharedPayloadRing requires a positive size");
+        }
+        this.size = options.size;
+        this.name = options.name || "python-adapter";
+        this.path = path.join(options.dir || SHM_DIR, `unikernal-${this.name}-${process.pid}-${++ringSequence}.ring`);
+        this.fd = null;
+        this.head = 0;       // next free byte
+        this.regions = [];   // live regions, oldest first
+    }
+
+    open() {
+        if (this.fd !== null) return;
+        this.fd = fs.openSync(this.path, "w+", 0o600);
+        fs.ftruncateSync(this.fd, this.size);
+        logger.info(`[SharedPayloadRing] Mapped ${this.size} bytes at ${this.path}`);
+    }
+
+    get bytesInUse() {
+        return this.regions.reduce((sum, r) => sum + r.reserved, 0);
+    }
+
+    allocate(length) {
+        const reserved = Math.max(ALIGN, Math.ceil(length / ALIGN) * ALIGN);
+        if (reserved > this.size) return null;
+
+        let offset;
+        if (this.regions.length === 0) {
+            offset = 0;
+        } else {
+            const tail = this.regions[0].offset;
+            if (this.head > tail) {
+                // free space is [head, size) and [0, tail)
+                if (this.head + reserved <= this.size) offset = this.head;
+                else if (reserved <= tail) offset = 0;
+                else return null;
+            } else if (this.head + reserved <= tail) {
+                offset = this.head;
+            } else {
+                return null;
+            }
+        }
+
+        const region = { path: this.path, offset, length, reserved, released: false };
+        this.regions.push(region);
+        this.head = offset + reserved;
+        return region;
+    }
+
+    /**
+     * Copy bytes into the ring.
+     * @param {Buffer|TypedArray} bytes
+     * @returns {Object|null} Region handle, or null when the ring is full
+     */
+    write(bytes) {
+        this.open();
+        const view = Buffer.isBuffer(bytes) ? bytes : Buffer.from(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+        const region = this.allocate(view.length);
+        if (!region) return null;
+        fs.writeSync(this.fd, view, 0, view.length, region.offset);
+        return region;
+    }
+
+    release(region) {
+        if (!region || region.released) return;
+        region.released = true;
+        while (this.regions.length && this.regions[0].released) this.regions.shift();
+        if (this.regions.length === 0) this.head = 0;
+    }
+
+    close() {
+        if (this.fd === null) return;
+        fs.closeSync(this.fd);
+        this.fd = null;
+        this.regions = [];
+        this.head = 0;
+        try {
+            fs.unlinkSync(this.path);
+        } catch (err) {
+            logger.warn(`[SharedPayloadRing] Could not remove ${this.path}`, { error: err.message });
+        }
+    }
+}
+
+module.exports = SharedPayloadRing;
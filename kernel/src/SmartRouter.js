@@ -1,9 +1,190 @@
 const logger = require("./logger");
+const LatencyHistogram = require("./LatencyHistogram");
+const RouteTable = require("./RouteTable");
+const { loadNativeEngine } = require("./nativeRouter");
 
+// How long /health may reuse its adapter summary
+const SUMMARY_TTL_MS = 1000;
+
+// Metric records buffered before one call into the native engine
+const NATIVE_BATCH = 256;
+const NO_KEY = 0xFFFFFFFF;
+
+// Route metrics label for targets that are neither declared, routed nor registered
+const UNKNOWN_TARGET = "unknown";
+
+// Snapshot layout from the native engine: [total, errors, count, sum, min, max, buckets...]
+const SNAPSHOT_HEADER = 6;
+
+// FNV-1a: routing keys (trace ids, sources) -> uint32 for sticky canary selection
+function hashKey(key) {
+    if (typeof key === "number") return key >>> 0;
+    const text = String(key);
+    let hash = 0x811c9dc5;
+    for (let i = 0; i < text.length; i++) {
+        hash ^= text.charCodeAt(i);
+        hash = Math.imul(hash, 0x01000193);
+    }
+    return (hash >>> 0) % NO_KEY;
+}
+
+function copySnapshot(histogram, snapshot) {
+    histogram.count = snapshot[2];
+    histogram.sum = snapshot[3];
+    histogram.min = snapshot[4];
+    histogram.max = snapshot[5];
+    histogram.counts.set(snapshot.subarray(SNAPSHOT_HEADER, SNAPSHOT_HEADER + histogram.counts.length));
+}
+
+function newServiceMetrics() {
+    return {
+        total: 0,
+        errors: 0,
+        lastActive: null,           // epoch ms, formatted on read
+        latency: new LatencyHistogram(),
+        gauges: {},
+    };
+}
+
+function newRouteMetrics() {
+    return {
+        inFlight: 0,
+        latency: new LatencyHistogram(),
+        errorCodes: new Map(),      // error_code -> count
+    };
+}
+
+/**
+ * Service registry, adapter selection and routing metrics.
+ *
+ * When the Rust RoutingEngine addon is built it takes over adapter selection
+ * and latency aggregation: metric records are buffered in typed arrays and
+ * handed over NATIVE_BATCH at a time, and the JS metric objects are refreshed
+ * from native snapshots on read (syncMetrics). Otherwise the JS RouteTable and
+ * LatencyHistogram do the same work in-process.
+ */
 class SmartRouter {
-    constructor() {
+    /**
+     * @param {Object} [options] - { native: RoutingEngine class, or false to force the JS path }
+     */
+    constructor(options = {}) {
         this.routes = {};
-        this.metrics = new Map();
+        this.metrics = new Map();       // serviceId -> service metrics (recordMessage)
+        this.routeMetrics = new Map();  // target -> end-to-end routing metrics (routeUDL)
+        this.targets = new Set();       // declared or routed targets (see routeLabel)
+        this.inFlight = 0;
+        this.summaryCache = null;
+        this.summaryCachedAt = 0;
+
+        const NativeEngine = options.native !== undefined ? options.native : loadNativeEngine();
+        this.native = NativeEngine ? new NativeEngine() : null;
+        this.table = this.native || new RouteTable();
+        this.pending = this.native ? {
+            slots: new Uint32Array(NATIVE_BATCH),
+            latencies: new Float64Array(NATIVE_BATCH),
+            errors: new Uint8Array(NATIVE_BATCH),
+            count: 0,
+        } : null;
+    }
+
+    _serviceMetrics(serviceId) {
+        let current = this.metrics.get(serviceId);
+        if (!current) {
+            current = newServiceMetrics();
+            if (this.native) current.slot = this.native.slot(serviceId);
+            this.metrics.set(serviceId, current);
+        }
+        return current;
+    }
+
+    _record(slot, latencyMs, isError) {
+        const pending = this.pending;
+        const i = pending.count++;
+        pending.slots[i] = slot;
+        pending.latencies[i] = latencyMs;
+        pending.errors[i] = isError ? 1 : 0;
+        if (pending.count === NATIVE_BATCH) this.flushMetrics();
+    }
+
+    /**
+     * Hand buffered metric records to the native engine.
+     */
+    flushMetrics() {
+        const pending = this.pending;
+        if (!pending || pending.count === 0) return;
+        this.native.recordBatch(pending.slots, pending.latencies, pending.errors, pending.count);
+        pending.count = 0;
+    }
+
+    /**
+     * Refresh the JS metric objects from the native engine. Readers of
+     * `metrics` / `routeMetrics` call this first; it is a no-op on the JS path.
+     */
+    syncMetrics() {
+        if (!this.native) return;
+        this.flushMetrics();
+        for (const current of this.metrics.values()) {
+            const snapshot = this.native.snapshot(current.slot);
+            current.total = snapshot[0];
+            current.errors = snapshot[1];
+            copySnapshot(current.latency, snapshot);
+        }
+        for (const route of this.routeMetrics.values()) {
+            copySnapshot(route.latency, this.native.snapshot(route.slot));
+        }
+    }
+
+    /**
+     * Spread a target over weighted adapters, optionally with a canary.
+     * Adapters that are not registered yet are skipped until they are.
+     * @param {string} target
+     * @param {Array<string|{id: string, weight: number}>} backends - [] removes the route
+     * @param {Object} [options] - { canary: adapterId|null, canaryPercent: 0-100 }
+     */
+    setRoute(target, backends, options = {}) {
+        const list = backends.map(b => (typeof b === "string" ? { id: b, weight: 1 } : b));
+        const ids = list.map(b => b.id);
+        this.table.setBackends(target, ids, list.map(b => (b.weight !== undefined ? b.weight : 1)));
+        if (options.canary !== undefined) {
+            this.table.setCanary(target, options.canary, Math.round((options.canaryPercent || 0) * 100));
+            if (options.canary) ids.push(options.canary);
+        }
+        for (const id of ids) this.table.setAvailable(id, !!this.routes[id]);
+        if (ids.length > 0) this.targets.add(target);
+        logger.info(`[SmartRouter] Route ${target} -> ${ids.join(", ") || "(removed)"}`);
+    }
+
+    /**
+     * Adapter id to send a message for `target` to. Targets without a
+     * configured route resolve to themselves.
+     * @param {string} target
+     * @param {string|number} [key] - Sticky key for canary selection (e.g. trace id)
+     * @returns {string}
+     */
+    resolve(target, key) {
+        return this.table.select(target, key === undefined || key === null ? undefined : hashKey(key)) || target;
+    }
+
+    /**
+     * resolve() for many messages with one call into the routing engine.
+     * @param {string[]} targets
+     * @param {Array<string|number>} [keys]
+     * @returns {string[]}
+     */
+    resolveBatch(targets, keys) {
+        let keyArray;
+        if (keys) {
+            keyArray = new Uint32Array(targets.length);
+            for (let i = 0; i < targets.length; i++) {
+                const key = keys[i];
+                keyArray[i] = key === undefined || key === null ? NO_KEY : hashKey(key);
+            }
+        }
+        const selected = this.table.selectBatch(targets, keyArray);
+        for (let i = 0; i < selected.length; i++) {
+            if (!selected[i]) selected[i] = targets[i];
+        }
+        return selected;
     }
 
     /**
@@ -13,15 +194,9 @@ class SmartRouter {
      */
     register(serviceId, ws) {
         this.routes[serviceId] = ws;
-
-        if (!this.metrics.has(serviceId)) {
-            this.metrics.set(serviceId, {
-                total: 0,
-                errors: 0,
-                lastActive: null,
-                latency: []
-            });
-        }
+        this.summaryCache = null;
+        this.table.setAvailable(serviceId, true);
+        this._serviceMetrics(serviceId);
         logger.info(`[SmartRouter] Registered route: ${serviceId}`);
     }
 
@@ -32,6 +207,8 @@ class SmartRouter {
     unregister(serviceId) {
         if (this.routes[serviceId]) {
             delete this.routes[serviceId];
+            this.summaryCache = null;
+            this.table.setAvailable(serviceId, false);
             logger.info(`[SmartRouter] Unregistered route: ${serviceId}`);
         }
     }
@@ -50,25 +227,75 @@ class SmartRouter {
      * @param {string} serviceId 
      * @param {boolean} isError 
      * @param {number} latencyMs 
+     * @param {Object} [gauges] - Point-in-time values to keep (e.g. { queueDepth })
      */
-    recordMessage(serviceId, isError = false, latencyMs = 0) {
-        const current = this.metrics.get(serviceId) || {
-            total: 0,
-            errors: 0,
-            lastActive: null,
-            latency: []
-        };
+    recordMessage(serviceId, isError = false, latencyMs = 0, gauges = null) {
+        const current = this._serviceMetrics(serviceId);
+        current.lastActive = Date.now();
+        if (gauges) Object.assign(current.gauges, gauges);
 
+        if (this.native) {
+            this._record(current.slot, latencyMs, isError);
+            return;
+        }
         current.total += 1;
-        current.lastActive = new Date().toISOString();
         if (isError) current.errors += 1;
+        if (latencyMs > 0) current.latency.record(latencyMs);
+    }
 
-        if (latencyMs > 0) {
-            current.latency.push(latencyMs);
-            if (current.latency.length > 10) current.latency.shift();
+    /**
+     * Give a target its own route metrics even while no adapter is registered
+     * for it (e.g. the kernel's internal services).
+     * @param {string} target
+     */
+    declareTarget(target) {
+        this.targets.add(target);
+    }
+
+    /**
+     * Route metrics label for a message target. Only declared, routed and
+     * registered targets get a histogram of their own; anything else a client
+     * sends is counted under "unknown" so the label set stays bounded.
+     * @param {string} target
+     * @returns {string}
+     */
+    routeLabel(target) {
+        return this.targets.has(target) || this.routes[target] ? target : UNKNOWN_TARGET;
+    }
+
+    /**
+     * Mark the start of an end-to-end routing call (see routeUDL).
+     * Pass routeLabel(target), not a raw client target.
+     * @param {string} target
+     * @returns {bigint} Start time to pass to finishRoute()
+     */
+    startRoute(target) {
+        let route = this.routeMetrics.get(target);
+        if (!route) {
+            route = newRouteMetrics();
+            if (this.native) route.slot = this.native.slot(`\0route\0${target}`);
+            this.routeMetrics.set(target, route);
         }
+        route.inFlight += 1;
+        this.inFlight += 1;
+        return process.hrtime.bigint();
+    }
 
-        this.metrics.set(serviceId, current);
+    /**
+     * Record the outcome of a routing call started with startRoute().
+     * @param {string} target
+     * @param {bigint} startedAt
+     * @param {string|null} errorCode - e.g. "TARGET_NOT_FOUND", null on success
+     */
+    finishRoute(target, startedAt, errorCode = null) {
+        const route = this.routeMetrics.get(target);
+        if (!route) return;
+        route.inFlight -= 1;
+        this.inFlight -= 1;
+        const latencyMs = Number(process.hrtime.bigint() - startedAt) / 1e6;
+        if (this.native) this._record(route.slot, latencyMs, !!errorCode);
+        else route.latency.record(latencyMs);
+        if (errorCode) route.errorCodes.set(errorCode, (route.errorCodes.get(errorCode) || 0) + 1);
     }
 
     /**
@@ -76,7 +303,40 @@ class SmartRouter {
      * @param {string} serviceId 
      */
     getMetrics(serviceId) {
-        return this.metrics.get(serviceId);
+        this.syncMetrics();
+        const current = this.metrics.get(serviceId);
+        if (!current) return undefined;
+        return {
+            total: current.total,
+            errors: current.errors,
+            lastActive: current.lastActive ? new Date(current.lastActive).toISOString() : null,
+            latency: current.latency.snapshot(),
+            ...current.gauges,
+        };
+    }
+
+    /**
+     * Per-adapter status for /health. Cached for SUMMARY_TTL_MS so frequent
+     * probes don't rebuild it; register/unregister invalidate the cache.
+     */
+    getAdapterSummary() {
+        const now = Date.now();
+        if (this.summaryCache && now - this.summaryCachedAt < SUMMARY_TTL_MS) {
+            return this.summaryCache;
+        }
+        this.syncMetrics();
+        this.summaryCache = Object.keys(this.routes).map(id => {
+            const m = this.metrics.get(id);
+            return {
+                id,
+                status: this.routes[id]?.readyState === 1 ? "connected" : "disconnected",
+                messages: m?.total || 0,
+                lastActive: m?.lastActive ? new Date(m.lastActive).toISOString() : null,
+                errors: m?.errors || 0
+            };
+        });
+        this.summaryCachedAt = now;
+        return this.summaryCache;
     }
 
     /**
@@ -99,3 +359,6 @@ class SmartRouter {
 
 const smartRouter = new SmartRouter();
 module.exports = smartRouter;
+module.exports.SmartRouter = SmartRouter;
+module.exports.hashKey = hashKey;
+module.exports.UNKNOWN_TARGET = UNKNOWN_TARGET;
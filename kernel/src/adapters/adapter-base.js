@@ -54,9 +54,10 @@ class AdapterBase {
      * Helper to stream data back to Kernel/Caller
      * @param {string} streamId 
      * @param {any} data 
+     * @returns {boolean} false when the stream is full; wait for umb.onStreamDrain()
      */
     stream(streamId, data) {
-        umb.streamPush(streamId, data);
+        return umb.streamPush(streamId, data);
     }
 
     /**
@@ -0,0 +1,361 @@
+// kernel/src/admission.js
+const config = require('./config/config');
+
+// Priority classes carried in meta.priority, highest first
+const PRIORITIES = ['critical', 'high', 'normal', 'low'];
+const NORMAL = 2;
+
+// Share of a target's queue each class may fill, so lower classes are shed first
+const QUEUE_SHARE = [1, 1, 0.8, 0.5];
+
+const MIN_RETRY_MS = 100;
+const MAX_RETRY_MS = 30000;
+
+// "python-adapter=8:64,ai-service=4" -> Map { target -> { maxInFlight, maxQueue } }
+function parseTargetLimits(text) {
+    const limits = new Map();
+    for (const part of (text || '').split(',')) {
+        const [target, value] = part.split('=').map(s => s && s.trim());
+        if (!target || !value) continue;
+        const [inFlight, queue] = value.split(':').map(v => parseInt(v, 10));
+        limits.set(target, {
+            ...(inFlight > 0 ? { maxInFlight: inFlight } : {}),
+            ...(queue >= 0 ? { maxQueue: queue } : {}),
+        });
+    }
+    return limits;
+}
+
+/**
+ * Priority class index for a UDL message (meta.priority), "normal" by default.
+ */
+function priorityOf(message) {
+    const priority = message && message.meta && message.meta.priority;
+    if (typeof priority === 'number' && priority >= 0 && priority < PRIORITIES.length) return Math.floor(priority);
+    const index = PRIORITIES.indexOf(priority);
+    return index >= 0 ? index : NORMAL;
+}
+
+class OverloadedError extends Error {
+    constructor(target, reason, retryAfterMs) {
+        super(`Target ${target} is overloaded (${reason})`);
+        this.code = 'OVERLOADED';
+        this.target = target;
+        this.reason = reason;
+        this.retryAfterMs = retryAfterMs;
+    }
+}
+
+/**
+ * Admission control for the kernel data plane.
+ *
+ * Each target gets `maxInFlight` concurrent calls; callers beyond that wait
+ * in a bounded queue per priority class and are admitted highest class
+ * first. When a queue is full the caller gets an OVERLOADED reply with a
+ * retry-after estimate instead of being buffered; a higher class may displace
+ * a queued lower-class call. Sockets are checked against high/low watermarks
+ * on bufferedAmount, with hysteresis, before anything more is written to them.
+ */
+class AdmissionController {
+    /**
+     * @param {Object} [options] - { maxInFlight, maxQueue, maxQueuedTotal, queueTimeoutMs,
+     *                               targetLimits (Map), wsHighWaterMark, wsLowWaterMark }
+     */
+    constructor(options = {}) {
+        this.maxInFlight = options.maxInFlight || 64;
+        this.maxQueue = options.maxQueue !== undefined ? options.maxQueue : 256;
+        this.maxQueuedTotal = options.maxQueuedTotal || 10000;
+        this.queueTimeoutMs = options.queueTimeoutMs || 5000;
+        this.wsHighWaterMark = options.wsHighWaterMark || 8 * 1024 * 1024;
+        this.wsLowWaterMark = options.wsLowWaterMark !== undefined ? options.wsLowWaterMark : 1024 * 1024;
+        this.targetLimits = options.targetLimits || new Map();
+
+        this.targets = new Map();       // target -> state
+        this.queuedTotal = 0;
+        this.congested = new WeakSet(); // sockets above the high watermark, until below the low one
+    }
+
+    _target(target) {
+        let state = this.targets.get(target);
+        if (!state) {
+            const limits = this.targetLimits.get(target) || {};
+            state = {
+                maxInFlight: limits.maxInFlight || this.maxInFlight,
+                maxQueue: limits.maxQueue !== undefined ? limits.maxQueue : this.maxQueue,
+                inFlight: 0,
+                queues: PRIORITIES.map(() => []),
+                queued: 0,
+                admitted: 0,
+                avgServiceMs: 0,
+                rejected: { queue_full: 0, queue_timeout: 0, shed: 0, socket_backpressure: 0 },
+            };
+            this.targets.set(target, state);
+        }
+        return state;
+    }
+
+    /**
+     * Override the limits of one target.
+     * @param {string} target
+     * @param {Object} limits - { maxInFlight, maxQueue }
+     */
+    setLimits(target, limits) {
+        this.targetLimits.set(target, { ...this.targetLimits.get(target), ...limits });
+        const state = this.targets.get(target);
+        if (state) {
+            if (limits.maxInFlight) state.maxInFlight = limits.maxInFlight;
+            if (limits.maxQueue !== undefined) state.maxQueue = limits.maxQueue;
+            this._drain(state);
+        }
+    }
+
+    /**
+     * Take a slot if one is free and nobody is waiting. Pair with release().
+     * @returns {boolean}
+     */
+    tryAcquire(target) {
+        const state = this._target(target);
+        if (state.inFlight < state.maxInFlight && state.queued === 0) {
+            state.inFlight++;
+            state.admitted++;
+            return true;
+        }
+        return false;
+    }
+
+    /**
+     * Wait for a slot. Returns null when the caller must be turned away now;
+     * otherwise a promise that resolves once admitted (pair with release())
+     * or rejects with an OverloadedError when shed or timed out.
+     * @param {string} target
+     * @param {number} [priority] - Index into PRIORITIES
+     * @returns {Promise|null}
+     */
+    enqueue(target, priority = NORMAL) {
+        const state = this._target(target);
+        const share = Math.floor(state.maxQueue * QUEUE_SHARE[priority]);
+        if ((state.queued >= share || this.queuedTotal >= this.maxQueuedTotal) && !this._shed(target, state, priority)) {
+            state.rejected.queue_full++;
+            return null;
+        }
+
+        return new Promise((resolve, reject) => {
+            const entry = { resolve, reject, priority, timer: null };
+            entry.timer = setTimeout(() => {
+                const queue = state.queues[priority];
+                const index = queue.indexOf(entry);
+                if (index < 0) return;
+                queue.splice(index, 1);
+                state.queued--;
+                this.queuedTotal--;
+                state.rejected.queue_timeout++;
+                reject(new OverloadedError(target, 'queue_timeout', this.retryAfter(target)));
+            }, this.queueTimeoutMs);
+            state.queues[priority].push(entry);
+            state.queued++;
+            this.queuedTotal++;
+        });
+    }
+
+    // Make room for `priority` by dropping the newest call of a lower class
+    _shed(target, state, priority) {
+        for (let p = PRIORITIES.length - 1; p > priority; p--) {
+            const entry = state.queues[p].pop();
+            if (!entry) continue;
+            clearTimeout(entry.timer);
+            state.queued--;
+            this.queuedTotal--;
+            state.rejected.shed++;
+            entry.reject(new OverloadedError(target, 'shed', this.retryAfter(target)));
+            return true;
+        }
+        return false;
+    }
+
+    /**
+     * Give back a slot taken by tryAcquire()/enqueue().
+     * @param {string} target
+     * @param {number} [serviceMs] - How long the call held the slot
+     */
+    release(target, serviceMs) {
+        const state = this.targets.get(target);
+        if (!state) return;
+        state.inFlight--;
+        if (serviceMs >= 0) {
+            state.avgServiceMs = state.avgServiceMs ? state.avgServiceMs * 0.9 + serviceMs * 0.1 : serviceMs;
+        }
+        this._drain(state);
+    }
+
+    _drain(state) {
+        while (state.queued > 0 && state.inFlight < state.maxInFlight) {
+            const queue = state.queues.find(q => q.length > 0);
+            const entry = queue.shift();
+            clearTimeout(entry.timer);
+            state.queued--;
+            this.queuedTotal--;
+            state.inFlight++;
+            state.admitted++;
+            entry.resolve();
+        }
+    }
+
+    /**
+     * Estimated wait before a retry can be admitted: the current queue served
+     * at the observed per-call time across the target's slots.
+     */
+    retryAfter(target) {
+        const state = this._target(target);
+        const perCallMs = state.avgServiceMs || 50;
+        const estimate = Math.ceil(((state.queued + 1) * perCallMs) / state.maxInFlight);
+        return Math.min(MAX_RETRY_MS, Math.max(MIN_RETRY_MS, estimate));
+    }
+
+    /**
+     * The OVERLOADED reply for a rejected call.
+     * @param {string} target
+     * @param {string|OverloadedError} reason
+     */
+    overloaded(target, reason) {
+        let retryAfterMs;
+        if (reason instanceof OverloadedError) {
+            retryAfterMs = reason.retryAfterMs;
+            reason = reason.reason;
+        } else {
+            retryAfterMs = this.retryAfter(target);
+            if (reason === 'socket_backpressure') this._target(target).rejected.socket_backpressure++;
+        }
+        return {
+            status: 'error',
+            error: true,
+            error_code: 'OVERLOADED',
+            reason,
+            target,
+            message: `Target ${target} is overloaded (${reason}); retry after ${retryAfterMs}ms`,
+            retry_after_ms: retryAfterMs,
+        };
+    }
+
+    /**
+     * Whether more may be written to a socket. Becomes false once
+     * bufferedAmount reaches the high watermark and stays false until it
+     * falls to the low watermark.
+     * @param {WebSocket} ws
+     */
+    socketWritable(ws) {
+        const buffered = ws.bufferedAmount || 0;
+        if (this.congested.has(ws)) {
+            if (buffered > this.wsLowWaterMark) return false;
+            this.congested.delete(ws);
+            return true;
+        }
+        if (buffered >= this.wsHighWaterMark) {
+            this.congested.add(ws);
+            return false;
+        }
+        return true;
+    }
+
+    getStats() {
+        const targets = {};
+        for (const [target, s] of this.targets) {
+            targets[target] = {
+                inFlight: s.inFlight,
+                queued: s.queued,
+                maxInFlight: s.maxInFlight,
+                maxQueue: s.maxQueue,
+                admitted: s.admitted,
+                avgServiceMs: Math.round(s.avgServiceMs * 1000) / 1000,
+                rejected: { ...s.rejected },
+            };
+        }
+        return { queued: this.queuedTotal, targets };
+    }
+}
+
+/**
+ * Inbound backpressure for one WebSocket connection: stops reading while it
+ * has too many requests in flight or is not reading its replies, instead of
+ * buffering. bufferedAmount has no event, so one timer polls it while paused.
+ */
+class ConnectionFlow {
+    /**
+     * @param {WebSocket} ws
+     * @param {AdmissionController} controller - Supplies the socket watermarks
+     * @param {Object} [options] - { maxInFlight, pollMs }
+     */
+    constructor(ws, controller, options = {}) {
+        this.ws = ws;
+        this.controller = controller;
+        this.maxInFlight = options.maxInFlight || 64;
+        this.pollMs = options.pollMs || 20;
+        this.inFlight = 0;
+        this.paused = false;
+        this.pollTimer = null;
+        this.closed = false;
+    }
+
+    begin() {
+        this.inFlight++;
+        this.update();
+    }
+
+    end() {
+        this.inFlight--;
+        this.update();
+    }
+
+    update() {
+        if (this.closed) return;
+        const congested = this.inFlight >= this.maxInFlight || !this.controller.socketWritable(this.ws);
+        if (congested && !this.paused && typeof this.ws.pause === 'function') {
+            this.paused = true;
+            this.ws.pause();
+        } else if (!congested && this.paused) {
+            this.paused = false;
+            this.ws.resume();
+        }
+
+        if (!this.paused || this.ws.readyState !== this.ws.OPEN) {
+            this._stopPolling();
+        } else if (!this.pollTimer) {
+            this.pollTimer = setTimeout(() => {
+                this.pollTimer = null;
+                this.update();
+            }, this.pollMs);
+        }
+    }
+
+    close() {
+        this.closed = true;
+        this._stopPolling();
+    }
+
+    _stopPolling() {
+        if (this.pollTimer) {
+            clearTimeout(this.pollTimer);
+            this.pollTimer = null;
+        }
+    }
+}
+
+// Shared controller for routeUDL, configured from config.admission
+const admission = new AdmissionController({
+    maxInFlight: config.admission.maxInFlightPerTarget,
+    maxQueue: config.admission.maxQueuePerTarget,
+    maxQueuedTotal: config.admission.maxQueuedTotal,
+    queueTimeoutMs: config.admission.queueTimeoutMs,
+    targetLimits: parseTargetLimits(config.admission.targetLimits),
+    wsHighWaterMark: config.admission.wsHighWaterMark,
+    wsLowWaterMark: config.admission.wsLowWaterMark,
+});
+
+module.exports = {
+    AdmissionController,
+    ConnectionFlow,
+    OverloadedError,
+    PRIORITIES,
+    priorityOf,
+    parseTargetLimits,
+    admission
+};
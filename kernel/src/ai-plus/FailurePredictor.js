@@ -1,36 +1,103 @@
 const logger = require('../logger');
 
+/**
+ * Fixed-size window of samples with running sums, so the mean and the
+ * least-squares slope over the window are O(1) to update and to read.
+ * Samples are indexed 0..n-1 from oldest to newest.
+ */
+class RollingWindow {
+    constructor(size) {
+        this.size = size;
+        this.values = new Float64Array(size);
+        this.next = 0;   // ring position of the next write
+        this.count = 0;
+        this.sum = 0;    // Σ y
+        this.sumXY = 0;  // Σ x*y
+    }
+
+    push(value) {
+        if (this.count < this.size) {
+            this.sumXY += this.count * value;
+            this.sum += value;
+            this.count++;
+        } else {
+            // Dropping the oldest shifts every remaining x down by one
+            const oldest = this.values[this.next];
+            this.sumXY += (this.size - 1) * value - (this.sum - oldest);
+            this.sum += value - oldest;
+        }
+        this.values[this.next] = value;
+        this.next = (this.next + 1) % this.size;
+        if (this.next === 0) this.resum(); // once per lap: keeps float drift out, O(1) amortized
+    }
+
+    resum() {
+        let sum = 0;
+        let sumXY = 0;
+        const start = this.count < this.size ? 0 : this.next;
+        for (let x = 0; x < this.count; x++) {
+            const y = this.values[(start + x) % this.size];
+            sum += y;
+            sumXY += x * y;
+        }
+        this.sum = sum;
+        this.sumXY = sumXY;
+    }
+
+    mean() {
+        return this.count ? this.sum / this.count : 0;
+    }
+
+    /**
+     * Linear regression slope per sample.
+     */
+    trend() {
+        const n = this.count;
+        if (n < 2) return 0;
+        const sumX = (n * (n - 1)) / 2;
+        const sumX2 = (n * (n - 1) * (2 * n - 1)) / 6;
+        return (n * this.sumXY - sumX * this.sum) / (n * sumX2 - sumX * sumX);
+    }
+}
+
 /**
  * AI-Plus ML-Based Failure Predictor
  * Predicts service failures before they occur
+ *
+ * Each service keeps a RollingWindow per metric, so recording a sample and
+ * predicting are both O(1). predictAll() refreshes every service at once and
+ * start() runs it on a timer; routing code reads the cached result with
+ * getPrediction().
  */
 class FailurePredictor {
-    constructor() {
-        this.history = new Map(); // serviceId -> metrics history
+    /**
+     * @param {Object} [options] - { window: samples per prediction, intervalMs: predictAll period }
+     */
+    constructor(options = {}) {
+        this.history = new Map(); // serviceId -> { errorRate, latency, load } windows
         this.predictions = new Map(); // serviceId -> prediction
-        this.windowSize = 100; // samples
+        this.windowSize = options.window || 10; // samples
+        this.intervalMs = options.intervalMs || 5000;
+        this.timer = null;
     }
 
     /**
      * Record metrics for analysis
      */
     recordMetrics(serviceId, metrics) {
-        if (!this.history.has(serviceId)) {
-            this.history.set(serviceId, []);
+        let history = this.history.get(serviceId);
+        if (!history) {
+            history = {
+                errorRate: new RollingWindow(this.windowSize),
+                latency: new RollingWindow(this.windowSize),
+                load: new RollingWindow(this.windowSize)
+            };
+            this.history.set(serviceId, history);
         }
 
-        const history = this.history.get(serviceId);
-        history.push({
-            timestamp: Date.now(),
-            errorRate: metrics.errorRate || 0,
-            latency: metrics.latency || 0,
-            load: metrics.load || 0
-        });
-
-        // Keep only recent samples
-        if (history.length > this.windowSize) {
-            history.shift();
-        }
+        history.errorRate.push(metrics.errorRate || 0);
+        history.latency.push(metrics.latency || 0);
+        history.load.push(metrics.load || 0);
     }
 
     /**
@@ -39,18 +106,16 @@ class FailurePredictor {
     predict(serviceId) {
         const history = this.history.get(serviceId);
 
-        if (!history || history.length < 10) {
+        if (!history || history.errorRate.count < this.windowSize) {
             return { willFail: false, confidence: 0, timeToFailure: null };
         }
 
         // Simple ML: Detect trends
-        const recent = history.slice(-10);
-        const errorRateTrend = this.calculateTrend(recent.map(m => m.errorRate));
-        const latencyTrend = this.calculateTrend(recent.map(m => m.latency));
+        const errorRateTrend = history.errorRate.trend();
 
         // Failure criteria
-        const avgErrorRate = recent.reduce((sum, m) => sum + m.errorRate, 0) / recent.length;
-        const avgLatency = recent.reduce((sum, m) => sum + m.latency, 0) / recent.length;
+        const avgErrorRate = history.errorRate.mean();
+        const avgLatency = history.latency.mean();
 
         const willFail = (
             errorRateTrend > 0.05 || // Error rate increasing
@@ -74,15 +139,50 @@ class FailurePredictor {
             timestamp: Date.now()
         };
 
+        const previous = this.predictions.get(serviceId);
         this.predictions.set(serviceId, prediction);
 
-        if (willFail) {
+        // Warn when a service starts looking unhealthy, not on every refresh
+        if (willFail && !(previous && previous.willFail)) {
             logger.warn(`[FailurePredictor] ${serviceId} predicted to fail in ${timeToFailure}ms (confidence: ${prediction.confidence})`);
         }
 
         return prediction;
     }
 
+    /**
+     * Refresh the predictions of every recorded service.
+     * @returns {number} Services predicted to fail
+     */
+    predictAll() {
+        let failing = 0;
+        for (const serviceId of this.history.keys()) {
+            if (this.predict(serviceId).willFail) failing++;
+        }
+        return failing;
+    }
+
+    /**
+     * Run predictAll() every `intervalMs`.
+     */
+    start(intervalMs = this.intervalMs) {
+        this.stop();
+        this.timer = setInterval(() => this.predictAll(), intervalMs);
+        if (this.timer.unref) this.timer.unref();
+    }
+
+    stop() {
+        if (this.timer) clearInterval(this.timer);
+        this.timer = null;
+    }
+
+    /**
+     * Latest prediction from predictAll() / predict(), without recomputing.
+     */
+    getPrediction(serviceId) {
+        return this.predictions.get(serviceId) || null;
+    }
+
     calculateTrend(values) {
         if (values.length < 2) return 0;
 
@@ -115,4 +215,6 @@ class FailurePredictor {
     }
 }
 
+FailurePredictor.RollingWindow = RollingWindow;
+
 module.exports = FailurePredictor;
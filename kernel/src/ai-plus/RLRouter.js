@@ -1,38 +1,84 @@
+const fs = require('fs');
 const logger = require('../logger');
 
+// State buckets: value <= threshold[i] -> bucket i, above the last -> thresholds.length
+const LOAD_THRESHOLDS = [0, 50, 80, 100];
+const ERROR_THRESHOLDS = [0, 0.01, 0.05, 0.1];
+const LATENCY_THRESHOLDS = [0, 100, 500, 1000];
+const BUCKETS = 5;
+const STATE_COUNT = BUCKETS * BUCKETS * BUCKETS;
+
+const SNAPSHOT_MAGIC = 'UKQT1';
+
 /**
  * Reinforcement Learning Router
  * Learns optimal routing patterns through trial and reward
+ *
+ * States are discretized (load, error rate, latency) buckets numbered
+ * 0..STATE_COUNT-1, actions are numbered in registration order, and the
+ * Q-table is one Float64Array indexed by state * actionCapacity + action.
  */
 class RLRouter {
     constructor() {
-        this.qTable = new Map(); // state -> action -> Q-value
         this.learningRate = 0.1;
         this.discountFactor = 0.95;
         this.epsilon = 0.2; // Exploration rate
         this.actions = []; // Available routes
+        this.actionIndex = new Map(); // actionId -> column
+        this.actionCapacity = 8;
+        this.qTable = new Float64Array(STATE_COUNT * this.actionCapacity);
     }
 
     /**
      * Register possible actions (routes)
      */
     registerAction(actionId, metadata = {}) {
-        if (!this.actions.find(a => a.id === actionId)) {
-            this.actions.push({ id: actionId, ...metadata });
-            logger.info(`[RLRouter] Registered action: ${actionId}`);
+        if (this.actionIndex.has(actionId)) return;
+        if (this.actions.length === this.actionCapacity) this.grow(this.actionCapacity * 2);
+        this.actionIndex.set(actionId, this.actions.length);
+        this.actions.push({ id: actionId, ...metadata });
+        logger.info(`[RLRouter] Registered action: ${actionId}`);
+    }
+
+    // Re-lay the table out with room for more actions per state
+    grow(capacity) {
+        const table = new Float64Array(STATE_COUNT * capacity);
+        for (let s = 0; s < STATE_COUNT; s++) {
+            table.set(this.qTable.subarray(s * this.actionCapacity, (s + 1) * this.actionCapacity), s * capacity);
         }
+        this.qTable = table;
+        this.actionCapacity = capacity;
     }
 
     /**
      * Get state representation
+     * @returns {number} State id
      */
     getState(metrics) {
         // Discretize continuous metrics into state buckets
-        const loadBucket = this.discretize(metrics.load || 0, [0, 50, 80, 100]);
-        const errorBucket = this.discretize(metrics.errorRate || 0, [0, 0.01, 0.05, 0.1]);
-        const latencyBucket = this.discretize(metrics.latency || 0, [0, 100, 500, 1000]);
+        const loadBucket = this.discretize(metrics.load || 0, LOAD_THRESHOLDS);
+        const errorBucket = this.discretize(metrics.errorRate || 0, ERROR_THRESHOLDS);
+        const latencyBucket = this.discretize(metrics.latency || 0, LATENCY_THRESHOLDS);
 
-        return `L${loadBucket}-E${errorBucket}-T${latencyBucket}`;
+        return (loadBucket * BUCKETS + errorBucket) * BUCKETS + latencyBucket;
+    }
+
+    /**
+     * Readable form of a state id, e.g. "L1-E0-T2".
+     */
+    stateName(state) {
+        const latency = state % BUCKETS;
+        const error = Math.floor(state / BUCKETS) % BUCKETS;
+        const load = Math.floor(state / (BUCKETS * BUCKETS));
+        return `L${load}-E${error}-T${latency}`;
+    }
+
+    // Accepts a state id or its stateName()
+    stateId(state) {
+        if (typeof state === 'number') return state;
+        const match = /^L(\d)-E(\d)-T(\d)$/.exec(state);
+        if (!match) throw new Error(`Unknown state: ${state}`);
+        return (Number(match[1]) * BUCKETS + Number(match[2])) * BUCKETS + Number(match[3]);
     }
 
     discretize(value, thresholds) {
@@ -42,6 +88,14 @@ class RLRouter {
         return thresholds.length;
     }
 
+    /**
+     * Q-value of a state/action pair (0 for unknown actions).
+     */
+    getQ(state, actionId) {
+        const column = this.actionIndex.get(actionId);
+        return column === undefined ? 0 : this.qTable[this.stateId(state) * this.actionCapacity + column];
+    }
+
     /**
      * Select action using epsilon-greedy strategy
      */
@@ -57,12 +111,13 @@ class RLRouter {
         }
 
         // Exploitation: best known action
-        const stateValues = this.qTable.get(state) || {};
+        const row = this.stateId(state) * this.actionCapacity;
         let bestAction = availableActions[0].id;
-        let bestValue = stateValues[bestAction] || 0;
+        let bestValue = -Infinity;
 
         for (const action of availableActions) {
-            const value = stateValues[action.id] || 0;
+            const column = this.actionIndex.get(action.id);
+            const value = column === undefined ? 0 : this.qTable[row + column];
             if (value > bestValue) {
                 bestValue = value;
                 bestAction = action.id;
@@ -76,26 +131,23 @@ class RLRouter {
      * Update Q-value based on reward
      */
     learn(state, action, reward, nextState) {
-        // Initialize Q-values if needed
-        if (!this.qTable.has(state)) {
-            this.qTable.set(state, {});
-        }
-
-        const stateValues = this.qTable.get(state);
-        const currentQ = stateValues[action] || 0;
+        if (!this.actionIndex.has(action)) this.registerAction(action);
+        const index = this.stateId(state) * this.actionCapacity + this.actionIndex.get(action);
+        const currentQ = this.qTable[index];
 
         // Find max Q-value for next state
-        const nextStateValues = this.qTable.get(nextState) || {};
-        const maxNextQ = Math.max(...Object.values(nextStateValues), 0);
+        const nextRow = this.stateId(nextState) * this.actionCapacity;
+        let maxNextQ = 0;
+        for (let a = 0; a < this.actions.length; a++) {
+            if (this.qTable[nextRow + a] > maxNextQ) maxNextQ = this.qTable[nextRow + a];
+        }
 
         // Q-learning update rule
         const newQ = currentQ + this.learningRate * (
             reward + this.discountFactor * maxNextQ - currentQ
         );
 
-        stateValues[action] = newQ;
-
-        logger.debug(`[RLRouter] Updated Q(${state}, ${action}) = ${newQ.toFixed(3)} (reward: ${reward})`);
+        this.qTable[index] = newQ;
     }
 
     /**
@@ -115,8 +167,6 @@ class RLRouter {
         const state = this.getState(metrics);
         const action = this.selectAction(state, availableRoutes);
 
-        logger.info(`[RLRouter] State: ${state}, Action: ${action}`);
-
         // Execute route
         const startTime = Date.now();
         try {
@@ -142,16 +192,79 @@ class RLRouter {
     }
 
     /**
-     * Export Q-table for analysis
+     * Export Q-table for analysis (visited state/action pairs only)
      */
     exportQTable() {
         const table = {};
-        for (const [state, actions] of this.qTable) {
-            table[state] = actions;
+        for (let s = 0; s < STATE_COUNT; s++) {
+            const row = s * this.actionCapacity;
+            for (let a = 0; a < this.actions.length; a++) {
+                const value = this.qTable[row + a];
+                if (value === 0) continue;
+                const name = this.stateName(s);
+                if (!table[name]) table[name] = {};
+                table[name][this.actions[a].id] = value;
+            }
         }
         return table;
     }
 
+    /**
+     * Write the learned table to disk: a JSON header line (actions, epsilon)
+     * followed by the raw Float64Array rows of the registered actions.
+     * Written to a temporary file and renamed, so readers never see half a file.
+     */
+    saveSnapshot(file) {
+        const width = this.actions.length;
+        const values = new Float64Array(STATE_COUNT * width);
+        for (let s = 0; s < STATE_COUNT; s++) {
+            values.set(this.qTable.subarray(s * this.actionCapacity, s * this.actionCapacity + width), s * width);
+        }
+        const header = JSON.stringify({
+            magic: SNAPSHOT_MAGIC,
+            states: STATE_COUNT,
+            actions: this.actions,
+            epsilon: this.epsilon
+        });
+        const tmp = `${file}.tmp`;
+        fs.writeFileSync(tmp, Buffer.concat([Buffer.from(header + '\n'), Buffer.from(values.buffer)]));
+        fs.renameSync(tmp, file);
+        logger.info(`[RLRouter] Saved Q-table (${STATE_COUNT}x${width}) to ${file}`);
+    }
+
+    /**
+     * Replace the table with one written by saveSnapshot().
+     */
+    loadSnapshot(file) {
+        const data = fs.readFileSync(file);
+        const newline = data.indexOf(0x0a);
+        const header = JSON.parse(data.subarray(0, newline).toString());
+        if (header.magic !== SNAPSHOT_MAGIC || header.states !== STATE_COUNT) {
+            throw new Error(`Incompatible Q-table snapshot: ${file}`);
+        }
+        const width = header.actions.length;
+        const bytes = data.subarray(newline + 1);
+        if (bytes.length !== STATE_COUNT * width * 8) {
+            throw new Error(`Truncated Q-table snapshot: ${file}`);
+        }
+        // Copy out: the body is not 8-byte aligned inside the file buffer
+        const values = new Float64Array(new Uint8Array(bytes).buffer);
+
+        this.actions = [];
+        this.actionIndex.clear();
+        this.actionCapacity = Math.max(8, width);
+        this.qTable = new Float64Array(STATE_COUNT * this.actionCapacity);
+        header.actions.forEach((action, column) => {
+            this.actionIndex.set(action.id, column);
+            this.actions.push(action);
+        });
+        for (let s = 0; s < STATE_COUNT; s++) {
+            this.qTable.set(values.subarray(s * width, (s + 1) * width), s * this.actionCapacity);
+        }
+        this.epsilon = header.epsilon;
+        logger.info(`[RLRouter] Loaded Q-table (${STATE_COUNT}x${width}) from ${file}`);
+    }
+
     /**
      * Reduce exploration over time
      */
@@ -160,4 +273,6 @@ class RLRouter {
     }
 }
 
+RLRouter.STATE_COUNT = STATE_COUNT;
+
 module.exports = RLRouter;
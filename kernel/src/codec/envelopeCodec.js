@@ -0,0 +1,86 @@
+/**
+ * Envelope encodings on the WebSocket data plane.
+ *
+ * Text frames are always JSON. Binary frames are MessagePack. An adapter
+ * offers `payload.encodings` in register_adapter; the kernel answers with the
+ * chosen `encoding` in the ack and uses it for everything it sends to that
+ * socket afterwards. JSON remains the default and the fallback.
+ */
+const msgpack = require("./msgpack");
+
+const JSON_ENCODING = "json";
+const MSGPACK_ENCODING = "msgpack";
+const SUPPORTED_ENCODINGS = [MSGPACK_ENCODING, JSON_ENCODING];
+
+// Decoded envelopes (and their payloads) that carry typed arrays, which
+// need converting back to number lists if they leave the kernel as JSON
+const typedEnvelopes = new WeakSet();
+
+function typedArrayReplacer(key, value) {
+    if (ArrayBuffer.isView(value) && !(value instanceof DataView) && !Buffer.isBuffer(value)) {
+        return Array.from(value, Number);
+    }
+    return value;
+}
+
+/**
+ * Pick the encoding for an adapter from the list it offered, in its order of preference.
+ * @param {string[]} [offered]
+ * @returns {string}
+ */
+function negotiateEncoding(offered) {
+    if (Array.isArray(offered)) {
+        for (const encoding of offered) {
+            if (SUPPORTED_ENCODINGS.includes(encoding)) return encoding;
+        }
+    }
+    return JSON_ENCODING;
+}
+
+/**
+ * Decode one WebSocket frame into an envelope.
+ * @param {Buffer|string} raw
+ * @param {boolean} isBinary
+ */
+function decodeFrame(raw, isBinary) {
+    if (!isBinary) {
+        return JSON.parse(raw.toString());
+    }
+    const { value, hasTypedArrays } = msgpack.decode(raw);
+    if (hasTypedArrays && value && typeof value === "object") {
+        typedEnvelopes.add(value);
+        if (value.payload && typeof value.payload === "object") typedEnvelopes.add(value.payload);
+    }
+    return value;
+}
+
+function toJSON(envelope) {
+    const hasTyped = envelope && typeof envelope === "object" &&
+        (typedEnvelopes.has(envelope) || typedEnvelopes.has(envelope.payload));
+    return hasTyped ? JSON.stringify(envelope, typedArrayReplacer) : JSON.stringify(envelope);
+}
+
+/**
+ * Encode an envelope for a socket, honouring the encoding it negotiated.
+ * @param {WebSocket} ws
+ * @param {Object} envelope
+ * @param {boolean} [preferBinary] - Reply in MessagePack even without negotiation
+ *        (used when the request itself arrived as a binary frame)
+ * @returns {string|Buffer}
+ */
+function encodeFor(ws, envelope, preferBinary = false) {
+    if (preferBinary || (ws && ws.encoding === MSGPACK_ENCODING)) {
+        return msgpack.encode(envelope);
+    }
+    return toJSON(envelope);
+}
+
+module.exports = {
+    JSON_ENCODING,
+    MSGPACK_ENCODING,
+    SUPPORTED_ENCODINGS,
+    negotiateEncoding,
+    decodeFrame,
+    encodeFor,
+    toJSON,
+};
@@ -0,0 +1,325 @@
+/**
+ * Minimal MessagePack codec for UDM envelopes.
+ *
+ * Covers the JSON data model (nil, bool, int, float64, str, array, map) plus
+ * bin and one extension type: typed numeric arrays, carried as raw
+ * little-endian bytes instead of number lists.
+ *
+ * Typed array ext (type 1): [dtype code: u8][raw little-endian element bytes]
+ */
+
+const TYPED_ARRAY_EXT = 1;
+
+// dtype code <-> typed array constructor (codes shared with the Python SDK)
+const DTYPE_CODES = [
+    [1, Float64Array],
+    [2, Float32Array],
+    [3, Int32Array],
+    [4, BigInt64Array],
+    [5, Uint8Array],
+];
+const CODE_TO_ARRAY = new Map(DTYPE_CODES);
+const ARRAY_TO_CODE = new Map(DTYPE_CODES.map(([code, ArrayType]) => [ArrayType, code]));
+
+const LITTLE_ENDIAN = new Uint8Array(new Uint16Array([1]).buffer)[0] === 1;
+
+class Encoder {
+    constructor(initialSize = 1024) {
+        this.buf = Buffer.allocUnsafe(initialSize);
+        this.pos = 0;
+    }
+
+    ensure(n) {
+        if (this.pos + n <= this.buf.length) return;
+        let size = this.buf.length * 2;
+        while (size < this.pos + n) size *= 2;
+        const next = Buffer.allocUnsafe(size);
+        this.buf.copy(next, 0, 0, this.pos);
+        this.buf = next;
+    }
+
+    u8(v) { this.ensure(1); this.buf[this.pos++] = v; }
+    u16(v) { this.ensure(2); this.buf.writeUInt16BE(v, this.pos); this.pos += 2; }
+    u32(v) { this.ensure(4); this.buf.writeUInt32BE(v, this.pos); this.pos += 4; }
+
+    bytes(src) {
+        this.ensure(src.length);
+        if (Buffer.isBuffer(src)) src.copy(this.buf, this.pos);
+        else this.buf.set(src, this.pos);
+        this.pos += src.length;
+    }
+
+    value(v) {
+        switch (typeof v) {
+            case "string": return this.str(v);
+            case "number": return this.num(v);
+            case "boolean": return this.u8(v ? 0xc3 : 0xc2);
+            case "bigint": return this.bigint(v);
+            case "undefined": return this.u8(0xc0);
+            case "object":
+                if (v === null) return this.u8(0xc0);
+                if (Array.isArray(v)) return this.array(v);
+                if (Buffer.isBuffer(v)) return this.bin(v);
+                if (ArrayBuffer.isView(v) && ARRAY_TO_CODE.has(v.constructor)) return this.typed(v);
+                if (v instanceof Date) return this.str(v.toISOString());
+                if (typeof v.toJSON === "function") return this.value(v.toJSON());
+                return this.map(v);
+            default:
+                // functions / symbols are dropped, as JSON.stringify does
+                return this.u8(0xc0);
+        }
+    }
+
+    str(s) {
+        const len = Buffer.byteLength(s, "utf8");
+        if (len < 32) this.u8(0xa0 | len);
+        else if (len < 0x100) { this.u8(0xd9); this.u8(len); }
+        else if (len < 0x10000) { this.u8(0xda); this.u16(len); }
+        else { this.u8(0xdb); this.u32(len); }
+        this.ensure(len);
+        this.buf.write(s, this.pos, len, "utf8");
+        this.pos += len;
+    }
+
+    num(n) {
+        if (!Number.isInteger(n) || !Number.isSafeInteger(n)) {
+            if (!Number.isFinite(n)) return this.u8(0xc0); // JSON parity: NaN/Infinity -> null
+            this.ensure(9);
+            this.buf[this.pos++] = 0xcb;
+            this.buf.writeDoubleBE(n, this.pos);
+            this.pos += 8;
+            return;
+        }
+        if (n >= 0) {
+            if (n < 0x80) return this.u8(n);
+            if (n < 0x100) { this.u8(0xcc); return this.u8(n); }
+            if (n < 0x10000) { this.u8(0xcd); return this.u16(n); }
+            if (n < 0x100000000) { this.u8(0xce); return this.u32(n); }
+            this.ensure(9);
+            this.buf[this.pos++] = 0xcf;
+            this.buf.writeBigUInt64BE(BigInt(n), this.pos);
+            this.pos += 8;
+            return;
+        }
+        if (n >= -32) return this.u8(n & 0xff);
+        this.ensure(9);
+        if (n >= -0x80) { this.buf[this.pos++] = 0xd0; this.buf.writeInt8(n, this.pos); this.pos += 1; }
+        else if (n >= -0x8000) { this.buf[this.pos++] = 0xd1; this.buf.writeInt16BE(n, this.pos); this.pos += 2; }
+        else if (n >= -0x80000000) { this.buf[this.pos++] = 0xd2; this.buf.writeInt32BE(n, this.pos); this.pos += 4; }
+        else { this.buf[this.pos++] = 0xd3; this.buf.writeBigInt64BE(BigInt(n), this.pos); this.pos += 8; }
+    }
+
+    bigint(n) {
+        this.ensure(9);
+        if (n >= 0n) { this.buf[this.pos++] = 0xcf; this.buf.writeBigUInt64BE(n, this.pos); }
+        else { this.buf[this.pos++] = 0xd3; this.buf.writeBigInt64BE(n, this.pos); }
+        this.pos += 8;
+    }
+
+    array(a) {
+        const len = a.length;
+        if (len < 16) this.u8(0x90 | len);
+        else if (len < 0x10000) { this.u8(0xdc); this.u16(len); }
+        else { this.u8(0xdd); this.u32(len); }
+        for (let i = 0; i < len; i++) this.value(a[i] === undefined ? null : a[i]);
+    }
+
+    map(obj) {
+        const keys = Object.keys(obj).filter(k => obj[k] !== undefined && typeof obj[k] !== "function");
+        const len = keys.length;
+        if (len < 16) this.u8(0x80 | len);
+        else if (len < 0x10000) { this.u8(0xde); this.u16(len); }
+        else { this.u8(0xdf); this.u32(len); }
+        for (const k of keys) {
+            this.str(k);
+            this.value(obj[k]);
+        }
+    }
+
+    bin(b) {
+        const len = b.length;
+        if (len < 0x100) { this.u8(0xc4); this.u8(len); }
+        else if (len < 0x10000) { this.u8(0xc5); this.u16(len); }
+        else { this.u8(0xc6); this.u32(len); }
+        this.bytes(b);
+    }
+
+    typed(view) {
+        let bytes = new Uint8Array(view.buffer, view.byteOffset, view.byteLength);
+        if (!LITTLE_ENDIAN && view.BYTES_PER_ELEMENT > 1) {
+            bytes = Buffer.from(bytes);
+            swapInPlace(bytes, view.BYTES_PER_ELEMENT);
+        }
+        const len = bytes.length + 1;
+        if (len < 0x100) { this.u8(0xc7); this.u8(len); }
+        else if (len < 0x10000) { this.u8(0xc8); this.u16(len); }
+        else { this.u8(0xc9); this.u32(len); }
+        this.u8(TYPED_ARRAY_EXT);
+        this.u8(ARRAY_TO_CODE.get(view.constructor));
+        this.bytes(bytes);
+    }
+
+    result() {
+        return this.buf.subarray(0, this.pos);
+    }
+}
+
+function swapInPlace(buf, width) {
+    if (width === 2) buf.swap16();
+    else if (width === 4) buf.swap32();
+    else if (width === 8) buf.swap64();
+}
+
+class Decoder {
+    constructor(buf) {
+        this.buf = buf;
+        this.pos = 0;
+        this.sawTypedArray = false;
+    }
+
+    need(n) {
+        if (this.pos + n > this.buf.length) {
+            throw new Error("msgpack: unexpected end of input");
+        }
+    }
+
+    value() {
+        this.need(1);
+        const b = this.buf[this.pos++];
+
+        if (b < 0x80) return b;
+        if (b >= 0xe0) return b - 0x100;
+        if ((b & 0xe0) === 0xa0) return this.str(b & 0x1f);
+        if ((b & 0xf0) === 0x90) return this.array(b & 0x0f);
+        if ((b & 0xf0) === 0x80) return this.map(b & 0x0f);
+
+        const buf = this.buf;
+        let v;
+        switch (b) {
+            case 0xc0: return null;
+            case 0xc2: return false;
+            case 0xc3: return true;
+            case 0xc4: this.need(1); return this.bin(buf[this.pos++]);
+            case 0xc5: this.need(2); v = buf.readUInt16BE(this.pos); this.pos += 2; return this.bin(v);
+            case 0xc6: this.need(4); v = buf.readUInt32BE(this.pos); this.pos += 4; return this.bin(v);
+            case 0xc7: this.need(1); return this.ext(buf[this.pos++]);
+            case 0xc8: this.need(2); v = buf.readUInt16BE(this.pos); this.pos += 2; return this.ext(v);
+            case 0xc9: this.need(4); v = buf.readUInt32BE(this.pos); this.pos += 4; return this.ext(v);
+            case 0xca: this.need(4); v = buf.readFloatBE(this.pos); this.pos += 4; return v;
+            case 0xcb: this.need(8); v = buf.readDoubleBE(this.pos); this.pos += 8; return v;
+            case 0xcc: this.need(1); return buf[this.pos++];
+            case 0xcd: this.need(2); v = buf.readUInt16BE(this.pos); this.pos += 2; return v;
+            case 0xce: this.need(4); v = buf.readUInt32BE(this.pos); this.pos += 4; return v;
+            case 0xcf: this.need(8); v = buf.readBigUInt64BE(this.pos); this.pos += 8; return toNumber(v);
+            case 0xd0: this.need(1); v = buf.readInt8(this.pos); this.pos += 1; return v;
+            case 0xd1: this.need(2); v = buf.readInt16BE(this.pos); this.pos += 2; return v;
+            case 0xd2: this.need(4); v = buf.readInt32BE(this.pos); this.pos += 4; return v;
+            case 0xd3: this.need(8); v = buf.readBigInt64BE(this.pos); this.pos += 8; return toNumber(v);
+            case 0xd4: return this.ext(1);
+            case 0xd5: return this.ext(2);
+            case 0xd6: return this.ext(4);
+            case 0xd7: return this.ext(8);
+            case 0xd8: return this.ext(16);
+            case 0xd9: this.need(1); return this.str(buf[this.pos++]);
+            case 0xda: this.need(2); v = buf.readUInt16BE(this.pos); this.pos += 2; return this.str(v);
+            case 0xdb: this.need(4); v = buf.readUInt32BE(this.pos); this.pos += 4; return this.str(v);
+            case 0xdc: this.need(2); v = buf.readUInt16BE(this.pos); this.pos += 2; return this.array(v);
+            case 0xdd: this.need(4); v = buf.readUInt32BE(this.pos); this.pos += 4; return this.array(v);
+            case 0xde: this.need(2); v = buf.readUInt16BE(this.pos); this.pos += 2; return this.map(v);
+            case 0xdf: this.need(4); v = buf.readUInt32BE(this.pos); this.pos += 4; return this.map(v);
+            default:
+                throw new Error(`msgpack: unsupported type byte 0x${b.toString(16)}`);
+        }
+    }
+
+    str(len) {
+        this.need(len);
+        const s = this.buf.toString("utf8", this.pos, this.pos + len);
+        this.pos += len;
+        return s;
+    }
+
+    bin(len) {
+        this.need(len);
+        const b = Buffer.from(this.buf.subarray(this.pos, this.pos + len));
+        this.pos += len;
+        return b;
+    }
+
+    array(len) {
+        const out = new Array(len);
+        for (let i = 0; i < len; i++) out[i] = this.value();
+        return out;
+    }
+
+    map(len) {
+        const out = {};
+        for (let i = 0; i < len; i++) {
+            const key = this.value();
+            out[key] = this.value();
+        }
+        return out;
+    }
+
+    ext(len) {
+        this.need(len + 1);
+        const type = this.buf.readInt8(this.pos++);
+        const start = this.pos;
+        this.pos += len;
+
+        if (type !== TYPED_ARRAY_EXT || len < 1) {
+            // Unknown extension: hand back the raw bytes
+            return { ext: type, data: Buffer.from(this.buf.subarray(start, start + len)) };
+        }
+
+        const ArrayType = CODE_TO_ARRAY.get(this.buf[start]);
+        if (!ArrayType) throw new Error(`msgpack: unknown typed array dtype ${this.buf[start]}`);
+        const byteLength = len - 1;
+        if (byteLength % ArrayType.BYTES_PER_ELEMENT !== 0) {
+            throw new Error("msgpack: typed array length is not a multiple of its element size");
+        }
+
+        // Copy into a fresh, aligned buffer; the frame buffer may be reused
+        const bytes = Buffer.from(this.buf.subarray(start + 1, start + len));
+        if (!LITTLE_ENDIAN) swapInPlace(bytes, ArrayType.BYTES_PER_ELEMENT);
+        this.sawTypedArray = true;
+        return new ArrayType(bytes.buffer, bytes.byteOffset, byteLength / ArrayType.BYTES_PER_ELEMENT);
+    }
+}
+
+function toNumber(big) {
+    return big >= BigInt(Number.MIN_SAFE_INTEGER) && big <= BigInt(Number.MAX_SAFE_INTEGER)
+        ? Number(big)
+        : big;
+}
+
+/**
+ * Encode a value as MessagePack.
+ * @param {*} value
+ * @returns {Buffer}
+ */
+function encode(value) {
+    const encoder = new Encoder();
+    encoder.value(value);
+    return encoder.result();
+}
+
+/**
+ * Decode one MessagePack value.
+ * @param {Buffer|Uint8Array} buf
+ * @returns {{ value: *, hasTypedArrays: boolean }}
+ */
+function decode(buf) {
+    const decoder = new Decoder(Buffer.isBuffer(buf) ? buf : Buffer.from(buf.buffer, buf.byteOffset, buf.byteLength));
+    const value = decoder.value();
+    if (decoder.pos !== decoder.buf.length) {
+        throw new Error("msgpack: trailing bytes after value");
+    }
+    return { value, hasTypedArrays: decoder.sawTypedArray };
+}
+
+module.exports = {
+    encode,
+    decode,
+    TYPED_ARRAY_EXT,
+};
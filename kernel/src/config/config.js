@@ -16,10 +16,65 @@ const config = {
         port: process.env.PORT || 3000,
         host: process.env.HOST || 'localhost',
         logLevel: process.env.LOG_LEVEL || 'info',
+        workers: parseInt(process.env.KERNEL_WORKERS || '0', 10), // kernelCluster.js worker processes (0 = one per core)
+        workerSlot: process.env.KERNEL_WORKER_SLOT !== undefined ? parseInt(process.env.KERNEL_WORKER_SLOT, 10) : null, // set by the primary; kept across respawns
     },
     umb: {
         maxMessageSize: 100 * 1024 * 1024, // 100MB
         pingInterval: 30000,
+        streamHighWaterMark: 1024 * 1024, // bytes buffered per stream before the producer is paused
+        streamBatchBytes: 64 * 1024,      // small chunks are coalesced up to this size
+        streamWindow: 8,                  // batches in flight per consumer before it must grant credit
+        wsStreamBufferLimit: 4 * 1024 * 1024, // stop sending stream data while ws.bufferedAmount is above this
+    },
+    etl: {
+        streamBatchSize: parseInt(process.env.ETL_STREAM_BATCH_SIZE || '5000', 10), // records per batch in stream mode
+        streamMaxInFlight: parseInt(process.env.ETL_STREAM_MAX_IN_FLIGHT || '4', 10), // batches between extract and load
+        transformWorkers: parseInt(process.env.ETL_TRANSFORM_WORKERS || '0', 10), // worker threads for map/filter stages (0 = inline)
+    },
+    batch: {
+        concurrency: parseInt(process.env.BATCH_CONCURRENCY || '64', 10),     // messages routed at once per /udl/batch or /udl/stream request
+        maxMessages: parseInt(process.env.BATCH_MAX_MESSAGES || '100000', 10), // per request
+        maxBodyBytes: process.env.BATCH_MAX_BODY || '50mb',                    // JSON body limit (express.json)
+    },
+    admission: {
+        maxInFlightPerTarget: parseInt(process.env.ADMISSION_MAX_IN_FLIGHT || '64', 10),    // concurrent routeUDL calls per target
+        maxQueuePerTarget: parseInt(process.env.ADMISSION_MAX_QUEUE || '256', 10),          // waiting calls per target before OVERLOADED
+        maxQueuedTotal: parseInt(process.env.ADMISSION_MAX_QUEUED_TOTAL || '10000', 10),    // waiting calls across all targets
+        queueTimeoutMs: parseInt(process.env.ADMISSION_QUEUE_TIMEOUT_MS || '5000', 10),     // max wait in a queue
+        targetLimits: process.env.ADMISSION_TARGET_LIMITS || '',                            // "python-adapter=8:64,ai-service=4:32"
+        wsHighWaterMark: parseInt(process.env.WS_HIGH_WATER_MARK || String(8 * 1024 * 1024), 10), // socket bufferedAmount that marks it congested
+        wsLowWaterMark: parseInt(process.env.WS_LOW_WATER_MARK || String(1024 * 1024), 10),       // ... and that clears it again
+        maxInFlightPerConnection: parseInt(process.env.WS_MAX_IN_FLIGHT || '256', 10),     // stop reading a client socket beyond this
+        parallelConcurrency: parseInt(process.env.PARALLEL_CONCURRENCY || '16', 10),       // ParallelExecutionEngine default
+    },
+    cluster: {
+        gossipIntervalMs: parseInt(process.env.CLUSTER_GOSSIP_INTERVAL_MS || '1000', 10),  // push local route deltas to peers
+        digestIntervalMs: parseInt(process.env.CLUSTER_DIGEST_INTERVAL_MS || '10000', 10), // anti-entropy digest exchange
+    },
+    federation: {
+        requestTimeoutMs: parseInt(process.env.FEDERATION_REQUEST_TIMEOUT_MS || '5000', 10), // REMOTE_ROUTE reply deadline
+        hedge: process.env.FEDERATION_HEDGE === '1',                                          // second cluster after the first one's p95
+        hedgeMinDelayMs: parseInt(process.env.FEDERATION_HEDGE_MIN_DELAY_MS || '10', 10),
+        ewmaAlpha: 0.2,                                                                       // weight of the newest latency / error sample
+        unmeasuredLatencyMs: 100,                                                             // score of unmeasured out-of-region clusters
+    },
+    durableQueue: {
+        targets: process.env.DURABLE_QUEUE_TARGETS || '',                                  // "python-adapter,ai-service" or "*"; empty = off
+        dir: process.env.DURABLE_QUEUE_DIR || path.resolve(__dirname, '../../../data/queue'),
+        segmentBytes: parseInt(process.env.DURABLE_QUEUE_SEGMENT_BYTES || String(64 * 1024 * 1024), 10), // roll to a new segment file beyond this
+        fsyncIntervalMs: parseInt(process.env.DURABLE_QUEUE_FSYNC_MS || '50', 10),         // appends are written and fdatasync'ed in batches this often
+        maxBytesPerTarget: parseInt(process.env.DURABLE_QUEUE_MAX_BYTES || String(1024 * 1024 * 1024), 10),
+        maxMessagesPerTarget: parseInt(process.env.DURABLE_QUEUE_MAX_MESSAGES || '1000000', 10),
+        maxAgeMs: parseInt(process.env.DURABLE_QUEUE_MAX_AGE_MS || String(24 * 60 * 60 * 1000), 10), // older messages are dropped on replay
+        replayRatePerSec: parseInt(process.env.DURABLE_QUEUE_REPLAY_RATE || '5000', 10),   // messages per second to a re-registered target
+    },
+    python: {
+        poolSize: parseInt(process.env.PYTHON_ADAPTER_POOL_SIZE || '0', 10),                // python-adapter workers per kernel process (0 = one per core of its share, see kernelCluster.coresPerProcess)
+        poolPolicy: process.env.PYTHON_ADAPTER_POOL_POLICY || 'least-outstanding',          // or "round-robin"
+        timeoutMs: parseInt(process.env.PYTHON_ADAPTER_TIMEOUT_MS || '30000', 10),           // per request (0 = none)
+        sharedMemoryBytes: parseInt(process.env.PYTHON_ADAPTER_SHM_BYTES || '0', 10),        // shared ring for large typed-array inputs (0 = off)
+        sharedMemoryThreshold: parseInt(process.env.PYTHON_ADAPTER_SHM_THRESHOLD || '65536', 10), // smaller inputs are sent inline
     },
     paths: {
         adapters: path.resolve(__dirname, '../../../adapters'),
@@ -10,6 +10,7 @@ const cors = require('cors');
 const morgan = require('morgan');
 const config = require('../config/config');
 const umb = require('../umb/umb');
+const { StreamBridge } = require('../umb/streamBridge');
 require('../execution/execution-engine'); // Initialize Execution Engine
 
 class Kernel {
@@ -61,23 +62,26 @@ class Kernel {
     _setupWebSocket() {
         this.wss.on('connection', (ws) => {
             console.log('[Kernel] Client connected via WebSocket');
-            const subscriptions = new Set();
+            const subscriptions = new Map(); // topic -> unsubscribe
+            const streams = new StreamBridge(ws, umb);
 
             ws.on('message', (message) => {
                 try {
                     const msg = JSON.parse(message);
 
-                    if (msg.cmd === 'subscribe') {
+                    if (streams.handle(msg)) {
+                        // stream_open / stream_write / stream_subscribe / ...
+                    }
+                    else if (msg.cmd === 'subscribe') {
                         const topic = msg.topic;
-                        subscriptions.add(topic);
+                        if (subscriptions.has(topic)) return;
                         // Forward internal UMB events to this WS client
                         const handler = (umbMsg) => {
                             if (ws.readyState === WebSocket.OPEN) {
                                 ws.send(JSON.stringify({ cmd: 'event', topic, payload: umbMsg }));
                             }
                         };
-                        umb.subscribe(topic, handler);
-                        // TODO: Store handler to unsubscribe later
+                        subscriptions.set(topic, umb.subscribe(topic, handler));
                     }
                     else if (msg.cmd === 'publish') {
                         umb.publish(msg.topic, msg.payload, msg.metadata);
@@ -101,7 +105,9 @@ class Kernel {
 
             ws.on('close', () => {
                 console.log('[Kernel] Client disconnected');
-                // Cleanup subscriptions (TODO: proper cleanup)
+                for (const unsubscribe of subscriptions.values()) unsubscribe();
+                subscriptions.clear();
+                streams.close();
             });
         });
     }
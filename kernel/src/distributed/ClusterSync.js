@@ -1,39 +1,227 @@
 const logger = require('../logger');
+const config = require('../config/config');
+const VersionedRoutes = require('./VersionedRoutes');
+const { decodeFrame, encodeFor } = require('../codec/envelopeCodec');
 
+/**
+ * Stands in the SmartRouter for a service that lives on a peer node.
+ * Whatever routeUDL sends to it is forwarded to that node in one hop.
+ */
+class PeerLink {
+    constructor(sync, origin, serviceId) {
+        this.sync = sync;
+        this.origin = origin;
+        this.serviceId = serviceId;
+        this.OPEN = 1;
+    }
+
+    get readyState() {
+        const peer = this.sync.nodeManager.peers.get(this.origin);
+        return peer ? peer.ws.readyState : 3;
+    }
+
+    get bufferedAmount() {
+        const peer = this.sync.nodeManager.peers.get(this.origin);
+        return peer ? peer.ws.bufferedAmount || 0 : 0;
+    }
+
+    send(data) {
+        this.sync.send(this.origin, 'FORWARD', { target: this.serviceId, data: data.toString() });
+    }
+}
+
+/**
+ * Route gossip between cluster nodes.
+ *
+ * Local services are diffed into a VersionedRoutes table every gossip tick
+ * and only the resulting delta is pushed to peers (ROUTES_DELTA). Every
+ * digest tick each peer gets a digest of [epoch, seq] per origin
+ * (ROUTES_DIGEST); a peer that is behind asks for exactly what it lacks
+ * (ROUTES_PULL) and one that is ahead pushes it. Services of directly
+ * connected peers are installed into the SmartRouter as PeerLinks.
+ */
 class ClusterSync {
-    constructor(nodeManager, smartRouter) {
+    /**
+     * @param {NodeManager} nodeManager
+     * @param {SmartRouter} smartRouter
+     * @param {Object} [options] - { gossipIntervalMs, digestIntervalMs, epoch }
+     */
+    constructor(nodeManager, smartRouter, options = {}) {
         this.nodeManager = nodeManager;
         this.smartRouter = smartRouter;
+        this.gossipIntervalMs = options.gossipIntervalMs || config.cluster.gossipIntervalMs;
+        this.digestIntervalMs = options.digestIntervalMs || config.cluster.digestIntervalMs;
+        this.routes = new VersionedRoutes(nodeManager.myId, options.epoch);
+        this.sent = new Map();          // peerId -> [epoch, seq] of our routes it has been sent
+        this.installed = new Map();     // serviceId -> PeerLink in the SmartRouter
+        this.stats = { deltasSent: 0, digestsSent: 0, pulls: 0, bytesSent: 0, forwarded: 0 };
+        this.timers = [];
     }
 
     start() {
-        // Periodically sync routing table
-        setInterval(() => this.syncRoutes(), 10000);
+        this.nodeManager.on('message', (msg, peerId) => this.handleSync(msg, peerId));
+        this.nodeManager.on('peer', peerId => this.onPeer(peerId));
+        this.nodeManager.on('peer-lost', peerId => this.onPeerLost(peerId));
+
+        this.timers.push(setInterval(() => this.syncRoutes(), this.gossipIntervalMs));
+        this.timers.push(setInterval(() => this.sendDigest(), this.digestIntervalMs));
+    }
+
+    stop() {
+        this.timers.forEach(clearInterval);
+        this.timers = [];
     }
 
+    send(peerId, type, payload) {
+        const message = { type, source: this.nodeManager.myId, payload };
+        const peer = this.nodeManager.peers.get(peerId);
+        if (!peer || peer.ws.readyState !== 1) return false;
+        const data = JSON.stringify(message);
+        this.stats.bytesSent += data.length;
+        peer.ws.send(data);
+        return true;
+    }
+
+    /**
+     * Services registered on this node (not PeerLinks).
+     */
+    localServices() {
+        const routes = this.smartRouter.routes;
+        return Object.keys(routes).filter(id => !(routes[id] instanceof PeerLink));
+    }
+
+    /**
+     * Pick up local registrations and push the delta to every peer.
+     */
     syncRoutes() {
-        const routes = Array.from(this.smartRouter.routes.entries());
-        const payload = {
-            type: 'SYNC_ROUTES',
-            source: this.nodeManager.myId,
-            payload: routes
-        };
-
-        this.nodeManager.peers.forEach(peer => {
-            if (peer.ws.readyState === 1) {
-                peer.ws.send(JSON.stringify(payload));
+        this.routes.syncLocal(this.localServices());
+        for (const peerId of this.nodeManager.peers.keys()) this.pushLocal(peerId);
+    }
+
+    pushLocal(peerId) {
+        const myId = this.nodeManager.myId;
+        const delta = this.routes.deltaFor(myId, this.sent.get(peerId));
+        if (delta && this.send(peerId, 'ROUTES_DELTA', delta)) {
+            this.stats.deltasSent++;
+            this.sent.set(peerId, [delta.epoch, delta.to]);
+        }
+    }
+
+    sendDigest() {
+        const digest = this.routes.digest();
+        for (const peerId of this.nodeManager.peers.keys()) {
+            if (this.send(peerId, 'ROUTES_DIGEST', digest)) this.stats.digestsSent++;
+        }
+    }
+
+    onPeer(peerId) {
+        this.sent.delete(peerId);
+        this.routes.syncLocal(this.localServices());
+        this.pushLocal(peerId);
+        this.send(peerId, 'ROUTES_DIGEST', this.routes.digest());
+        this.install(peerId, this.routes.services(peerId));
+    }
+
+    onPeerLost(peerId) {
+        this.sent.delete(peerId);
+        this.uninstall(peerId, this.routes.services(peerId));
+    }
+
+    handleSync(message, peerId = message.source) {
+        const payload = message.payload;
+        switch (message.type) {
+            case 'ROUTES_DELTA': {
+                const result = this.routes.apply(payload);
+                if (result.gap) {
+                    this.stats.pulls++;
+                    this.send(peerId, 'ROUTES_PULL', { [payload.origin]: this.routes.held(payload.origin) });
+                    break;
+                }
+                if (this.nodeManager.peers.has(payload.origin)) {
+                    this.install(payload.origin, result.added);
+                    this.uninstall(payload.origin, result.removed);
+                }
+                break;
+            }
+            case 'ROUTES_DIGEST': {
+                const { want, offer } = this.routes.compare(payload);
+                if (Object.keys(want).length) {
+                    this.stats.pulls++;
+                    this.send(peerId, 'ROUTES_PULL', want);
+                }
+                this.sendDeltas(peerId, offer);
+                break;
+            }
+            case 'ROUTES_PULL':
+                this.sendDeltas(peerId, payload);
+                break;
+            case 'FORWARD':
+                this.deliver(payload);
+                break;
+            default:
+                break;
+        }
+    }
+
+    // held: origin -> [epoch, seq] the peer has
+    sendDeltas(peerId, held) {
+        for (const [origin, have] of Object.entries(held)) {
+            const delta = this.routes.deltaFor(origin, have);
+            if (delta && this.send(peerId, 'ROUTES_DELTA', delta)) {
+                this.stats.deltasSent++;
+                if (origin === this.nodeManager.myId) this.sent.set(peerId, [delta.epoch, delta.to]);
+            }
+        }
+    }
+
+    install(origin, services) {
+        for (const serviceId of services) {
+            const current = this.smartRouter.get(serviceId);
+            if (current && !(current instanceof PeerLink)) continue; // a local adapter wins
+            const link = new PeerLink(this, origin, serviceId);
+            this.installed.set(serviceId, link);
+            this.smartRouter.register(serviceId, link);
+        }
+    }
+
+    /**
+     * Remove the links of services that `origin` no longer serves. A service
+     * routed through another origin is left alone; one routed through
+     * `origin` moves to another connected peer that still has it live.
+     */
+    uninstall(origin, services) {
+        for (const serviceId of services) {
+            const link = this.installed.get(serviceId);
+            if (!link || link.origin !== origin) continue;
+            this.installed.delete(serviceId);
+            if (this.smartRouter.get(serviceId) !== link) continue;
+            this.smartRouter.unregister(serviceId);
+
+            for (const peerId of this.nodeManager.peers.keys()) {
+                if (peerId !== origin && this.routes.isLive(peerId, serviceId)) {
+                    this.install(peerId, [serviceId]);
+                    break;
+                }
             }
-        });
+        }
     }
 
-    handleSync(message) {
-        if (message.type === 'SYNC_ROUTES') {
-            const remoteRoutes = message.payload;
-            // Merge logic: Add remote routes to local router pointing to the peer
-            // For now, just log
-            logger.debug(`[ClusterSync] Received routes from ${message.source}: ${remoteRoutes.length}`);
+    // A call forwarded by a peer: hand it to the local adapter, never further
+    deliver({ target, data }) {
+        const ws = this.smartRouter.get(target);
+        if (!ws || ws instanceof PeerLink || ws.readyState !== 1) {
+            logger.warn(`[ClusterSync] Dropping forwarded message for ${target}: no local adapter`);
+            return;
         }
+        this.stats.forwarded++;
+        ws.send(ws.encoding ? encodeFor(ws, decodeFrame(data, false)) : data);
+    }
+
+    getStats() {
+        return { ...this.stats, origins: this.routes.origins.size, remoteRoutes: this.installed.size };
     }
 }
 
+ClusterSync.PeerLink = PeerLink;
+
 module.exports = ClusterSync;
@@ -1,8 +1,17 @@
+const EventEmitter = require('events');
 const logger = require('../logger');
 const WebSocket = require('ws');
 
-class NodeManager {
+/**
+ * Peer connections of a cluster node.
+ *
+ * Events: 'peer' (peerId) once a peer has identified itself, 'peer-lost'
+ * (peerId) when it disconnects or times out, and 'message' (msg, peerId) for
+ * everything other than HELLO / HEARTBEAT (route gossip, forwarded calls).
+ */
+class NodeManager extends EventEmitter {
     constructor(myId, port, peers = []) {
+        super();
         this.myId = myId;
         this.port = port;
         this.peers = new Map(); // peerId -> { ws, lastSeen }
@@ -25,22 +34,8 @@ class NodeManager {
         logger.info(`[NodeManager] Connecting to peer: ${url}`);
         const ws = new WebSocket(url);
 
-        ws.on('open', () => {
-            ws.send(JSON.stringify({
-                type: 'HELLO',
-                source: this.myId,
-                payload: { url: `ws://localhost:${this.port}` }
-            }));
-        });
-
-        ws.on('message', (data) => {
-            try {
-                const msg = JSON.parse(data);
-                this.handleMessage(msg, ws, url);
-            } catch (err) {
-                logger.error(`[NodeManager] Failed to parse peer message`, { error: err.message });
-            }
-        });
+        ws.on('open', () => this.sendHello(ws));
+        this.listen(ws, url);
 
         ws.on('close', () => {
             logger.warn(`[NodeManager] Peer disconnected: ${url}`);
@@ -54,15 +49,64 @@ class NodeManager {
         });
     }
 
+    /**
+     * Take over a connection a peer opened to us.
+     * @param {WebSocket} ws
+     */
+    acceptPeer(ws) {
+        this.listen(ws, null);
+        ws.on('close', () => {
+            for (const [id, peer] of this.peers.entries()) {
+                if (peer.ws === ws) this.removePeer(id);
+            }
+        });
+    }
+
+    listen(ws, url) {
+        ws.on('message', (data) => {
+            let msg;
+            try {
+                msg = JSON.parse(data);
+            } catch (err) {
+                logger.error(`[NodeManager] Failed to parse peer message`, { error: err.message });
+                return;
+            }
+            this.handleMessage(msg, ws, url);
+        });
+    }
+
+    sendHello(ws) {
+        ws.send(JSON.stringify({
+            type: 'HELLO',
+            source: this.myId,
+            payload: { url: `ws://localhost:${this.port}` }
+        }));
+    }
+
     handleMessage(msg, ws, url) {
         if (msg.type === 'HELLO') {
             const peerId = msg.source;
-            this.peers.set(peerId, { id: peerId, ws, url, lastSeen: Date.now() });
+            const known = this.peers.get(peerId);
+            this.peers.set(peerId, { id: peerId, ws, url: url || msg.payload?.url, lastSeen: Date.now() });
             logger.info(`[NodeManager] Peer identified: ${peerId}`);
-        } else if (msg.type === 'HEARTBEAT') {
-            const peer = this.peers.get(msg.source);
-            if (peer) peer.lastSeen = Date.now();
+            if (!url) this.sendHello(ws); // inbound: identify ourselves back
+            if (!known || known.ws !== ws) this.emit('peer', peerId);
+            return;
         }
+        const peer = this.peers.get(msg.source);
+        if (peer) peer.lastSeen = Date.now();
+        if (msg.type !== 'HEARTBEAT') this.emit('message', msg, msg.source);
+    }
+
+    /**
+     * Send a message to one peer.
+     * @returns {boolean} false when the peer is unknown or not connected
+     */
+    send(peerId, msg) {
+        const peer = this.peers.get(peerId);
+        if (!peer || peer.ws.readyState !== WebSocket.OPEN) return false;
+        peer.ws.send(JSON.stringify({ ...msg, source: this.myId }));
+        return true;
     }
 
     heartbeat() {
@@ -71,7 +115,7 @@ class NodeManager {
             if (now - peer.lastSeen > 15000) {
                 logger.warn(`[NodeManager] Peer ${id} timed out`);
                 peer.ws.terminate();
-                this.peers.delete(id);
+                this.removePeer(id);
             } else {
                 if (peer.ws.readyState === WebSocket.OPEN) {
                     peer.ws.send(JSON.stringify({ type: 'HEARTBEAT', source: this.myId }));
@@ -80,10 +124,14 @@ class NodeManager {
         });
     }
 
+    removePeer(id) {
+        if (this.peers.delete(id)) this.emit('peer-lost', id);
+    }
+
     removePeerByUrl(url) {
         for (const [id, peer] of this.peers.entries()) {
             if (peer.url === url) {
-                this.peers.delete(id);
+                this.removePeer(id);
                 break;
             }
         }
@@ -0,0 +1,192 @@
+const logger = require('../logger');
+
+/**
+ * Route table replicated between cluster nodes.
+ *
+ * Every node is the only writer of its own services. Each change it makes
+ * gets the next number of its sequence, so "everything of node N after seq S"
+ * is a well-defined delta: the entries of N whose seq is above S, removals
+ * included as tombstones. Peers keep per-origin { epoch, seq } and can tell
+ * from a digest of those pairs exactly which deltas they are missing. The
+ * epoch changes when a node restarts, which invalidates what peers hold for it.
+ */
+class VersionedRoutes {
+    /**
+     * @param {string} nodeId - This node's id (the origin of its local routes)
+     * @param {number} [epoch] - Incarnation of this node, defaults to start time
+     */
+    constructor(nodeId, epoch = Date.now()) {
+        this.nodeId = nodeId;
+        this.origins = new Map(); // origin -> { epoch, seq, entries: Map<service, { seq, live }> }
+        this.origins.set(nodeId, { epoch, seq: 0, entries: new Map() });
+    }
+
+    get local() {
+        return this.origins.get(this.nodeId);
+    }
+
+    /**
+     * Reconcile the local origin with the services registered right now.
+     * @param {Iterable<string>} services
+     * @returns {number} Number of changes (each takes a sequence number)
+     */
+    syncLocal(services) {
+        const state = this.local;
+        const current = new Set(services);
+        let changes = 0;
+        for (const service of current) {
+            const entry = state.entries.get(service);
+            if (!entry || !entry.live) {
+                state.entries.set(service, { seq: ++state.seq, live: true });
+                changes++;
+            }
+        }
+        for (const [service, entry] of state.entries) {
+            if (entry.live && !current.has(service)) {
+                state.entries.set(service, { seq: ++state.seq, live: false });
+                changes++;
+            }
+        }
+        return changes;
+    }
+
+    /**
+     * Changes of `origin` after `sinceSeq`, or null when there are none.
+     * From seq 0 only live entries are sent: the receiver starts empty.
+     * @returns {{origin, epoch, from, to, changes: Array<[string, number, number]>}|null}
+     */
+    delta(origin, sinceSeq = 0) {
+        const state = this.origins.get(origin);
+        if (!state || state.seq <= sinceSeq) return null;
+        const changes = [];
+        for (const [service, entry] of state.entries) {
+            if (entry.seq > sinceSeq && (entry.live || sinceSeq > 0)) {
+                changes.push([service, entry.seq, entry.live ? 1 : 0]);
+            }
+        }
+        return { origin, epoch: state.epoch, from: sinceSeq, to: state.seq, changes };
+    }
+
+    /**
+     * Changes of `origin` that a peer holding `held` ([epoch, seq]) lacks.
+     */
+    deltaFor(origin, held) {
+        const state = this.origins.get(origin);
+        if (!state) return null;
+        return this.delta(origin, held && held[0] === state.epoch ? held[1] : 0);
+    }
+
+    /**
+     * Merge a delta from a peer.
+     * @returns {{ applied: boolean, gap: boolean, added: string[], removed: string[] }}
+     *          `gap` means changes between what we hold and `delta.from` are
+     *          missing; pull them with held(origin).
+     */
+    apply(delta) {
+        const result = { applied: false, gap: false, added: [], removed: [] };
+        if (delta.origin === this.nodeId) return result;
+
+        let state = this.origins.get(delta.origin);
+        let previous = null; // live services of a replaced epoch
+        if (state && delta.epoch < state.epoch) return result;
+        if (!state || delta.epoch > state.epoch) {
+            if (delta.from !== 0) {
+                result.gap = true;
+                return result;
+            }
+            if (state) previous = new Set(this.services(delta.origin));
+            state = { epoch: delta.epoch, seq: 0, entries: new Map() };
+            this.origins.set(delta.origin, state);
+        }
+        if (delta.from > state.seq) {
+            result.gap = true;
+            return result;
+        }
+        if (delta.to <= state.seq) return result;
+
+        for (const [service, seq, live] of delta.changes) {
+            const entry = state.entries.get(service);
+            if (entry && entry.seq >= seq) continue;
+            state.entries.set(service, { seq, live: !!live });
+            const wasLive = !!(entry && entry.live);
+            if (live && !wasLive) result.added.push(service);
+            else if (!live && wasLive) result.removed.push(service);
+        }
+        // Report a new epoch as the net change against the old one
+        if (previous) {
+            result.added = result.added.filter(service => !previous.has(service));
+            for (const service of previous) {
+                const entry = state.entries.get(service);
+                if (!entry || !entry.live) result.removed.push(service);
+            }
+        }
+        state.seq = delta.to;
+        result.applied = true;
+        logger.debug(`[VersionedRoutes] ${delta.origin} ${delta.from}..${delta.to}: +${result.added.length} -${result.removed.length}`);
+        return result;
+    }
+
+    /**
+     * Compact summary for anti-entropy: origin -> [epoch, seq].
+     */
+    digest() {
+        const digest = {};
+        for (const [origin, state] of this.origins) digest[origin] = [state.epoch, state.seq];
+        return digest;
+    }
+
+    /**
+     * Compare a peer's digest with ours.
+     * @returns {{ want: Object<string, Array>, offer: Object<string, Array> }}
+     *          want: origins we are behind on -> what we hold (for a pull);
+     *          offer: origins the peer is behind on -> what it holds (for deltaFor).
+     */
+    compare(digest) {
+        const want = {};
+        const offer = {};
+        for (const [origin, held] of Object.entries(digest)) {
+            const [epoch, seq] = held;
+            const state = this.origins.get(origin);
+            if (!state && seq === 0) continue;
+            if (origin !== this.nodeId && (!state || epoch > state.epoch || (epoch === state.epoch && seq > state.seq))) {
+                want[origin] = this.held(origin);
+            } else if (state && (epoch < state.epoch || seq < state.seq)) {
+                offer[origin] = held;
+            }
+        }
+        for (const [origin, state] of this.origins) {
+            if (!(origin in digest) && state.seq > 0) offer[origin] = null;
+        }
+        return { want, offer };
+    }
+
+    /**
+     * What we hold of an origin: [epoch, seq], [0, 0] when unknown.
+     */
+    held(origin) {
+        const state = this.origins.get(origin);
+        return state ? [state.epoch, state.seq] : [0, 0];
+    }
+
+    /**
+     * Whether an origin has a service live.
+     */
+    isLive(origin, service) {
+        const state = this.origins.get(origin);
+        const entry = state && state.entries.get(service);
+        return !!(entry && entry.live);
+    }
+
+    /**
+     * Live services of one origin.
+     */
+    services(origin) {
+        const state = this.origins.get(origin);
+        if (!state) return [];
+        const live = [];
+        for (const [service, entry] of state.entries) if (entry.live) live.push(service);
+        return live;
+    }
+}
+
+module.exports = VersionedRoutes;
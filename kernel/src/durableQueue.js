@@ -0,0 +1,533 @@
+// kernel/src/durableQueue.js
+const cluster = require('cluster');
+const fs = require('fs');
+const path = require('path');
+const logger = require('./logger');
+const config = require('./config/config');
+
+// Record: [u32 length][u32 crc32][f64 seq][f64 enqueued-at ms][JSON payload]
+const HEADER = 24;
+const SEGMENT_EXT = '.seg';
+const CURSOR_FILE = 'cursor.idx'; // [f64 next seq to deliver][f64 its segment base][f64 its offset]
+const READ_CHUNK = 1024 * 1024;
+// Not O_APPEND: records go to explicit offsets, so close() can rewrite a batch still in flight
+const SEGMENT_FLAGS = fs.constants.O_WRONLY | fs.constants.O_CREAT;
+const REPLAY_TICK_MS = 10;
+
+const CRC_TABLE = new Int32Array(256).map((_, n) => {
+    let c = n;
+    for (let k = 0; k < 8; k++) c = c & 1 ? 0xEDB88320 ^ (c >>> 1) : c >>> 1;
+    return c;
+});
+
+function crc32(buf) {
+    let crc = -1;
+    for (let i = 0; i < buf.length; i++) crc = CRC_TABLE[(crc ^ buf[i]) & 0xFF] ^ (crc >>> 8);
+    return (crc ^ -1) >>> 0;
+}
+
+function encodeCursor(cursor) {
+    const idx = Buffer.alloc(24);
+    idx.writeDoubleLE(cursor.seq, 0);
+    idx.writeDoubleLE(cursor.base, 8);
+    idx.writeDoubleLE(cursor.offset, 16);
+    return idx;
+}
+
+function segmentName(base) {
+    return String(base).padStart(20, '0') + SEGMENT_EXT;
+}
+
+function encodeRecord(seq, timestamp, message) {
+    const body = Buffer.from(JSON.stringify(message));
+    const record = Buffer.allocUnsafe(HEADER + body.length);
+    record.writeUInt32LE(body.length, 0);
+    record.writeUInt32LE(crc32(body), 4);
+    record.writeDoubleLE(seq, 8);
+    record.writeDoubleLE(timestamp, 16);
+    body.copy(record, HEADER);
+    return record;
+}
+
+/**
+ * Parse the complete records at the start of `buf`.
+ * @returns {Array<{seq, timestamp, body, size}>} Stops at a torn or corrupt record
+ */
+function decodeRecords(buf, limit = Infinity) {
+    const records = [];
+    let offset = 0;
+    while (records.length < limit && offset + HEADER <= buf.length) {
+        const length = buf.readUInt32LE(offset);
+        if (offset + HEADER + length > buf.length) break;
+        const body = buf.subarray(offset + HEADER, offset + HEADER + length);
+        if (crc32(body) !== buf.readUInt32LE(offset + 4)) break;
+        records.push({ seq: buf.readDoubleLE(offset + 8), timestamp: buf.readDoubleLE(offset + 16), body, size: HEADER + length });
+        offset += HEADER + length;
+    }
+    return records;
+}
+
+// Cluster workers must not append to the same segment files: each one owns
+// <dir>/w<slot>, which a respawned worker in the same slot takes over
+function processQueueDir(dir, slot = cluster.isWorker ? config.kernel.workerSlot : null) {
+    return slot === null || slot === undefined ? dir : path.join(dir, `w${slot}`);
+}
+
+/**
+ * Append-only log of one target: numbered segment files plus a cursor.
+ * Writes are buffered and flushed with one writev + fdatasync per interval;
+ * only flushed records are replayed.
+ */
+class TargetLog {
+    constructor(dir, options) {
+        this.dir = dir;
+        this.options = options;
+        this.segments = [];     // [{ base, bytes }] oldest first; the last one is written to
+        this.pending = [];      // encoded records not yet written
+        this.pendingBytes = 0;
+        this.writing = null;    // records handed to the writev in flight
+        this.flushing = null;
+        this.closed = false;
+        this.replaying = false;
+        this.cursorWrite = null; // Promise of the cursor write in progress
+        this.cursorDirty = false;
+        this.stats = { enqueued: 0, replayed: 0, expired: 0, rejected: 0, corrupt: 0, syncErrors: 0, cursorErrors: 0 };
+        this.open();
+    }
+
+    open() {
+        fs.mkdirSync(this.dir, { recursive: true });
+        const bases = fs.readdirSync(this.dir)
+            .filter(f => f.endsWith(SEGMENT_EXT))
+            .map(f => Number(f.slice(0, -SEGMENT_EXT.length)))
+            .sort((a, b) => a - b);
+        this.segments = bases.map(base => ({ base, bytes: fs.statSync(this.file(base)).size }));
+
+        this.cursor = { seq: 0, base: 0, offset: 0 };
+        try {
+            const idx = fs.readFileSync(path.join(this.dir, CURSOR_FILE));
+            this.cursor = { seq: idx.readDoubleLE(0), base: idx.readDoubleLE(8), offset: idx.readDoubleLE(16) };
+        } catch (err) {
+            if (this.segments.length) this.cursor = { seq: this.segments[0].base, base: this.segments[0].base, offset: 0 };
+        }
+
+        if (this.segments.length === 0) this.segments.push({ base: this.cursor.seq, bytes: 0 });
+        // Recover the tail: count the records of the last segment, cut off a torn write
+        const tail = this.segments[this.segments.length - 1];
+        const data = tail.bytes ? fs.readFileSync(this.file(tail.base)) : Buffer.alloc(0);
+        const records = decodeRecords(data);
+        const valid = records.reduce((n, r) => n + r.size, 0);
+        if (valid < data.length) {
+            logger.warn(`[DurableQueue] Truncating ${data.length - valid} torn bytes in ${this.file(tail.base)}`);
+            fs.truncateSync(this.file(tail.base), valid);
+        }
+        tail.bytes = valid;
+        this.flushedSeq = tail.base + records.length; // next seq after the last durable record
+        this.nextSeq = this.flushedSeq;
+        if (this.cursor.seq > this.flushedSeq) this.cursor = { seq: this.flushedSeq, base: tail.base, offset: valid };
+        this.committedSeq = this.cursor.seq;
+        this.fd = fs.openSync(this.file(tail.base), SEGMENT_FLAGS);
+    }
+
+    file(base) {
+        return path.join(this.dir, segmentName(base));
+    }
+
+    get depth() {
+        return this.nextSeq - this.cursor.seq;
+    }
+
+    get bytes() {
+        return this.segments.reduce((n, s) => n + s.bytes, 0) + this.pendingBytes;
+    }
+
+    append(message) {
+        const { maxMessages, maxBytes } = this.options;
+        if (this.depth >= maxMessages || this.bytes >= maxBytes) {
+            this.stats.rejected++;
+            return null;
+        }
+        const seq = this.nextSeq++;
+        const record = encodeRecord(seq, Date.now(), message);
+        this.pending.push(record);
+        this.pendingBytes += record.length;
+        this.stats.enqueued++;
+        return seq;
+    }
+
+    /**
+     * Write and fdatasync everything appended so far.
+     * @returns {Promise<void>}
+     */
+    flush() {
+        if (this.flushing) return this.flushing.then(() => this.flush());
+        if (this.closed || this.pending.length === 0) return Promise.resolve();
+
+        const buffers = this.pending;
+        const bytes = this.pendingBytes;
+        this.pending = [];
+        this.pendingBytes = 0;
+        this.writing = buffers;
+        const segment = this.segments[this.segments.length - 1];
+
+        this.flushing = new Promise((resolve) => {
+            const done = () => {
+                this.writing = null;
+                // close() already wrote these records; the fd was left open for us
+                if (this.closed) fs.close(this.fd, () => {});
+                resolve();
+            };
+            fs.writev(this.fd, buffers, segment.bytes, (err) => {
+                if (this.closed) return done();
+                if (err) {
+                    logger.error(`[DurableQueue] Write failed in ${this.dir}`, { error: err.message });
+                    this.pending = buffers.concat(this.pending);
+                    this.pendingBytes += bytes;
+                    return done();
+                }
+                fs.fdatasync(this.fd, (syncErr) => {
+                    if (this.closed) return done();
+                    // The records are written either way; they just may not survive a crash
+                    if (syncErr) {
+                        this.stats.syncErrors++;
+                        logger.error(`[DurableQueue] fdatasync failed in ${this.dir}`, { error: syncErr.message });
+                    }
+                    segment.bytes += bytes;
+                    this.flushedSeq += buffers.length;
+                    if (segment.bytes >= this.options.segmentBytes) this.roll();
+                    done();
+                });
+            });
+        }).then(() => {
+            this.flushing = null;
+        });
+        return this.flushing;
+    }
+
+    roll() {
+        fs.closeSync(this.fd);
+        const base = this.flushedSeq;
+        this.segments.push({ base, bytes: 0 });
+        this.fd = fs.openSync(this.file(base), SEGMENT_FLAGS);
+    }
+
+    /**
+     * Up to `limit` durable records from the cursor on.
+     */
+    read(limit) {
+        if (this.cursor.seq >= this.flushedSeq) return [];
+        let index = this.segments.findIndex(s => s.base === this.cursor.base);
+        if (index < 0) {
+            // Cursor from before a cleanup: start at the oldest segment
+            index = 0;
+            this.cursor = { seq: this.segments[0].base, base: this.segments[0].base, offset: 0 };
+        }
+        const segment = this.segments[index];
+        if (this.cursor.offset >= segment.bytes) {
+            const next = this.segments[index + 1];
+            if (!next) return [];
+            this.cursor = { seq: next.base, base: next.base, offset: 0 };
+            return this.read(limit);
+        }
+        const length = Math.min(READ_CHUNK, segment.bytes - this.cursor.offset);
+        const buf = Buffer.allocUnsafe(length);
+        const fd = fs.openSync(this.file(segment.base), 'r');
+        try {
+            fs.readSync(fd, buf, 0, length, this.cursor.offset);
+        } finally {
+            fs.closeSync(fd);
+        }
+        let records = decodeRecords(buf, limit);
+        if (records.length === 0 && length === READ_CHUNK) {
+            // A single record larger than the chunk
+            const size = HEADER + buf.readUInt32LE(0);
+            const big = Buffer.allocUnsafe(size);
+            const bigFd = fs.openSync(this.file(segment.base), 'r');
+            try {
+                fs.readSync(bigFd, big, 0, size, this.cursor.offset);
+            } finally {
+                fs.closeSync(bigFd);
+            }
+            records = decodeRecords(big, 1);
+        }
+        return records;
+    }
+
+    advance(record) {
+        this.cursor = { seq: record.seq + 1, base: this.cursor.base, offset: this.cursor.offset + record.size };
+    }
+
+    /**
+     * Persist the cursor if it advanced, then delete segments that are fully
+     * delivered. Writes are asynchronous; commits made while one is running
+     * are folded into a single follow-up write.
+     * @returns {Promise<void>} Settles once the cursor as of this call is on disk (or failed to be)
+     */
+    commit() {
+        if (this.cursor.seq !== this.committedSeq) {
+            this.cursorDirty = true;
+            if (!this.cursorWrite) this.cursorWrite = this.writeCursor();
+        }
+        return this.cursorWrite || Promise.resolve();
+    }
+
+    async writeCursor() {
+        const file = path.join(this.dir, CURSOR_FILE);
+        try {
+            while (this.cursorDirty) {
+                this.cursorDirty = false;
+                const cursor = { ...this.cursor };
+                await fs.promises.writeFile(`${file}.tmp`, encodeCursor(cursor));
+                await fs.promises.rename(`${file}.tmp`, file);
+                this.committedSeq = cursor.seq;
+
+                while (this.segments.length > 1 && this.segments[1].base <= cursor.seq) {
+                    const done = this.segments.shift();
+                    await fs.promises.unlink(this.file(done.base));
+                }
+            }
+        } catch (err) {
+            // The next commit retries; until then a restart redelivers from the old cursor
+            this.stats.cursorErrors++;
+            logger.error(`[DurableQueue] Cursor write failed in ${this.dir}`, { error: err.message });
+        } finally {
+            this.cursorWrite = null;
+        }
+    }
+
+    /**
+     * Synchronously write and fdatasync every accepted record, then the
+     * cursor. Records of a writev still in flight are written again at the
+     * same offsets; that writev closes the fd when it completes.
+     */
+    close() {
+        if (this.closed) return;
+        this.closed = true;
+        const buffers = (this.writing || []).concat(this.pending);
+        this.pending = [];
+        this.pendingBytes = 0;
+        if (buffers.length > 0) {
+            const segment = this.segments[this.segments.length - 1];
+            let position = segment.bytes;
+            try {
+                for (const buffer of buffers) {
+                    fs.writeSync(this.fd, buffer, 0, buffer.length, position);
+                    position += buffer.length;
+                }
+                fs.fdatasyncSync(this.fd);
+            } catch (err) {
+                this.stats.syncErrors++;
+                logger.error(`[DurableQueue] Final write failed in ${this.dir}`, { error: err.message });
+            }
+        }
+
+        // A replay that is still running may not have written its last cursor
+        if (!this.cursorWrite && this.cursor.seq !== this.committedSeq) {
+            const file = path.join(this.dir, CURSOR_FILE);
+            fs.writeFileSync(`${file}.tmp`, encodeCursor(this.cursor));
+            fs.renameSync(`${file}.tmp`, file);
+        }
+        if (!this.writing) fs.closeSync(this.fd);
+    }
+}
+
+/**
+ * Opt-in store-and-forward for targets that are unreachable: messages for a
+ * missing or closed adapter are appended to the target's log and replayed,
+ * in order and rate limited, once it registers again. While a target has a
+ * backlog, new messages for it are queued behind the backlog.
+ */
+class DurableQueue {
+    /**
+     * @param {Object} [options] - { dir, targets: string[] ('*' = any), segmentBytes,
+     *   fsyncIntervalMs, maxBytesPerTarget, maxMessagesPerTarget, maxAgeMs, replayRatePerSec }
+     */
+    constructor(options = {}) {
+        this.dir = options.dir;
+        this.targets = new Set(options.targets || []);
+        this.segmentBytes = options.segmentBytes || 64 * 1024 * 1024;
+        this.fsyncIntervalMs = options.fsyncIntervalMs || 50;
+        this.maxBytes = options.maxBytesPerTarget || 1024 * 1024 * 1024;
+        this.maxMessages = options.maxMessagesPerTarget || 1000000;
+        this.maxAgeMs = options.maxAgeMs || 24 * 60 * 60 * 1000;
+        this.replayRatePerSec = options.replayRatePerSec || 5000;
+        this.logs = new Map(); // target -> TargetLog
+        this.timer = null;
+
+        if (this.targets.size > 0) this.recover();
+    }
+
+    get enabled() {
+        return this.targets.size > 0;
+    }
+
+    // Open logs left by a previous run, so their backlog is replayed
+    recover() {
+        if (!fs.existsSync(this.dir)) return;
+        for (const name of fs.readdirSync(this.dir)) {
+            const log = this.log(decodeURIComponent(name));
+            if (log.depth > 0) logger.info(`[DurableQueue] ${decodeURIComponent(name)}: ${log.depth} queued messages from a previous run`);
+        }
+    }
+
+    /**
+     * Whether messages for this target may be queued.
+     */
+    accepts(target) {
+        if (!this.enabled || !target || target.startsWith('client-')) return false;
+        return this.targets.has('*') || this.targets.has(target);
+    }
+
+    /**
+     * Whether a target has queued messages (new ones must queue behind them).
+     */
+    hasBacklog(target) {
+        const log = this.logs.get(target);
+        return !!log && log.depth > 0;
+    }
+
+    isReplaying(target) {
+        const log = this.logs.get(target);
+        return !!log && log.replaying;
+    }
+
+    backlogTargets() {
+        return [...this.logs.keys()].filter(target => this.hasBacklog(target));
+    }
+
+    log(target) {
+        let log = this.logs.get(target);
+        if (!log) {
+            log = new TargetLog(path.join(this.dir, encodeURIComponent(target)), {
+                segmentBytes: this.segmentBytes,
+                maxBytes: this.maxBytes,
+                maxMessages: this.maxMessages,
+            });
+            this.logs.set(target, log);
+            this.startFlushing();
+        }
+        return log;
+    }
+
+    startFlushing() {
+        if (this.timer) return;
+        this.timer = setInterval(() => this.flush(), this.fsyncIntervalMs);
+        if (this.timer.unref) this.timer.unref();
+    }
+
+    /**
+     * Append a message to a target's log; durable after the next flush.
+     * @returns {number|null} Sequence number, or null when retention limits are hit
+     */
+    enqueue(target, message) {
+        return this.log(target).append(message);
+    }
+
+    flush() {
+        return Promise.all([...this.logs.values()].map(log => log.flush()));
+    }
+
+    /**
+     * Deliver a target's backlog at up to replayRatePerSec.
+     * @param {string} target
+     * @param {Function} deliver - (message) => "sent" | "busy" (retry next tick) | "gone" (stop)
+     * @returns {Promise<number>} Messages delivered; settles once the cursor is persisted. A replay
+     *   that fails (a read or deliver error) stops early and leaves the rest queued.
+     */
+    replay(target, deliver) {
+        const log = this.logs.get(target);
+        if (!log || log.replaying) return Promise.resolve(0);
+        log.replaying = true;
+        const budget = Math.max(1, Math.round(this.replayRatePerSec * REPLAY_TICK_MS / 1000));
+        let delivered = 0;
+
+        return new Promise((resolve) => {
+            const finish = () => log.commit().then(() => {
+                log.replaying = false;
+                if (delivered) logger.info(`[DurableQueue] Replayed ${delivered} messages to ${target}`);
+                resolve(delivered);
+            });
+            const tick = () => {
+                let sent = 0;
+                let state = "sent";
+                try {
+                    while (sent < budget && state === "sent") {
+                        const records = log.read(budget - sent);
+                        if (records.length === 0) break;
+                        for (const record of records) {
+                            if (record.timestamp < Date.now() - this.maxAgeMs) {
+                                log.stats.expired++;
+                                log.advance(record);
+                                continue;
+                            }
+                            let message;
+                            try {
+                                message = JSON.parse(record.body);
+                            } catch (err) {
+                                // Passed the CRC but is not JSON: skip it rather than stall the target
+                                log.stats.corrupt++;
+                                logger.error(`[DurableQueue] Skipping unreadable record ${record.seq} for ${target}`, { error: err.message });
+                                log.advance(record);
+                                continue;
+                            }
+                            state = deliver(message);
+                            if (state !== "sent") break;
+                            log.advance(record);
+                            log.stats.replayed++;
+                            delivered++;
+                            sent++;
+                        }
+                    }
+                    log.commit();
+                } catch (err) {
+                    logger.error(`[DurableQueue] Replay to ${target} failed`, { error: err.message });
+                    return finish();
+                }
+                if (state === "gone" || log.depth === 0) return finish();
+                // Wait for the next tick: rate limit, busy socket or records still being flushed
+                setTimeout(tick, REPLAY_TICK_MS);
+            };
+            tick();
+        });
+    }
+
+    getStats() {
+        const targets = {};
+        for (const [target, log] of this.logs) {
+            targets[target] = {
+                depth: log.depth,
+                bytes: log.bytes,
+                segments: log.segments.length,
+                replaying: log.replaying,
+                ...log.stats,
+            };
+        }
+        return { enabled: this.enabled, targets };
+    }
+
+    close() {
+        clearInterval(this.timer);
+        this.timer = null;
+        for (const log of this.logs.values()) log.close();
+        this.logs.clear();
+    }
+}
+
+// Shared queue for routeUDL, configured from config.durableQueue
+const durableQueue = new DurableQueue({
+    dir: processQueueDir(config.durableQueue.dir),
+    targets: config.durableQueue.targets.split(',').map(t => t.trim()).filter(Boolean),
+    segmentBytes: config.durableQueue.segmentBytes,
+    fsyncIntervalMs: config.durableQueue.fsyncIntervalMs,
+    maxBytesPerTarget: config.durableQueue.maxBytesPerTarget,
+    maxMessagesPerTarget: config.durableQueue.maxMessagesPerTarget,
+    maxAgeMs: config.durableQueue.maxAgeMs,
+    replayRatePerSec: config.durableQueue.replayRatePerSec,
+});
+
+module.exports = {
+    DurableQueue,
+    crc32,
+    processQueueDir,
+    durableQueue
+};
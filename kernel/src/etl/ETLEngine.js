@@ -1,5 +1,16 @@
 const logger = require('../logger');
 const cron = require('node-cron');
+const config = require('../config/config');
+const {
+    compileCondition,
+    compileMapping,
+    compileStages,
+    applyStages,
+    TransformWorkerPool,
+    toBatches,
+    readCSVBatches,
+    runStreaming
+} = require('./streaming');
 
 /**
  * ETL/ELT Platform Engine
@@ -46,7 +57,9 @@ class ETLEngine {
             transformations = [],
             target,
             mode = 'batch', // 'batch' or 'stream'
-            schedule = null
+            schedule = null,
+            batchSize = null,  // stream mode: records per batch
+            workers = null     // stream mode: worker threads for map/filter stages
         } = definition;
 
         const pipeline = {
@@ -56,6 +69,8 @@ class ETLEngine {
             target,
             mode,
             schedule,
+            batchSize,
+            workers,
             status: 'created',
             runs: []
         };
@@ -108,6 +123,10 @@ class ETLEngine {
         pipeline.runs.push(run);
 
         try {
+            if (pipeline.mode === 'stream') {
+                return await this.runStream(pipeline, run, options);
+            }
+
             // Step 1: Extract
             const data = await this.extract(pipeline.source);
             run.recordsProcessed = data.length;
@@ -140,6 +159,67 @@ class ETLEngine {
         }
     }
 
+    /**
+     * Run a stream-mode pipeline: extract, transform and load batch by batch
+     * with bounded buffering (see streaming.js).
+     * @param {Object} options - { batchSize, workers, maxInFlight }
+     */
+    async runStream(pipeline, run, options = {}) {
+        const batchSize = options.batchSize || pipeline.batchSize || config.etl.streamBatchSize;
+        const workers = options.workers ?? pipeline.workers ?? config.etl.transformWorkers;
+        const stages = compileStages(pipeline.transformations);
+        const pool = workers > 0 && stages.some(stage => stage.ops)
+            ? new TransformWorkerPool(pipeline.transformations, workers)
+            : null;
+
+        run.stream = { batchSize, workers: pool ? workers : 0 };
+        try {
+            await runStreaming(
+                this.extractStream(pipeline.source, batchSize),
+                batch => applyStages(stages, batch, {
+                    pool,
+                    applyBatch: (records, transformation) => this.transform(records, transformation)
+                }),
+                records => this.load(records, pipeline.target),
+                { maxInFlight: options.maxInFlight, stats: run.stream }
+            );
+        } finally {
+            if (pool) await pool.close();
+        }
+
+        run.recordsProcessed = run.stream.recordsIn;
+        run.status = 'completed';
+        run.endTime = Date.now();
+        run.duration = run.endTime - run.startTime;
+
+        logger.info(`[ETL] Pipeline ${pipeline.id} streamed ${run.recordsProcessed} records in ${run.stream.batches} batches (${run.duration}ms)`);
+
+        return { success: true, run };
+    }
+
+    /**
+     * Extract data from source as an async iterator of record batches.
+     * CSV sources with a `path` are read line by line; sources registered
+     * with a `records` (async) iterable are chunked as they produce; other
+     * sources fall back to extract().
+     */
+    extractStream(sourceId, batchSize) {
+        const source = this.dataSources.get(sourceId);
+        if (!source) {
+            throw new Error(`Data source '${sourceId}' not found`);
+        }
+
+        logger.debug(`[ETL] Streaming from ${source.type}: ${sourceId}`);
+
+        if (source.config.records) {
+            return toBatches(source.config.records, batchSize);
+        }
+        if (source.type === 'csv' && source.config.path) {
+            return readCSVBatches(source.config.path, batchSize, source.config);
+        }
+        return toBatches(this.extract(sourceId), batchSize);
+    }
+
     /**
      * Extract data from source
      */
@@ -215,26 +295,12 @@ class ETLEngine {
     }
 
     transformMap(data, config) {
-        const { mapping } = config;
-        return data.map(record => {
-            const mapped = {};
-            for (const [targetField, sourceField] of Object.entries(mapping)) {
-                mapped[targetField] = record[sourceField];
-            }
-            return mapped;
-        });
+        return data.map(compileMapping(config.mapping));
     }
 
     transformFilter(data, config) {
-        const { condition } = config; // e.g., "age > 25"
-        // Simple eval for demo (use proper parser in production)
-        return data.filter(record => {
-            try {
-                return eval(condition.replace(/(\w+)/g, 'record.$1'));
-            } catch {
-                return true;
-            }
-        });
+        // e.g., "age > 25"; bare identifiers are record fields
+        return data.filter(compileCondition(config.condition));
     }
 
     transformAggregate(data, config) {
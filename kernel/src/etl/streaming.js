@@ -0,0 +1,333 @@
+/**
+ * Streaming ETL execution
+ *
+ * Records move through a stream-mode pipeline as batches pulled from an async
+ * iterator. Consecutive per-record transforms (map, filter) are compiled once
+ * and fused into a single pass per batch; other transforms see each batch as
+ * a whole. At most `maxInFlight` batches sit between extract and load, so
+ * memory stays flat however many records the source produces. Fused stages
+ * can run on a worker_threads pool for CPU-heavy pipelines.
+ */
+
+const fs = require('fs');
+const path = require('path');
+const readline = require('readline');
+const { Worker } = require('worker_threads');
+const config = require('../config/config');
+
+const WORKER_PATH = path.join(__dirname, 'transformWorker.js');
+const FUSABLE = new Set(['map', 'filter']);
+
+// Words in a filter condition that are not record fields
+const RESERVED = new Set(['true', 'false', 'null', 'undefined', 'NaN', 'Infinity', 'typeof', 'instanceof', 'in', 'Math']);
+
+/**
+ * Compile a filter condition ("age > 25 && active") into a predicate.
+ * Bare identifiers refer to record fields. Records the condition cannot be
+ * evaluated for are kept, as in batch mode.
+ */
+function compileCondition(condition) {
+    const body = String(condition).replace(
+        /(['"])(?:\\.|(?!\1).)*\1|(?<![\w$.])[A-Za-z_$][\w$]*/g,
+        token => (token[0] === '"' || token[0] === "'" || RESERVED.has(token)) ? token : `record.${token}`
+    );
+    let predicate;
+    try {
+        predicate = new Function('record', `return (${body});`);
+    } catch {
+        return () => true;
+    }
+    return (record) => {
+        try {
+            return predicate(record);
+        } catch {
+            return true;
+        }
+    };
+}
+
+/**
+ * Compile a field mapping ({ target: sourceField }) into a record constructor.
+ */
+function compileMapping(mapping = {}) {
+    const fields = Object.entries(mapping)
+        .map(([targetField, sourceField]) => `${JSON.stringify(targetField)}: record[${JSON.stringify(sourceField)}]`);
+    return new Function('record', `return { ${fields.join(', ')} };`);
+}
+
+/**
+ * Group a pipeline's transformations into stages. Runs of map/filter become
+ * one fused stage `{ ops }`; anything else is `{ transformation }`.
+ */
+function compileStages(transformations = []) {
+    const stages = [];
+    let ops = null;
+    for (const transformation of transformations) {
+        const { type, config: options = {} } = transformation;
+        if (!FUSABLE.has(type)) {
+            ops = null;
+            stages.push({ transformation });
+            continue;
+        }
+        if (!ops) {
+            ops = [];
+            stages.push({ ops });
+        }
+        ops.push(type === 'map'
+            ? { map: compileMapping(options.mapping) }
+            : { filter: compileCondition(options.condition) });
+    }
+    return stages;
+}
+
+/**
+ * Apply fused map/filter ops to a batch in one pass.
+ */
+function runFused(ops, batch) {
+    const out = [];
+    next: for (let i = 0; i < batch.length; i++) {
+        let record = batch[i];
+        for (let j = 0; j < ops.length; j++) {
+            const op = ops[j];
+            if (op.filter) {
+                if (!op.filter(record)) continue next;
+            } else {
+                record = op.map(record);
+            }
+        }
+        out.push(record);
+    }
+    return out;
+}
+
+/**
+ * Run every stage over one batch.
+ * @param {Array} stages - from compileStages()
+ * @param {Array} batch
+ * @param {Object} [options] - { pool, applyBatch(records, transformation) }
+ */
+async function applyStages(stages, batch, { pool = null, applyBatch = null } = {}) {
+    let records = batch;
+    for (let i = 0; i < stages.length && records.length; i++) {
+        const stage = stages[i];
+        if (stage.ops) {
+            records = pool ? await pool.run(i, records) : runFused(stage.ops, records);
+        } else if (applyBatch) {
+            records = await applyBatch(records, stage.transformation);
+        }
+    }
+    return records;
+}
+
+/**
+ * Worker threads running the fused stages of one pipeline. Each worker
+ * compiles the transformations itself; batches are dispatched to idle
+ * workers and queued otherwise.
+ */
+class TransformWorkerPool {
+    constructor(transformations, size) {
+        this.workers = [];
+        this.idle = [];
+        this.queue = [];
+        this.nextId = 0;
+        this.closed = false;
+
+        for (let i = 0; i < size; i++) {
+            const worker = new Worker(WORKER_PATH, { workerData: { transformations } });
+            worker.job = null;
+            worker.on('message', (msg) => this._onMessage(worker, msg));
+            worker.on('error', (err) => this._onError(worker, err));
+            this.workers.push(worker);
+            this.idle.push(worker);
+        }
+    }
+
+    /**
+     * Run fused stage `stage` over `batch` on a worker.
+     * @returns {Promise<Array>}
+     */
+    run(stage, batch) {
+        return new Promise((resolve, reject) => {
+            if (this.closed) {
+                reject(new Error('Transform worker pool is closed'));
+                return;
+            }
+            const job = { id: ++this.nextId, stage, batch, resolve, reject };
+            const worker = this.idle.pop();
+            if (worker) this._send(worker, job);
+            else this.queue.push(job);
+        });
+    }
+
+    _send(worker, job) {
+        worker.job = job;
+        worker.postMessage({ id: job.id, stage: job.stage, batch: job.batch });
+        job.batch = null;
+    }
+
+    _onMessage(worker, msg) {
+        const job = worker.job;
+        worker.job = null;
+        if (job && job.id === msg.id) {
+            if (msg.error) job.reject(new Error(msg.error));
+            else job.resolve(msg.result);
+        }
+        const next = this.queue.shift();
+        if (next) this._send(worker, next);
+        else this.idle.push(worker);
+    }
+
+    _onError(worker, err) {
+        // A crashed worker fails its batch; the pipeline run fails with it
+        if (worker.job) worker.job.reject(err);
+        worker.job = null;
+        this.workers = this.workers.filter(w => w !== worker);
+        this.idle = this.idle.filter(w => w !== worker);
+        if (this.workers.length === 0) {
+            for (const job of this.queue.splice(0)) job.reject(err);
+        }
+    }
+
+    async close() {
+        this.closed = true;
+        for (const job of this.queue.splice(0)) job.reject(new Error('Transform worker pool is closed'));
+        await Promise.all(this.workers.map(w => w.terminate()));
+        this.workers = [];
+        this.idle = [];
+    }
+}
+
+/**
+ * Chunk any (async) iterable of records into batches. Also accepts a
+ * promise of an array, e.g. from a non-streaming extractor.
+ */
+async function* toBatches(records, batchSize) {
+    let batch = [];
+    for await (const record of await records) {
+        batch.push(record);
+        if (batch.length >= batchSize) {
+            yield batch;
+            batch = [];
+        }
+    }
+    if (batch.length) yield batch;
+}
+
+function parseCSVLine(line, delimiter) {
+    if (!line.includes('"')) return line.split(delimiter);
+    const fields = [];
+    let field = '';
+    let quoted = false;
+    for (let i = 0; i < line.length; i++) {
+        const ch = line[i];
+        if (quoted) {
+            if (ch === '"' && line[i + 1] === '"') {
+                field += '"';
+                i++;
+            } else if (ch === '"') {
+                quoted = false;
+            } else {
+                field += ch;
+            }
+        } else if (ch === '"') {
+            quoted = true;
+        } else if (ch === delimiter) {
+            fields.push(field);
+            field = '';
+        } else {
+            field += ch;
+        }
+    }
+    fields.push(field);
+    return fields;
+}
+
+function coerce(value) {
+    return value !== '' && !isNaN(value) ? Number(value) : value;
+}
+
+/**
+ * Read a CSV file with a header row as record batches, line by line.
+ * @param {string} filePath
+ * @param {number} batchSize
+ * @param {Object} [options] - { delimiter }
+ */
+async function* readCSVBatches(filePath, batchSize, { delimiter = ',' } = {}) {
+    const input = fs.createReadStream(filePath, { encoding: 'utf8', highWaterMark: 256 * 1024 });
+    const lines = readline.createInterface({ input, crlfDelay: Infinity });
+    let header = null;
+    let batch = [];
+    try {
+        for await (const line of lines) {
+            if (!line) continue;
+            const values = parseCSVLine(line, delimiter);
+            if (!header) {
+                header = values.map(v => v.trim());
+                continue;
+            }
+            const record = {};
+            for (let i = 0; i < header.length; i++) record[header[i]] = coerce(values[i] ?? '');
+            batch.push(record);
+            if (batch.length >= batchSize) {
+                yield batch;
+                batch = [];
+            }
+        }
+        if (batch.length) yield batch;
+    } finally {
+        lines.close();
+        input.destroy();
+    }
+}
+
+/**
+ * Pull batches, transform up to `maxInFlight` of them concurrently and load
+ * them in order. Extraction only advances when there is room, so a slow
+ * target holds back the source instead of buffering.
+ * @param {AsyncIterable<Array>} batches
+ * @param {function} transformBatch - async (batch) => records
+ * @param {function} loadBatch - async (records) => void
+ * @param {Object} [options] - { maxInFlight, stats }
+ * @returns {Promise<Object>} stats: { batches, recordsIn, recordsOut }
+ */
+async function runStreaming(batches, transformBatch, loadBatch, options = {}) {
+    const maxInFlight = Math.max(1, options.maxInFlight || config.etl.streamMaxInFlight);
+    const stats = options.stats || {};
+    stats.batches = 0;
+    stats.recordsIn = 0;
+    stats.recordsOut = 0;
+
+    const inFlight = [];
+    const loadNext = async () => {
+        const records = await inFlight.shift();
+        if (records.length) await loadBatch(records);
+        stats.recordsOut += records.length;
+    };
+
+    try {
+        for await (const batch of batches) {
+            stats.batches++;
+            stats.recordsIn += batch.length;
+            const pending = Promise.resolve(transformBatch(batch));
+            pending.catch(() => {}); // surfaced by loadNext; avoid an unhandled rejection while queued
+            inFlight.push(pending);
+            if (inFlight.length >= maxInFlight) await loadNext();
+        }
+        while (inFlight.length) await loadNext();
+    } finally {
+        inFlight.length = 0;
+    }
+    return stats;
+}
+
+module.exports = {
+    compileCondition,
+    compileMapping,
+    compileStages,
+    runFused,
+    applyStages,
+    TransformWorkerPool,
+    toBatches,
+    readCSVBatches,
+    runStreaming
+};
@@ -0,0 +1,17 @@
+/**
+ * ETL transform worker
+ * Runs the fused map/filter stages of one pipeline (see streaming.js).
+ */
+
+const { parentPort, workerData } = require('worker_threads');
+const { compileStages, runFused } = require('./streaming');
+
+const stages = compileStages(workerData.transformations);
+
+parentPort.on('message', ({ id, stage, batch }) => {
+    try {
+        parentPort.postMessage({ id, result: runFused(stages[stage].ops, batch) });
+    } catch (err) {
+        parentPort.postMessage({ id, error: err.message });
+    }
+});
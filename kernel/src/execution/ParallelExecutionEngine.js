@@ -1,25 +1,42 @@
 const logger = require("../logger");
+const config = require("../config/config");
 
 class ParallelExecutionEngine {
-    constructor(router) {
+    /**
+     * @param {Object} router - Reference to SmartRoutingEngine
+     * @param {Object} [options] - { concurrency } max tasks routed at once
+     */
+    constructor(router, options = {}) {
         this.router = router; // Reference to SmartRoutingEngine
+        this.concurrency = options.concurrency || config.admission.parallelConcurrency;
     }
 
     /**
-     * Execute multiple tasks in parallel.
+     * Execute multiple tasks in parallel, at most `concurrency` at a time.
      * @param {Array} tasks - List of UDL messages
-     * @returns {Promise<Array>} - List of results
+     * @param {Object} [options] - { concurrency } overrides the engine default
+     * @returns {Promise<Array>} - List of results, in task order
      */
-    async execute(tasks) {
-        logger.info(`[Parallel] Executing ${tasks.length} tasks`);
+    async execute(tasks, options = {}) {
+        const concurrency = Math.max(1, Math.min(options.concurrency || this.concurrency, tasks.length));
+        logger.info(`[Parallel] Executing ${tasks.length} tasks (concurrency ${concurrency})`);
 
-        const promises = tasks.map(task => {
-            return this.router.route(task)
-                .then(result => ({ status: 'fulfilled', value: result, task_id: task.meta?.id }))
-                .catch(err => ({ status: 'rejected', reason: err, task_id: task.meta?.id }));
-        });
+        const results = new Array(tasks.length);
+        let next = 0;
+        const worker = async () => {
+            while (next < tasks.length) {
+                const index = next++;
+                const task = tasks[index];
+                try {
+                    const result = await this.router.route(task);
+                    results[index] = { status: 'fulfilled', value: result, task_id: task.meta?.id };
+                } catch (err) {
+                    results[index] = { status: 'rejected', reason: err, task_id: task.meta?.id };
+                }
+            }
+        };
 
-        const results = await Promise.all(promises);
+        await Promise.all(Array.from({ length: concurrency }, worker));
         return results;
     }
 }
@@ -1,16 +1,45 @@
 const logger = require('../logger');
 const WebSocket = require('ws');
+const config = require('../config/config');
+const LatencyHistogram = require('../LatencyHistogram');
+
+// Geo-aware preference for clusters that have no measurements yet
+const REGION_MAP = {
+    'US': ['NA', 'US'],
+    'EU': ['EU', 'Europe'],
+    'Asia': ['Asia', 'APAC']
+};
 
 /**
  * Multi-Cluster Federation Manager
  * Enables global routing and failover across geographic clusters
+ *
+ * Each cluster connection has one message listener; responses to
+ * REMOTE_ROUTE requests are matched to callers through the cluster's pending
+ * map by requestId. Request latency and errors are tracked per cluster (EWMA
+ * plus a histogram for p95) and drive selectCluster. route() can hedge: if
+ * the best cluster has not answered within its p95, the request also goes to
+ * the next best one and the first answer wins.
  */
 class FederationManager {
-    constructor(myClusterId, myUrl) {
+    /**
+     * @param {string} myClusterId
+     * @param {string} myUrl
+     * @param {Object} [options] - { requestTimeoutMs, hedge, hedgeMinDelayMs, ewmaAlpha,
+     *                               handler: async (message) => result, serves REMOTE_ROUTE }
+     */
+    constructor(myClusterId, myUrl, options = {}) {
         this.myClusterId = myClusterId;
         this.myUrl = myUrl;
-        this.clusters = new Map(); // clusterId -> { url, ws, routes, region, lastSeen }
+        this.clusters = new Map(); // clusterId -> { url, ws, routes, region, lastSeen, pending, stats }
+        this.clusterStats = new Map(); // clusterId -> stats, kept across reconnects
         this.globalRoutes = new Map(); // target -> [clusterIds]
+        this.requestTimeoutMs = options.requestTimeoutMs || config.federation.requestTimeoutMs;
+        this.hedge = options.hedge !== undefined ? options.hedge : config.federation.hedge;
+        this.hedgeMinDelayMs = options.hedgeMinDelayMs !== undefined ? options.hedgeMinDelayMs : config.federation.hedgeMinDelayMs;
+        this.ewmaAlpha = options.ewmaAlpha || config.federation.ewmaAlpha;
+        this.handler = options.handler || null;
+        this.nextRequestId = 0;
     }
 
     /**
@@ -33,33 +62,86 @@ class FederationManager {
             }));
         });
 
-        ws.on('message', (data) => {
-            this.handleClusterMessage(clusterId, JSON.parse(data.toString()));
-        });
-
         ws.on('close', () => {
             logger.warn(`[Federation] Disconnected from ${clusterId}`);
-            this.clusters.delete(clusterId);
+            this.removeCluster(clusterId, ws);
             // Auto-reconnect after delay
             setTimeout(() => this.connectToCluster(clusterId, url, region), 5000);
         });
 
+        this.addCluster(clusterId, ws, region, url);
+    }
+
+    /**
+     * Track a connected cluster socket. Listens once for all its messages.
+     */
+    addCluster(clusterId, ws, region, url = null) {
         this.clusters.set(clusterId, {
             id: clusterId,
             url,
             region,
             ws,
             routes: new Set(),
-            lastSeen: Date.now()
+            lastSeen: Date.now(),
+            pending: new Map(), // requestId -> { resolve, reject, timer, startedAt }
+            stats: this.statsFor(clusterId)
+        });
+        ws.on('message', (data) => {
+            let message;
+            try {
+                message = JSON.parse(data.toString());
+            } catch (err) {
+                logger.error(`[Federation] Bad frame from ${clusterId}`, { error: err.message });
+                return;
+            }
+            this.handleClusterMessage(clusterId, message);
+        });
+        ws.on('close', () => {
+            if (this.clusters.get(clusterId)?.ws === ws) this.failPending(clusterId, `Cluster ${clusterId} disconnected`);
         });
     }
 
+    /**
+     * Forget a disconnected cluster socket, unless it has already been
+     * replaced. Its measurements stay for the next connection.
+     */
+    removeCluster(clusterId, ws) {
+        if (this.clusters.get(clusterId)?.ws !== ws) return;
+        this.failPending(clusterId, `Cluster ${clusterId} disconnected`);
+        this.clusters.delete(clusterId);
+    }
+
+    /**
+     * Measurements of a cluster, shared by all of its connections.
+     */
+    statsFor(clusterId) {
+        let stats = this.clusterStats.get(clusterId);
+        if (!stats) {
+            stats = {
+                ewmaMs: 0,
+                errorRate: 0,
+                requests: 0,
+                errors: 0,
+                timeouts: 0,
+                hedged: 0,
+                latency: new LatencyHistogram()
+            };
+            this.clusterStats.set(clusterId, stats);
+        }
+        return stats;
+    }
+
     handleClusterMessage(clusterId, message) {
         const cluster = this.clusters.get(clusterId);
         if (!cluster) return;
 
         cluster.lastSeen = Date.now();
 
+        if (message.requestId && cluster.pending.has(message.requestId)) {
+            this.settle(cluster, message.requestId, message.error ? new Error(message.error) : null, message.result);
+            return;
+        }
+
         switch (message.type) {
             case 'FEDERATION_HANDSHAKE':
                 logger.info(`[Federation] Handshake from ${message.clusterId}`);
@@ -70,12 +152,30 @@ class FederationManager {
                 this.receiveRouteUpdate(clusterId, message.routes);
                 break;
 
+            case 'REMOTE_ROUTE':
+                this.serveRemoteRoute(cluster, message);
+                break;
+
             case 'HEARTBEAT':
                 // Update last seen
                 break;
         }
     }
 
+    async serveRemoteRoute(cluster, message) {
+        const reply = { type: 'REMOTE_ROUTE_RESPONSE', requestId: message.requestId };
+        if (!this.handler) {
+            reply.error = `Cluster ${this.myClusterId} does not serve remote routes`;
+        } else {
+            try {
+                reply.result = await this.handler(message.message);
+            } catch (err) {
+                reply.error = err.message;
+            }
+        }
+        if (cluster.ws.readyState === WebSocket.OPEN) cluster.ws.send(JSON.stringify(reply));
+    }
+
     /**
      * Synchronize routes across clusters
      */
@@ -105,34 +205,94 @@ class FederationManager {
     }
 
     /**
-     * Select best cluster for target based on geo-location
+     * Expected latency of a request to a cluster: EWMA latency inflated by its
+     * error rate (a failed request costs a retry elsewhere). Unmeasured
+     * clusters score 0 in the preferred region, so they get probed, and the
+     * unmeasured default otherwise.
      */
-    selectCluster(target, clientRegion = 'US') {
-        const availableClusters = this.globalRoutes.get(target) || [];
+    expectedLatency(cluster, preferredRegions) {
+        const stats = cluster.stats;
+        if (stats.requests === 0) {
+            return preferredRegions.includes(cluster.region) ? 0 : config.federation.unmeasuredLatencyMs;
+        }
+        return stats.ewmaMs / Math.max(0.05, 1 - stats.errorRate);
+    }
 
-        if (availableClusters.length === 0) {
-            return null; // No cluster has this target
+    /**
+     * Connected clusters serving a target, lowest expected latency first.
+     */
+    rankClusters(target, clientRegion = 'US') {
+        const preferredRegions = REGION_MAP[clientRegion] || ['US'];
+        const ranked = [];
+        for (const clusterId of this.globalRoutes.get(target) || []) {
+            const cluster = this.clusters.get(clusterId);
+            if (!cluster || cluster.ws.readyState !== WebSocket.OPEN) continue;
+            ranked.push({ clusterId, score: this.expectedLatency(cluster, preferredRegions) });
         }
+        return ranked.sort((a, b) => a.score - b.score).map(c => c.clusterId);
+    }
 
-        // Geo-aware selection
-        const regionMap = {
-            'US': ['NA', 'US'],
-            'EU': ['EU', 'Europe'],
-            'Asia': ['Asia', 'APAC']
-        };
+    /**
+     * Select best cluster for target by measured latency (geo-location
+     * until measured)
+     */
+    selectCluster(target, clientRegion = 'US') {
+        const ranked = this.rankClusters(target, clientRegion);
+        if (ranked.length > 0) return ranked[0];
 
-        const preferredRegions = regionMap[clientRegion] || ['US'];
+        // Nothing connected: first cluster that has this target, if any
+        const availableClusters = this.globalRoutes.get(target) || [];
+        return availableClusters.length > 0 ? availableClusters[0] : null;
+    }
 
-        // Find cluster in preferred region
-        for (const clusterId of availableClusters) {
-            const cluster = this.clusters.get(clusterId);
-            if (cluster && preferredRegions.includes(cluster.region)) {
-                return clusterId;
-            }
-        }
+    /**
+     * Route a message for a target to the best cluster, hedging to the
+     * second best after the first one's p95 when enabled.
+     * @param {string} target
+     * @param {Object} message
+     * @param {Object} [options] - { clientRegion, hedge }
+     */
+    async route(target, message, options = {}) {
+        const ranked = this.rankClusters(target, options.clientRegion);
+        if (ranked.length === 0) throw new Error(`No connected cluster serves ${target}`);
+        const hedge = options.hedge !== undefined ? options.hedge : this.hedge;
+        if (!hedge || ranked.length < 2) return this.routeToCluster(ranked[0], message);
 
-        // Fallback to first available
-        return availableClusters[0];
+        const primary = this.clusters.get(ranked[0]);
+        const delay = Math.max(this.hedgeMinDelayMs, primary.stats.requests ? primary.stats.latency.quantile(0.95) : 0);
+
+        return new Promise((resolve, reject) => {
+            let failures = 0;
+            let launched = 1;
+            let settled = false;
+            let hedgeTimer = null;
+            const launchHedge = () => {
+                if (settled || launched > 1) return;
+                clearTimeout(hedgeTimer);
+                launched++;
+                primary.stats.hedged++;
+                attempt(ranked[1]);
+            };
+            const attempt = (clusterId) => {
+                this.routeToCluster(clusterId, message).then((result) => {
+                    if (settled) return;
+                    settled = true;
+                    clearTimeout(hedgeTimer);
+                    resolve(result);
+                }, (err) => {
+                    if (settled) return;
+                    failures++;
+                    if (failures === launched && launched > 1) {
+                        settled = true;
+                        reject(err);
+                    } else {
+                        launchHedge(); // the primary failed: don't wait for the delay
+                    }
+                });
+            };
+            attempt(ranked[0]);
+            hedgeTimer = setTimeout(launchHedge, delay);
+        });
     }
 
     /**
@@ -150,26 +310,52 @@ class FederationManager {
         }
 
         return new Promise((resolve, reject) => {
-            const requestId = `req-${Date.now()}`;
-
-            // Send request
+            const requestId = `${this.myClusterId}-${++this.nextRequestId}`;
+            const timer = setTimeout(() => {
+                cluster.stats.timeouts++;
+                this.settle(cluster, requestId, new Error(`Cluster ${clusterId} timed out after ${this.requestTimeoutMs}ms`));
+            }, this.requestTimeoutMs);
+            cluster.pending.set(requestId, { resolve, reject, timer, startedAt: process.hrtime.bigint() });
+
+            // Send request; the response is matched in handleClusterMessage
             cluster.ws.send(JSON.stringify({
                 type: 'REMOTE_ROUTE',
                 requestId,
                 message
             }));
+        });
+    }
 
-            // Wait for response (simplified - real implementation needs timeout)
-            const handler = (data) => {
-                const response = JSON.parse(data.toString());
-                if (response.requestId === requestId) {
-                    cluster.ws.off('message', handler);
-                    resolve(response.result);
-                }
-            };
+    /**
+     * Complete a pending request and fold its outcome into the cluster stats.
+     */
+    settle(cluster, requestId, err, result) {
+        const entry = cluster.pending.get(requestId);
+        if (!entry) return;
+        cluster.pending.delete(requestId);
+        clearTimeout(entry.timer);
+
+        const stats = cluster.stats;
+        const latencyMs = Number(process.hrtime.bigint() - entry.startedAt) / 1e6;
+        const alpha = this.ewmaAlpha;
+        stats.requests++;
+        stats.latency.record(latencyMs);
+        stats.ewmaMs = stats.requests === 1 ? latencyMs : stats.ewmaMs * (1 - alpha) + latencyMs * alpha;
+        stats.errorRate = stats.errorRate * (1 - alpha) + (err ? alpha : 0);
+        if (err) {
+            stats.errors++;
+            entry.reject(err);
+        } else {
+            entry.resolve(result);
+        }
+    }
 
-            cluster.ws.on('message', handler);
-        });
+    failPending(clusterId, reason) {
+        const cluster = this.clusters.get(clusterId);
+        if (!cluster) return;
+        for (const requestId of [...cluster.pending.keys()]) {
+            this.settle(cluster, requestId, new Error(reason));
+        }
     }
 
     /**
@@ -201,7 +387,17 @@ class FederationManager {
                 region: c.region,
                 connected: c.ws.readyState === WebSocket.OPEN,
                 routes: c.routes.size,
-                lastSeen: c.lastSeen
+                lastSeen: c.lastSeen,
+                pending: c.pending.size,
+                latency: {
+                    ewma_ms: Math.round(c.stats.ewmaMs * 1000) / 1000,
+                    p95_ms: c.stats.latency.quantile(0.95),
+                    error_rate: Math.round(c.stats.errorRate * 1000) / 1000
+                },
+                requests: c.stats.requests,
+                errors: c.stats.errors,
+                timeouts: c.stats.timeouts,
+                hedged: c.stats.hedged
             }))
         };
     }
@@ -0,0 +1,391 @@
+// kernel/src/kernelCluster.js
+// Clustered kernel: `node kernel/src/kernelCluster.js` (npm run start:cluster)
+// forks KERNEL_WORKERS processes running server.js on the shared port. The
+// primary keeps the cluster-wide service registry and relays messages
+// between workers; server.js attaches each worker with attachWorker().
+const cluster = require("cluster");
+const os = require("os");
+const path = require("path");
+const logger = require("./logger");
+const config = require("./config/config");
+const { decodeFrame, encodeFor } = require("./codec/envelopeCodec");
+
+const STATS_TIMEOUT_MS = 1000;
+const RESPAWN_DELAY_MS = 1000;
+
+/**
+ * Stands in the SmartRouter for a service whose adapter is connected to
+ * another worker. Whatever routeUDL sends to it goes to that worker over IPC.
+ */
+class WorkerLink {
+    constructor(clusterWorker, workerId, serviceId) {
+        this.clusterWorker = clusterWorker;
+        this.workerId = workerId;
+        this.serviceId = serviceId;
+        this.OPEN = 1;
+        this.readyState = 1;
+        this.bufferedAmount = 0;
+    }
+
+    send(data) {
+        this.clusterWorker.send({ cmd: "forward", to: this.workerId, target: this.serviceId, data: data.toString() });
+    }
+}
+
+/**
+ * Worker side: announces local adapters to the primary, mirrors the adapters
+ * of other workers into the SmartRouter as WorkerLinks and delivers calls
+ * forwarded to its own adapters.
+ */
+class ClusterWorker {
+    /**
+     * @param {SmartRouter} smartRouter
+     * @param {Object} [options] - { proc: IPC channel (process), workerId, stats: () => Object,
+     *                               statsTimeoutMs: how long to wait for the primary's report }
+     */
+    constructor(smartRouter, options = {}) {
+        this.smartRouter = smartRouter;
+        this.proc = options.proc || process;
+        this.workerId = options.workerId || cluster.worker.id;
+        this.statsProvider = options.stats || (() => ({}));
+        // Longer than the primary's own deadline, so its partial reports arrive first
+        this.statsTimeoutMs = options.statsTimeoutMs || 2 * STATS_TIMEOUT_MS;
+        this.links = new Map();       // serviceId -> WorkerLink
+        this.owners = new Map();      // serviceId -> worker id, as announced by the primary
+        this.pendingStats = new Map(); // requestId -> { resolve, timer }
+        this.nextRequestId = 0;
+        this.leaderCallbacks = [];
+        this.isLeader = false;
+        this.forwarded = 0;
+
+        this.proc.on("message", msg => this.handleMessage(msg));
+        this.send({ cmd: "ready" }); // the primary only talks to workers that listen
+    }
+
+    send(msg) {
+        if (this.proc.connected !== false) this.proc.send(msg);
+    }
+
+    announce(serviceId) {
+        this.links.delete(serviceId);
+        this.send({ cmd: "route:add", serviceId });
+    }
+
+    withdraw(serviceId) {
+        this.send({ cmd: "route:remove", serviceId });
+        // Fall back to another worker's adapter for the same service
+        if (this.owners.has(serviceId)) this.install(serviceId, this.owners.get(serviceId));
+    }
+
+    /**
+     * Run `fn` in exactly one worker (e.g. starting adapter processes).
+     */
+    onLeader(fn) {
+        if (this.isLeader) fn();
+        else this.leaderCallbacks.push(fn);
+    }
+
+    handleMessage(msg) {
+        if (!msg || typeof msg.cmd !== "string") return;
+        switch (msg.cmd) {
+            case "route:add":
+                this.install(msg.serviceId, msg.worker);
+                break;
+            case "route:remove":
+                this.uninstall(msg.serviceId, msg.worker);
+                break;
+            case "route:snapshot":
+                for (const [serviceId, workerId] of msg.routes) this.install(serviceId, workerId);
+                break;
+            case "forward":
+                this.deliver(msg);
+                break;
+            case "stats:request":
+                this.send({ cmd: "stats:reply", requestId: msg.requestId, stats: this.localStats() });
+                break;
+            case "stats:result": {
+                const pending = this.pendingStats.get(msg.requestId);
+                if (pending) {
+                    this.pendingStats.delete(msg.requestId);
+                    clearTimeout(pending.timer);
+                    pending.resolve(msg.result);
+                }
+                break;
+            }
+            case "leader":
+                this.isLeader = true;
+                this.leaderCallbacks.splice(0).forEach(fn => fn());
+                break;
+            default:
+                break;
+        }
+    }
+
+    install(serviceId, workerId) {
+        if (workerId === this.workerId) return;
+        this.owners.set(serviceId, workerId);
+        const current = this.smartRouter.get(serviceId);
+        if (current && !(current instanceof WorkerLink)) return; // a local adapter wins
+        const link = new WorkerLink(this, workerId, serviceId);
+        this.links.set(serviceId, link);
+        this.smartRouter.register(serviceId, link);
+    }
+
+    uninstall(serviceId, workerId) {
+        if (this.owners.get(serviceId) === workerId) this.owners.delete(serviceId);
+        const link = this.links.get(serviceId);
+        if (!link || link.workerId !== workerId) return;
+        this.links.delete(serviceId);
+        if (this.smartRouter.get(serviceId) === link) this.smartRouter.unregister(serviceId);
+    }
+
+    deliver({ target, data }) {
+        const ws = this.smartRouter.get(target);
+        if (!ws || ws instanceof WorkerLink || ws.readyState !== 1) {
+            logger.warn(`[Cluster] Worker ${this.workerId}: no local adapter for forwarded ${target}`);
+            return;
+        }
+        this.forwarded++;
+        ws.send(ws.encoding ? encodeFor(ws, decodeFrame(data, false)) : data);
+    }
+
+    localStats() {
+        const memory = process.memoryUsage();
+        const adapters = Object.values(this.smartRouter.routes).filter(ws => !(ws instanceof WorkerLink)).length;
+        return {
+            worker: this.workerId,
+            pid: process.pid,
+            uptime_seconds: process.uptime(),
+            rss: memory.rss,
+            heap_used: memory.heapUsed,
+            adapters,
+            in_flight: this.smartRouter.inFlight,
+            forwarded: this.forwarded,
+            ...this.statsProvider(),
+        };
+    }
+
+    /**
+     * Stats of every worker, gathered by the primary. If the primary does not
+     * answer within statsTimeoutMs, resolves with this worker's stats only
+     * (totals.workers is null: the cluster size is unknown).
+     * @returns {Promise<{workers: Object[], totals: Object}>}
+     */
+    collectStats() {
+        const requestId = ++this.nextRequestId;
+        return new Promise((resolve) => {
+            const timer = setTimeout(() => {
+                this.pendingStats.delete(requestId);
+                logger.warn(`[Cluster] Worker ${this.workerId}: no stats from the primary, reporting local stats only`);
+                const local = this.localStats();
+                resolve({ workers: [local], totals: aggregate([local], null) });
+            }, this.statsTimeoutMs);
+            this.pendingStats.set(requestId, { resolve, timer });
+            this.send({ cmd: "stats:collect", requestId });
+        });
+    }
+}
+
+/**
+ * Primary side: service registry, IPC relay between workers and stats
+ * aggregation. A service announced by several workers is routed to the one
+ * that announced it last; the others take over when it goes away. Workers
+ * are anything with `id` and `send()`.
+ */
+class ClusterPrimary {
+    constructor(options = {}) {
+        this.statsTimeoutMs = options.statsTimeoutMs || STATS_TIMEOUT_MS;
+        this.workers = new Map();  // id -> worker
+        this.services = new Map(); // serviceId -> worker ids, current owner last
+        this.leader = null;
+        this.collections = new Map(); // requestId -> { replies, check }
+        this.nextCollection = 0;
+    }
+
+    addWorker(worker) {
+        this.workers.set(worker.id, worker);
+        const routes = [...this.services].map(([serviceId, ids]) => [serviceId, ids[ids.length - 1]]);
+        worker.send({ cmd: "route:snapshot", routes });
+        if (this.leader === null) this.electLeader();
+    }
+
+    removeWorker(worker) {
+        this.workers.delete(worker.id);
+        for (const serviceId of [...this.services.keys()]) this.removeService(serviceId, worker.id);
+        for (const collection of this.collections.values()) collection.check();
+        if (this.leader === worker.id) {
+            this.leader = null;
+            this.electLeader();
+        }
+    }
+
+    electLeader() {
+        const next = this.workers.values().next().value;
+        if (!next) return;
+        this.leader = next.id;
+        next.send({ cmd: "leader" });
+    }
+
+    broadcast(msg, exceptId) {
+        for (const [id, worker] of this.workers) {
+            if (id !== exceptId) worker.send(msg);
+        }
+    }
+
+    addService(serviceId, workerId) {
+        const ids = (this.services.get(serviceId) || []).filter(id => id !== workerId);
+        ids.push(workerId);
+        this.services.set(serviceId, ids);
+        this.broadcast({ cmd: "route:add", serviceId, worker: workerId }, workerId);
+    }
+
+    removeService(serviceId, workerId) {
+        const ids = this.services.get(serviceId);
+        if (!ids || !ids.includes(workerId)) return;
+        const wasOwner = ids[ids.length - 1] === workerId;
+        const rest = ids.filter(id => id !== workerId);
+        if (rest.length === 0) {
+            this.services.delete(serviceId);
+            this.broadcast({ cmd: "route:remove", serviceId, worker: workerId }, workerId);
+            return;
+        }
+        this.services.set(serviceId, rest);
+        if (wasOwner) {
+            const owner = rest[rest.length - 1];
+            this.broadcast({ cmd: "route:add", serviceId, worker: owner }, owner);
+        }
+    }
+
+    handleMessage(worker, msg) {
+        if (!msg || typeof msg.cmd !== "string") return;
+        switch (msg.cmd) {
+            case "ready":
+                this.addWorker(worker);
+                break;
+            case "route:add":
+                this.addService(msg.serviceId, worker.id);
+                break;
+            case "route:remove":
+                this.removeService(msg.serviceId, worker.id);
+                break;
+            case "forward": {
+                const target = this.workers.get(msg.to);
+                if (target) target.send(msg);
+                break;
+            }
+            case "stats:collect":
+                this.collectStats(worker, msg.requestId);
+                break;
+            case "stats:reply": {
+                const collection = this.collections.get(msg.requestId);
+                if (collection) {
+                    collection.replies.set(worker.id, msg.stats);
+                    collection.check();
+                }
+                break;
+            }
+            default:
+                break;
+        }
+    }
+
+    collectStats(requester, replyTo) {
+        const requestId = ++this.nextCollection;
+        const replies = new Map();
+        let timer = null;
+        const finish = () => {
+            if (!this.collections.has(requestId)) return;
+            this.collections.delete(requestId);
+            clearTimeout(timer);
+            const workers = [...replies.values()].sort((a, b) => a.worker - b.worker);
+            requester.send({ cmd: "stats:result", requestId: replyTo, result: { workers, totals: aggregate(workers, this.workers.size) } });
+        };
+        const collection = {
+            replies,
+            check: () => {
+                if ([...this.workers.keys()].every(id => replies.has(id))) finish();
+            },
+        };
+        this.collections.set(requestId, collection);
+        timer = setTimeout(finish, this.statsTimeoutMs); // report whoever answered
+        this.broadcast({ cmd: "stats:request", requestId });
+    }
+}
+
+function aggregate(workers, expected) {
+    const totals = { workers: expected, reporting: workers.length, adapters: 0, in_flight: 0, forwarded: 0, rss: 0 };
+    for (const w of workers) {
+        totals.adapters += w.adapters;
+        totals.in_flight += w.in_flight;
+        totals.forwarded += w.forwarded;
+        totals.rss += w.rss;
+    }
+    return totals;
+}
+
+/**
+ * CPU cores this process should plan for: all of them when running alone,
+ * its share when it is one of the cluster's kernel workers (which run their
+ * own adapter pools side by side).
+ */
+function coresPerProcess() {
+    const cores = os.availableParallelism ? os.availableParallelism() : os.cpus().length;
+    if (!cluster.isWorker) return cores;
+    const workers = config.kernel.workers > 0 ? config.kernel.workers : cores;
+    return Math.max(1, Math.floor(cores / workers));
+}
+
+/**
+ * Attach the current process to the kernel cluster.
+ * @returns {ClusterWorker|null} null when not running as a cluster worker
+ */
+function attachWorker(smartRouter, options = {}) {
+    if (!cluster.isWorker || !process.send) return null;
+    return new ClusterWorker(smartRouter, options);
+}
+
+/**
+ * Fork the workers and run the primary. Workers that exit are replaced.
+ * @param {number} [count] - Defaults to config.kernel.workers, 0 = one per core
+ */
+function startPrimary(count = config.kernel.workers) {
+    const workers = count > 0 ? count : (os.availableParallelism ? os.availableParallelism() : os.cpus().length);
+    const primary = new ClusterPrimary();
+    cluster.setupPrimary({ exec: path.join(__dirname, "server.js") });
+    // Workers size their own pools from the actual worker count (coresPerProcess).
+    // A respawned worker keeps its slot, and with it its durable queue directory.
+    const slots = new Map(); // worker id -> slot
+    const fork = (slot) => {
+        const worker = cluster.fork({ KERNEL_WORKERS: String(workers), KERNEL_WORKER_SLOT: String(slot) });
+        slots.set(worker.id, slot);
+    };
+
+    cluster.on("online", (worker) => {
+        logger.info(`[Cluster] Worker ${worker.id} online (pid ${worker.process.pid})`);
+    });
+    cluster.on("message", (worker, msg) => primary.handleMessage(worker, msg));
+    cluster.on("exit", (worker, code, signal) => {
+        primary.removeWorker(worker);
+        const slot = slots.get(worker.id);
+        slots.delete(worker.id);
+        logger.warn(`[Cluster] Worker ${worker.id} exited (${signal || code}), restarting`);
+        setTimeout(() => fork(slot), RESPAWN_DELAY_MS);
+    });
+
+    logger.info(`[Cluster] Starting ${workers} kernel workers`);
+    for (let slot = 0; slot < workers; slot++) fork(slot);
+    return primary;
+}
+
+if (require.main === module) {
+    startPrimary();
+}
+
+module.exports = {
+    ClusterWorker,
+    ClusterPrimary,
+    WorkerLink,
+    attachWorker,
+    coresPerProcess,
+    startPrimary
+};
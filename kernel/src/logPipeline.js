@@ -0,0 +1,275 @@
+// kernel/src/logPipeline.js
+const cluster = require('cluster');
+const fs = require('fs');
+const path = require('path');
+
+const LOG_DIR = path.join(__dirname, '..', '..', 'logs');
+
+// "info=0.1,warn=1" -> { info: 0.1, warn: 1 }
+function parseRates(text) {
+    const rates = {};
+    for (const part of (text || '').split(',')) {
+        const [key, value] = part.split('=').map(s => s && s.trim());
+        if (key && value !== undefined && !Number.isNaN(Number(value))) {
+            rates[key] = Math.min(1, Math.max(0, Number(value)));
+        }
+    }
+    return rates;
+}
+
+// Cluster workers each write (and rotate) their own file: umb.log -> umb.w3.log
+function processLogFile(file, workerId = cluster.isWorker ? cluster.worker.id : null) {
+    if (workerId === null) return file;
+    const ext = path.extname(file);
+    return `${file.slice(0, file.length - ext.length)}.w${workerId}${ext}`;
+}
+
+function formatRecord(record) {
+    const metaStr = record.meta && Object.keys(record.meta).length ? JSON.stringify(record.meta) : '';
+    return `[${new Date(record.time).toISOString()}] [${record.level.toUpperCase()}] ${record.message} ${metaStr}`;
+}
+
+/**
+ * Non-blocking log sink for the routing hot path.
+ *
+ * record() only samples and pushes the raw record into a bounded ring; the
+ * message and metadata are formatted later by a background flusher that
+ * writes whole batches to a size-rotated file or to stdout. When the ring is
+ * full, or the output is not keeping up, new records are dropped and counted
+ * instead of blocking the caller.
+ */
+class LogPipeline {
+    /**
+     * @param {Object} [options]
+     * @param {string} [options.output] - "file" | "stdout" | "off"
+     * @param {string} [options.file] - Log file path for the "file" output
+     * @param {number} [options.maxBytes] - Rotate the file after this many bytes
+     * @param {number} [options.maxFiles] - Rotated files kept (file.1 ... file.N)
+     * @param {number} [options.capacity] - Ring buffer size in records
+     * @param {number} [options.flushIntervalMs] - Background flush period
+     * @param {number} [options.batchSize] - Max records formatted per write
+     * @param {number} [options.maxPendingBytes] - Stop flushing while this much output is unwritten
+     * @param {Object} [options.levelRates] - Sampling rate per level, 0..1
+     * @param {Object} [options.targetRates] - Sampling rate per target, overrides the level rate
+     */
+    constructor(options = {}) {
+        this.output = options.output || 'file';
+        this.file = options.file || path.join(LOG_DIR, 'umb.log');
+        this.maxBytes = options.maxBytes || 10 * 1024 * 1024;
+        this.maxFiles = options.maxFiles !== undefined ? options.maxFiles : 5;
+        this.capacity = Math.max(1, options.capacity || 10000);
+        this.flushIntervalMs = options.flushIntervalMs || 250;
+        this.batchSize = Math.max(1, options.batchSize || 1000);
+        this.maxPendingBytes = options.maxPendingBytes || 4 * 1024 * 1024;
+        this.levelRates = { debug: 0, info: 1, warn: 1, error: 1, ...(options.levelRates || {}) };
+        this.targetRates = { ...(options.targetRates || {}) };
+
+        this.ring = new Array(this.capacity);
+        this.head = 0;   // next record to flush
+        this.count = 0;  // records waiting in the ring
+
+        this.stream = null;
+        this.bytesWritten = 0;
+        this.blocked = false;   // waiting for 'drain' on the output
+        this.timer = null;
+        this.flushScheduled = false;
+
+        this.stats = { recorded: 0, sampledOut: 0, dropped: 0, written: 0, batches: 0, rotations: 0 };
+        this.droppedReported = 0;
+    }
+
+    start() {
+        if (this.timer || this.output === 'off') return;
+        this.timer = setInterval(() => this.flush(), this.flushIntervalMs);
+        this.timer.unref();
+    }
+
+    sampleRate(level, target) {
+        if (target !== undefined && this.targetRates[target] !== undefined) {
+            return this.targetRates[target];
+        }
+        const rate = this.levelRates[level];
+        return rate === undefined ? 1 : rate;
+    }
+
+    /**
+     * Queue a record. Cheap: no formatting or I/O happens here.
+     * @param {string} level - "debug" | "info" | "warn" | "error"
+     * @param {string} message
+     * @param {Object} [meta]
+     * @param {string} [target] - Used for per-target sampling
+     * @returns {boolean} Whether the record was queued
+     */
+    record(level, message, meta, target) {
+        if (this.output === 'off') return false;
+
+        const rate = this.sampleRate(level, target);
+        if (rate <= 0 || (rate < 1 && Math.random() >= rate)) {
+            this.stats.sampledOut++;
+            return false;
+        }
+
+        if (this.count >= this.capacity) {
+            this.stats.dropped++;
+            return false;
+        }
+
+        this.ring[(this.head + this.count) % this.capacity] = { time: Date.now(), level, message, meta };
+        this.count++;
+        this.stats.recorded++;
+        this.start();
+
+        // Don't wait for the timer once half the ring is used
+        if (this.count >= this.capacity / 2 && !this.flushScheduled) {
+            this.flushScheduled = true;
+            setImmediate(() => {
+                this.flushScheduled = false;
+                this.flush();
+            });
+        }
+        return true;
+    }
+
+    takeBatch(limit) {
+        const lines = [];
+        const n = Math.min(limit, this.count);
+        for (let i = 0; i < n; i++) {
+            lines.push(formatRecord(this.ring[this.head]));
+            this.ring[this.head] = undefined;
+            this.head = (this.head + 1) % this.capacity;
+        }
+        this.count -= n;
+
+        const dropped = this.stats.dropped - this.droppedReported;
+        if (dropped > 0) {
+            this.droppedReported = this.stats.dropped;
+            lines.push(formatRecord({
+                time: Date.now(),
+                level: 'warn',
+                message: `[LogPipeline] Dropped ${dropped} log records under pressure`,
+                meta: { dropped_total: this.stats.dropped },
+            }));
+        }
+        return lines;
+    }
+
+    openStream() {
+        if (this.output === 'stdout') {
+            this.stream = process.stdout;
+            return;
+        }
+        fs.mkdirSync(path.dirname(this.file), { recursive: true });
+        try {
+            this.bytesWritten = fs.statSync(this.file).size;
+        } catch (err) {
+            this.bytesWritten = 0;
+        }
+        // Open synchronously so the file exists before the first rotation check
+        const fd = fs.openSync(this.file, 'a');
+        this.stream = fs.createWriteStream(this.file, { fd });
+        this.stream.on('error', (err) => {
+            console.error(`[LogPipeline] Failed to write ${this.file}:`, err.message);
+        });
+    }
+
+    rotate() {
+        this.stream.end();
+        this.stream = null;
+        try {
+            for (let i = this.maxFiles - 1; i >= 1; i--) {
+                const from = `${this.file}.${i}`;
+                if (fs.existsSync(from)) fs.renameSync(from, `${this.file}.${i + 1}`);
+            }
+            if (this.maxFiles > 0) fs.renameSync(this.file, `${this.file}.1`);
+            else fs.unlinkSync(this.file);
+        } catch (err) {
+            console.error(`[LogPipeline] Failed to rotate ${this.file}:`, err.message);
+        }
+        this.stats.rotations++;
+        this.openStream();
+    }
+
+    /**
+     * Write everything currently queued, one batch per write() call. Stops
+     * early (and leaves the rest queued) while the output is backed up.
+     */
+    flush() {
+        if (this.output === 'off') return;
+        while ((this.count > 0 || this.stats.dropped > this.droppedReported) && !this.blocked) {
+            if (!this.stream) this.openStream();
+
+            const lines = this.takeBatch(this.batchSize);
+            const chunk = lines.join('\n') + '\n';
+            this.stats.written += lines.length;
+            this.stats.batches++;
+
+            this.stream.write(chunk);
+            if (this.stream.writableLength >= this.maxPendingBytes) {
+                this.blocked = true;
+                this.stream.once('drain', () => {
+                    this.blocked = false;
+                });
+            }
+
+            if (this.output === 'file') {
+                this.bytesWritten += Buffer.byteLength(chunk);
+                if (this.bytesWritten >= this.maxBytes) {
+                    this.blocked = false;
+                    this.rotate();
+                }
+            }
+        }
+    }
+
+    /**
+     * Synchronously write whatever is queued; used on process exit.
+     */
+    flushSync() {
+        if (this.output === 'off' || (this.count === 0 && this.stats.dropped === this.droppedReported)) return;
+        const chunk = this.takeBatch(this.count).join('\n') + '\n';
+        try {
+            if (this.output === 'stdout') fs.writeSync(1, chunk);
+            else fs.appendFileSync(this.file, chunk);
+        } catch (err) {
+            // Nothing left to report to at exit
+        }
+    }
+
+    getStats() {
+        return { ...this.stats, queued: this.count, capacity: this.capacity };
+    }
+
+    close() {
+        if (this.timer) clearInterval(this.timer);
+        this.timer = null;
+        if (this.stream && this.stream !== process.stdout) {
+            this.stream.end();
+        }
+        this.stream = null;
+        this.flushSync();
+    }
+}
+
+// Shared pipeline for envelope logging, configured from the environment
+const messageLog = new LogPipeline({
+    output: process.env.MESSAGE_LOG_OUTPUT,
+    file: processLogFile(process.env.MESSAGE_LOG_FILE || path.join(LOG_DIR, 'umb.log')),
+    maxBytes: parseInt(process.env.MESSAGE_LOG_MAX_BYTES || '0', 10) || undefined,
+    maxFiles: process.env.MESSAGE_LOG_MAX_FILES !== undefined ? parseInt(process.env.MESSAGE_LOG_MAX_FILES, 10) : undefined,
+    capacity: parseInt(process.env.MESSAGE_LOG_BUFFER || '0', 10) || undefined,
+    flushIntervalMs: parseInt(process.env.MESSAGE_LOG_FLUSH_MS || '0', 10) || undefined,
+    levelRates: {
+        ...(process.env.DEBUG === 'true' ? { debug: 1 } : {}),
+        ...parseRates(process.env.MESSAGE_LOG_SAMPLE),
+    },
+    targetRates: parseRates(process.env.MESSAGE_LOG_SAMPLE_TARGETS),
+});
+
+process.on('exit', () => messageLog.flushSync());
+
+module.exports = {
+    LogPipeline,
+    parseRates,
+    processLogFile,
+    messageLog
+};
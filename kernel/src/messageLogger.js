@@ -1,17 +1,28 @@
-const logger = require('./logger');
+const { messageLog } = require('./logPipeline');
 
+// Envelope logs go through the sampled, batched messageLog pipeline so the
+// routing path never formats or writes log lines itself.
 function logEnvelope(envelope) {
     if (!envelope) return;
 
     const { source, target, intent, meta } = envelope;
     const traceId = meta?.trace_id || 'no-trace';
 
-    logger.info(`[UMB] ${source} -> ${target} [${intent}]`, {
+    messageLog.record('info', `[UMB] ${source} -> ${target} [${intent}]`, {
         traceId,
         timestamp: meta?.timestamp
-    });
+    }, target);
+}
+
+function logRouted(envelope, target, traceId) {
+    messageLog.record('info', 'Message routed', {
+        source: envelope.source,
+        target,
+        trace_id: traceId
+    }, target);
 }
 
 module.exports = {
-    logEnvelope
+    logEnvelope,
+    logRouted
 };
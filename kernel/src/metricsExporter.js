@@ -0,0 +1,162 @@
+// kernel/src/metricsExporter.js
+// Prometheus text exposition (format 0.0.4) of the SmartRouter metrics.
+const LatencyHistogram = require("./LatencyHistogram");
+
+const QUANTILES = [0.5, 0.9, 0.99, 0.999];
+
+function escapeLabel(value) {
+    return String(value).replace(/\\/g, "\\\\").replace(/\n/g, "\\n").replace(/"/g, '\\"');
+}
+
+function labels(pairs) {
+    const parts = Object.keys(pairs).map(k => `${k}="${escapeLabel(pairs[k])}"`);
+    return parts.length ? `{${parts.join(",")}}` : "";
+}
+
+// queueDepth -> queue_depth
+function snakeCase(name) {
+    return name.replace(/([a-z0-9])([A-Z])/g, "$1_$2").replace(/[^a-zA-Z0-9_]/g, "_").toLowerCase();
+}
+
+function header(lines, name, type, help) {
+    lines.push(`# HELP ${name} ${help}`);
+    lines.push(`# TYPE ${name} ${type}`);
+}
+
+function histogramLines(lines, name, labelPairs, histogram) {
+    for (const [le, count] of histogram.cumulativeBuckets()) {
+        lines.push(`${name}_bucket${labels({ ...labelPairs, le })} ${count}`);
+    }
+    lines.push(`${name}_bucket${labels({ ...labelPairs, le: "+Inf" })} ${histogram.count}`);
+    lines.push(`${name}_sum${labels(labelPairs)} ${histogram.sum / 1000}`);
+    lines.push(`${name}_count${labels(labelPairs)} ${histogram.count}`);
+}
+
+function quantileLines(lines, name, labelPairs, histogram) {
+    if (histogram.count === 0) return;
+    for (const q of QUANTILES) {
+        lines.push(`${name}${labels({ ...labelPairs, quantile: q })} ${histogram.quantile(q) / 1000}`);
+    }
+}
+
+/**
+ * Render all router metrics as Prometheus text.
+ * @param {SmartRouter} router
+ * @param {Object} [extra] - { logStats } from the message log pipeline, { cacheStats } from the result
+ *   cache, { admissionStats } from admission control
+ * @returns {string}
+ */
+function renderMetrics(router, extra = {}) {
+    if (router.syncMetrics) router.syncMetrics();
+    const lines = [];
+    const services = Array.from(router.metrics.entries());
+    const routes = Array.from(router.routeMetrics.entries());
+
+    header(lines, "unikernal_messages_total", "counter", "Messages recorded per service.");
+    for (const [id, m] of services) lines.push(`unikernal_messages_total${labels({ service: id })} ${m.total}`);
+
+    header(lines, "unikernal_message_errors_total", "counter", "Failed messages per service.");
+    for (const [id, m] of services) lines.push(`unikernal_message_errors_total${labels({ service: id })} ${m.errors}`);
+
+    header(lines, "unikernal_service_last_active_seconds", "gauge", "Unix time of the last message per service.");
+    for (const [id, m] of services) {
+        if (m.lastActive) lines.push(`unikernal_service_last_active_seconds${labels({ service: id })} ${m.lastActive / 1000}`);
+    }
+
+    header(lines, "unikernal_service_latency_seconds", "histogram", "Latency reported by the service (adapter round trip).");
+    for (const [id, m] of services) {
+        if (m.latency.count) histogramLines(lines, "unikernal_service_latency_seconds", { service: id }, m.latency);
+    }
+
+    header(lines, "unikernal_service_latency_quantile_seconds", "gauge", "Service latency quantiles from the histogram buckets.");
+    for (const [id, m] of services) quantileLines(lines, "unikernal_service_latency_quantile_seconds", { service: id }, m.latency);
+
+    // Point-in-time values services attach via recordMessage(..., gauges)
+    const gaugeNames = new Set();
+    for (const [, m] of services) for (const key of Object.keys(m.gauges)) gaugeNames.add(key);
+    for (const key of gaugeNames) {
+        const name = `unikernal_service_${snakeCase(key)}`;
+        header(lines, name, "gauge", `Last reported ${key} per service.`);
+        for (const [id, m] of services) {
+            const value = m.gauges[key];
+            if (typeof value === "number") lines.push(`${name}${labels({ service: id })} ${value}`);
+        }
+    }
+
+    header(lines, "unikernal_route_latency_seconds", "histogram", "End-to-end routeUDL time per target.");
+    for (const [target, r] of routes) {
+        if (r.latency.count) histogramLines(lines, "unikernal_route_latency_seconds", { target }, r.latency);
+    }
+
+    header(lines, "unikernal_route_latency_quantile_seconds", "gauge", "Routing latency quantiles from the histogram buckets.");
+    for (const [target, r] of routes) quantileLines(lines, "unikernal_route_latency_quantile_seconds", { target }, r.latency);
+
+    header(lines, "unikernal_route_errors_total", "counter", "Routing errors per target and error code.");
+    for (const [target, r] of routes) {
+        for (const [code, count] of r.errorCodes) lines.push(`unikernal_route_errors_total${labels({ target, code })} ${count}`);
+    }
+
+    header(lines, "unikernal_routes_in_flight", "gauge", "Routing calls currently in progress per target.");
+    for (const [target, r] of routes) lines.push(`unikernal_routes_in_flight${labels({ target })} ${r.inFlight}`);
+
+    header(lines, "unikernal_routes_in_flight_total", "gauge", "Routing calls currently in progress.");
+    lines.push(`unikernal_routes_in_flight_total ${router.inFlight}`);
+
+    header(lines, "unikernal_connected_adapters", "gauge", "Registered WebSocket services.");
+    lines.push(`unikernal_connected_adapters ${Object.keys(router.routes).length}`);
+
+    if (extra.logStats) {
+        header(lines, "unikernal_message_log_dropped_total", "counter", "Envelope log records dropped under pressure.");
+        lines.push(`unikernal_message_log_dropped_total ${extra.logStats.dropped}`);
+        header(lines, "unikernal_message_log_queued", "gauge", "Envelope log records waiting to be flushed.");
+        lines.push(`unikernal_message_log_queued ${extra.logStats.queued}`);
+    }
+
+    if (extra.cacheStats) {
+        const cache = extra.cacheStats;
+        header(lines, "unikernal_result_cache_requests_total", "counter", "Result cache lookups per target and outcome.");
+        for (const [target, s] of Object.entries(cache.byTarget)) {
+            lines.push(`unikernal_result_cache_requests_total${labels({ target, outcome: "hit" })} ${s.hits}`);
+            lines.push(`unikernal_result_cache_requests_total${labels({ target, outcome: "miss" })} ${s.misses}`);
+            lines.push(`unikernal_result_cache_requests_total${labels({ target, outcome: "coalesced" })} ${s.coalesced}`);
+        }
+        header(lines, "unikernal_result_cache_evictions_total", "counter", "Result cache entries evicted, by reason.");
+        for (const [reason, count] of Object.entries(cache.evictions)) {
+            lines.push(`unikernal_result_cache_evictions_total${labels({ reason })} ${count}`);
+        }
+        header(lines, "unikernal_result_cache_entries", "gauge", "Entries in the result cache.");
+        lines.push(`unikernal_result_cache_entries ${cache.entries}`);
+        header(lines, "unikernal_result_cache_bytes", "gauge", "Estimated size of the result cache in bytes.");
+        lines.push(`unikernal_result_cache_bytes ${cache.bytes}`);
+    }
+
+    if (extra.admissionStats) {
+        const targets = Object.entries(extra.admissionStats.targets);
+        header(lines, "unikernal_admission_in_flight", "gauge", "Admitted routing calls in progress per target.");
+        for (const [target, a] of targets) lines.push(`unikernal_admission_in_flight${labels({ target })} ${a.inFlight}`);
+        header(lines, "unikernal_admission_queued", "gauge", "Routing calls waiting for admission per target.");
+        for (const [target, a] of targets) lines.push(`unikernal_admission_queued${labels({ target })} ${a.queued}`);
+        header(lines, "unikernal_admission_rejected_total", "counter", "Calls answered OVERLOADED, by target and reason.");
+        for (const [target, a] of targets) {
+            for (const [reason, count] of Object.entries(a.rejected)) {
+                lines.push(`unikernal_admission_rejected_total${labels({ target, reason })} ${count}`);
+            }
+        }
+    }
+
+    const memory = process.memoryUsage();
+    header(lines, "process_resident_memory_bytes", "gauge", "Resident memory size in bytes.");
+    lines.push(`process_resident_memory_bytes ${memory.rss}`);
+    header(lines, "nodejs_heap_used_bytes", "gauge", "V8 heap in use in bytes.");
+    lines.push(`nodejs_heap_used_bytes ${memory.heapUsed}`);
+    header(lines, "process_uptime_seconds", "gauge", "Kernel uptime in seconds.");
+    lines.push(`process_uptime_seconds ${process.uptime()}`);
+
+    return lines.join("\n") + "\n";
+}
+
+module.exports = {
+    renderMetrics,
+    CONTENT_TYPE: "text/plain; version=0.0.4; charset=utf-8",
+    EXPORT_BOUNDS_SECONDS: LatencyHistogram.EXPORT_BOUNDS_SECONDS,
+};
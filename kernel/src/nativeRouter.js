@@ -0,0 +1,50 @@
+// kernel/src/nativeRouter.js
+// Optional loader for the Rust RoutingEngine addon (kernel/rust). Build it with
+// `npm run build:native`; without it SmartRouter uses the JS RouteTable.
+const fs = require("fs");
+const path = require("path");
+const logger = require("./logger");
+
+const RUST_DIR = path.join(__dirname, "..", "rust");
+const RELEASE_DIR = path.join(RUST_DIR, "target", "release");
+
+const CANDIDATES = [
+    path.join(RUST_DIR, "unikernal_core.node"),
+    path.join(RELEASE_DIR, "libunikernal_core.so"),
+    path.join(RELEASE_DIR, "libunikernal_core.dylib"),
+    path.join(RELEASE_DIR, "unikernal_core.dll"),
+];
+
+let engine; // undefined until the first load attempt
+
+/**
+ * The native RoutingEngine class, or null when it is not built or disabled
+ * (UNIKERNAL_NATIVE=0). UNIKERNAL_NATIVE_PATH points at a specific build.
+ * @returns {Function|null}
+ */
+function loadNativeEngine() {
+    if (engine !== undefined) return engine;
+    engine = null;
+    if (process.env.UNIKERNAL_NATIVE === "0") return engine;
+
+    const candidates = process.env.UNIKERNAL_NATIVE_PATH ? [process.env.UNIKERNAL_NATIVE_PATH] : CANDIDATES;
+    for (const file of candidates) {
+        if (!fs.existsSync(file)) continue;
+        try {
+            const addon = { exports: {} };
+            process.dlopen(addon, file);
+            if (typeof addon.exports.RoutingEngine === "function") {
+                engine = addon.exports.RoutingEngine;
+                logger.info(`[SmartRouter] Native routing engine loaded from ${file}`);
+                break;
+            }
+        } catch (err) {
+            logger.warn(`[SmartRouter] Could not load native routing engine ${file}: ${err.message}`);
+        }
+    }
+    return engine;
+}
+
+module.exports = {
+    loadNativeEngine
+};
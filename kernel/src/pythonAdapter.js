@@ -1,78 +1,178 @@
 // kernel/src/pythonAdapter.js
-const { spawn } = require("child_process");
+const os = require("os");
 const path = require("path");
-
-const pythonCmd = "python"; // or "python.exe" if needed on Windows
+const logger = require("./logger");
+const config = require("./config/config");
+const { coresPerProcess } = require("./kernelCluster");
+const PythonWorkerPool = require("./PythonWorkerPool");
+const SharedPayloadRing = require("./SharedPayloadRing");
 
 // Path to C:\Users\iriss\Unikernal\adapters\python\python-adapter.py
 const adapterPath = path.join(__dirname, "..", "..", "adapters", "python", "python-adapter.py");
 
-let pythonProcess = null;
-let pendingPromise = null;
-
-function startPythonAdapter() {
-    if (pythonProcess) return;
-
-    pythonProcess = spawn(pythonCmd, [adapterPath], {
-        stdio: ["pipe", "pipe", "inherit"], // stdin, stdout, stderr
-    });
-
-    console.log("[NODE] Started python-adapter child process:", adapterPath);
-
-    pythonProcess.stdout.on("data", (data) => {
-        const text = data.toString().trim();
-        if (!text) return;
-
-        // We assume one JSON object per line
-        try {
-            const json = JSON.parse(text);
-            if (pendingPromise) {
-                pendingPromise.resolve(json);
-                pendingPromise = null;
-            } else {
-                console.log("[NODE] Python adapter sent message without pending promise:", json);
-            }
-        } catch (err) {
-            console.error("[NODE] Failed to parse JSON from python adapter:", text);
-            if (pendingPromise) {
-                pendingPromise.reject(err);
-                pendingPromise = null;
-            }
-        }
-    });
-
-    pythonProcess.on("exit", (code) => {
-        console.error(`[NODE] python-adapter exited with code ${code}`);
-        pythonProcess = null;
-        if (pendingPromise) {
-            pendingPromise.reject(new Error("Python adapter exited"));
-            pendingPromise = null;
-        }
-    });
+const DEFAULT_ADAPTER = "python-adapter";
+
+// Wire protocol (v2): newline-delimited JSON frames, one per line.
+//   request:  { "id": <int>, "udm": { ...task... } }
+//   reply:    { "id": <int>, "response": { ...result... } }
+// Replies may arrive in any order; they are matched to callers by id.
+// Sized from this process's share of the cores, so a clustered kernel does
+// not start cores x cores adapters (see config.python)
+const defaultPoolOptions = {
+    script: adapterPath,
+    size: config.python.poolSize || coresPerProcess(),
+    cores: coresPerProcess(),
+    policy: config.python.poolPolicy,
+    timeoutMs: config.python.timeoutMs,
+    // Shared-memory transport for large typed-array inputs (0 disables)
+    sharedMemoryBytes: config.python.sharedMemoryBytes,
+    sharedMemoryThreshold: config.python.sharedMemoryThreshold,
+};
+
+const poolOptions = new Map(); // adapter name -> pool options
+const pools = new Map();       // adapter name -> PythonWorkerPool
+const rings = new Map();       // adapter name -> SharedPayloadRing
+
+/**
+ * Tune the worker pool used for an adapter. Takes effect on the next call;
+ * an already running pool for that adapter is closed and rebuilt.
+ * @param {string} name - Adapter name (defaults to "python-adapter")
+ * @param {Object} options - { script, size, cores, policy, timeoutMs, maxAttempts, restartDelayMs,
+ *                             maxFailedStarts, sharedMemoryBytes, sharedMemoryThreshold }
+ */
+function configurePythonPool(name = DEFAULT_ADAPTER, options = {}) {
+    poolOptions.set(name, { ...defaultPoolOptions, ...options, name });
+    const existing = pools.get(name);
+    if (existing) {
+        existing.close();
+        pools.delete(name);
+    }
+    const ring = rings.get(name);
+    if (ring) {
+        ring.close();
+        rings.delete(name);
+    }
 }
 
-function sendToPython(udm) {
-    return new Promise((resolve, reject) => {
-        if (!pythonProcess) {
-            startPythonAdapter();
-        }
+function getPoolOptions(name) {
+    return poolOptions.get(name) || { ...defaultPoolOptions, name };
+}
+
+function getPythonPool(name = DEFAULT_ADAPTER) {
+    let pool = pools.get(name);
+    if (!pool) {
+        pool = new PythonWorkerPool(getPoolOptions(name));
+        pool.start();
+        pools.set(name, pool);
+    }
+    return pool;
+}
+
+function getSharedRing(name) {
+    let ring = rings.get(name);
+    if (!ring) {
+        const { sharedMemoryBytes } = getPoolOptions(name);
+        if (!(sharedMemoryBytes > 0)) return null;
+        ring = new SharedPayloadRing({ size: sharedMemoryBytes, name });
+        rings.set(name, ring);
+    }
+    return ring;
+}
 
-        if (pendingPromise) {
-            return reject(new Error("Python adapter: only one in-flight request supported in this simple version"));
+const BUFFER_ARRAYS = {
+    float64: Float64Array,
+    float32: Float32Array,
+    int32: Int32Array,
+    int64: BigInt64Array,
+    uint8: Uint8Array,
+};
+
+function typedArrayDtype(value) {
+    if (!ArrayBuffer.isView(value)) return null;
+    for (const [dtype, ArrayType] of Object.entries(BUFFER_ARRAYS)) {
+        if (value instanceof ArrayType) return dtype;
+    }
+    return null;
+}
+
+/**
+ * Move a large typed-array `data.inputs` into the adapter's shared ring and
+ * replace it with an `shm` handle. Small arrays, or a full ring, fall back to
+ * a plain number list. Returns the udm to send and the region to release.
+ */
+function shareInputs(name, udm, options) {
+    const data = udm && udm.data;
+    const dtype = data && typedArrayDtype(data.inputs);
+    if (!dtype) return { udm, region: null };
+
+    const { inputs, ...rest } = data;
+    const { sharedMemoryThreshold } = getPoolOptions(name);
+    const ring = options.sharedMemory === false ? null : getSharedRing(name);
+    if (ring && inputs.byteLength >= sharedMemoryThreshold && os.endianness() === "LE") {
+        const region = ring.write(inputs);
+        if (region) {
+            const shm = { path: region.path, offset: region.offset, length: region.length };
+            return { udm: { ...udm, data: { ...rest, dtype, shm } }, region };
         }
+        logger.debug(`[pythonAdapter] Shared ring for ${name} is full, sending inputs inline`);
+    }
+    const values = dtype === "int64" ? Array.from(inputs, Number) : Array.from(inputs);
+    return { udm: { ...udm, data: { ...rest, inputs: values } }, region: null };
+}
+
+/**
+ * Send a task to the adapter's worker pool. A typed-array `udm.data.inputs`
+ * (Float64Array, Float32Array, Int32Array, BigInt64Array, Uint8Array) larger
+ * than `sharedMemoryThreshold` is passed through shared memory when the pool
+ * has `sharedMemoryBytes` configured; pass `options.sharedMemory = false` to opt out.
+ */
+function sendToPython(udm, options = {}) {
+    const name = options.adapter || DEFAULT_ADAPTER;
+    const pool = getPythonPool(name);
+    const shared = shareInputs(name, udm, options);
+    if (!shared.region) return pool.send(shared.udm, options);
 
-        pendingPromise = { resolve, reject };
+    const ring = rings.get(name);
+    return pool.send(shared.udm, options).finally(() => ring.release(shared.region));
+}
+
+/**
+ * Pack numbers into the base64 little-endian buffer accepted by the
+ * `math.batch` task (`data.buffer` + `data.dtype`), avoiding a JSON number list.
+ * @param {number[]|TypedArray} values
+ * @param {string} [dtype] - "float64" | "float32" | "int32" | "int64" | "uint8"
+ * @returns {{ buffer: string, dtype: string }}
+ */
+function packNumericBuffer(values, dtype = "float64") {
+    const ArrayType = BUFFER_ARRAYS[dtype];
+    if (!ArrayType) throw new Error(`Unsupported buffer dtype: ${dtype}`);
+    if (os.endianness() !== "LE") throw new Error("packNumericBuffer requires a little-endian host");
+
+    const typed = values instanceof ArrayType
+        ? values
+        : ArrayType.from(values, dtype === "int64" ? BigInt : undefined);
+    const bytes = Buffer.from(typed.buffer, typed.byteOffset, typed.byteLength);
+    return { buffer: bytes.toString("base64"), dtype };
+}
+
+function getPendingCount(name = DEFAULT_ADAPTER) {
+    const pool = pools.get(name);
+    if (!pool) return 0;
+    return pool.workers.reduce((sum, w) => sum + w.outstanding, 0) + pool.waiting.length;
+}
 
-        const line = JSON.stringify(udm) + "\n";
-        pythonProcess.stdin.write(line, "utf8", (err) => {
-            if (err) {
-                pendingPromise = null;
-                return reject(err);
-            }
-        });
-    });
+function shutdownPythonPools() {
+    for (const pool of pools.values()) pool.close();
+    pools.clear();
+    for (const ring of rings.values()) ring.close();
+    rings.clear();
 }
 
 module.exports = {
     sendToPython,
+    configurePythonPool,
+    getPythonPool,
+    getPendingCount,
+    packNumericBuffer,
+    shutdownPythonPools,
 };
@@ -0,0 +1,279 @@
+// kernel/src/resultCache.js
+const crypto = require('crypto');
+
+const MB = 1024 * 1024;
+
+/**
+ * JSON with sorted object keys, so equal payloads serialize equally.
+ * Typed arrays are reduced to a digest of their bytes.
+ */
+function canonicalJSON(value) {
+    if (value === undefined || typeof value === 'function') return 'null';
+    if (value === null || typeof value !== 'object') return JSON.stringify(value);
+    if (ArrayBuffer.isView(value)) {
+        const bytes = Buffer.from(value.buffer, value.byteOffset, value.byteLength);
+        return `{"$view":"${value.constructor.name}","sha256":"${crypto.createHash('sha256').update(bytes).digest('hex')}"}`;
+    }
+    if (typeof value.toJSON === 'function') return canonicalJSON(value.toJSON());
+    if (Array.isArray(value)) return `[${value.map(canonicalJSON).join(',')}]`;
+    const keys = Object.keys(value).filter(k => value[k] !== undefined && typeof value[k] !== 'function').sort();
+    return `{${keys.map(k => `${JSON.stringify(k)}:${canonicalJSON(value[k])}`).join(',')}}`;
+}
+
+/**
+ * Content address of a request: target plus a hash of the canonical payload.
+ */
+function cacheKey(target, payload) {
+    return `${target}:${crypto.createHash('sha256').update(canonicalJSON(payload)).digest('base64')}`;
+}
+
+function isThenable(value) {
+    return value !== null && typeof value === 'object' && typeof value.then === 'function';
+}
+
+// Error replies are never cached
+function isCacheableResult(result) {
+    return result !== null && typeof result === 'object' && !result.error && result.status !== 'error';
+}
+
+/**
+ * Freeze a value and everything reachable from it. Typed arrays cannot be
+ * frozen and are left as they are.
+ */
+function deepFreeze(value) {
+    if (value === null || typeof value !== 'object' || ArrayBuffer.isView(value) || Object.isFrozen(value)) return value;
+    for (const key of Object.keys(value)) deepFreeze(value[key]);
+    return Object.freeze(value);
+}
+
+// A coalesced waiter gets the frozen cached copy, or its own clone when the
+// reply was not cached; never the object handed to the caller that computed it
+function copyForWaiter(outcome) {
+    if (outcome.stored) return outcome.stored;
+    try {
+        return structuredClone(outcome.value);
+    } catch {
+        return outcome.value;
+    }
+}
+
+function estimateBytes(key, value) {
+    try {
+        return key.length + Buffer.byteLength(JSON.stringify(value) || '');
+    } catch {
+        return key.length + 1024;
+    }
+}
+
+/**
+ * Result cache for deterministic services.
+ *
+ * Services opt in with declare(); only their replies are cached, keyed by
+ * target plus a canonical hash of the payload. Entries expire after the
+ * service TTL and are evicted least-recently-used first once the entry count
+ * or the estimated memory budget is exceeded. Concurrent misses for the same
+ * key share one execution (single-flight). Synchronous services stay
+ * synchronous: a hit or a sync miss returns the value, an async miss returns
+ * a promise.
+ *
+ * The cache keeps its own deep-frozen copy of each reply, so hits are
+ * read-only and never share state with the caller that computed them.
+ */
+class ResultCache {
+    /**
+     * @param {Object} [options]
+     * @param {boolean} [options.enabled] - false turns getOrCompute() into a pass-through
+     * @param {number} [options.maxBytes] - Memory budget (estimated from JSON size)
+     * @param {number} [options.maxEntries]
+     * @param {number} [options.ttlMs] - Default TTL for declared services
+     */
+    constructor(options = {}) {
+        this.enabled = options.enabled !== false;
+        this.maxBytes = options.maxBytes || 64 * MB;
+        this.maxEntries = options.maxEntries || 10000;
+        this.ttlMs = options.ttlMs || 60000;
+
+        this.services = new Map();  // target -> { ttlMs, when }
+        this.entries = new Map();   // key -> { target, value, bytes, expiresAt }, least recently used first
+        this.inflight = new Map();  // key -> Promise<{ value, stored }>
+        this.bytes = 0;
+        this.stats = new Map();     // target -> { hits, misses, coalesced }
+        this.evictions = { lru: 0, expired: 0 };
+    }
+
+    /**
+     * Declare a service deterministic so its replies may be cached.
+     * @param {string} target
+     * @param {Object} [options] - { ttlMs, when(payload) => boolean } to cache only some requests
+     */
+    declare(target, options = {}) {
+        this.services.set(target, {
+            ttlMs: options.ttlMs || this.ttlMs,
+            when: options.when || null
+        });
+    }
+
+    undeclare(target) {
+        this.services.delete(target);
+        for (const [key, entry] of this.entries) {
+            if (entry.target === target) this._delete(key, entry);
+        }
+    }
+
+    isCacheable(target, payload) {
+        if (!this.enabled) return false;
+        const service = this.services.get(target);
+        return !!service && (!service.when || service.when(payload));
+    }
+
+    /**
+     * Return the cached reply for (target, payload) or run `compute` once.
+     * @param {string} target
+     * @param {any} payload - Everything the reply depends on
+     * @param {function} compute - () => value | Promise<value>
+     */
+    getOrCompute(target, payload, compute) {
+        if (!this.isCacheable(target, payload)) return compute();
+
+        const key = cacheKey(target, payload);
+        const stats = this._statsFor(target);
+        const entry = this.entries.get(key);
+        if (entry) {
+            if (entry.expiresAt > Date.now()) {
+                // Refresh LRU position
+                this.entries.delete(key);
+                this.entries.set(key, entry);
+                stats.hits++;
+                return entry.value;
+            }
+            this._delete(key, entry);
+            this.evictions.expired++;
+        }
+
+        const pending = this.inflight.get(key);
+        if (pending) {
+            stats.coalesced++;
+            return pending.then(copyForWaiter);
+        }
+
+        stats.misses++;
+        const result = compute();
+        if (!isThenable(result)) {
+            this._store(key, target, result);
+            return result;
+        }
+
+        const shared = Promise.resolve(result).then(
+            value => {
+                this.inflight.delete(key);
+                return { value, stored: this._store(key, target, value) };
+            },
+            err => {
+                this.inflight.delete(key);
+                throw err;
+            }
+        );
+        this.inflight.set(key, shared);
+        return shared.then(outcome => outcome.value);
+    }
+
+    // Returns the frozen copy that was cached, if any
+    _store(key, target, value) {
+        if (!isCacheableResult(value)) return;
+        const bytes = estimateBytes(key, value);
+        if (bytes > this.maxBytes) return;
+
+        let frozen;
+        try {
+            frozen = deepFreeze(structuredClone(value));
+        } catch {
+            return; // Not cloneable (functions, sockets, ...): not cached
+        }
+
+        const previous = this.entries.get(key);
+        if (previous) this._delete(key, previous);
+
+        const service = this.services.get(target);
+        this.entries.set(key, {
+            target,
+            value: frozen,
+            bytes,
+            expiresAt: Date.now() + (service ? service.ttlMs : this.ttlMs)
+        });
+        this.bytes += bytes;
+        this._evict();
+        return frozen;
+    }
+
+    _evict() {
+        const now = Date.now();
+        for (const [key, entry] of this.entries) {
+            const expired = entry.expiresAt <= now;
+            if (!expired && this.entries.size <= this.maxEntries && this.bytes <= this.maxBytes) break;
+            this._delete(key, entry);
+            if (expired) this.evictions.expired++;
+            else this.evictions.lru++;
+        }
+    }
+
+    _delete(key, entry) {
+        this.entries.delete(key);
+        this.bytes -= entry.bytes;
+    }
+
+    _statsFor(target) {
+        let stats = this.stats.get(target);
+        if (!stats) {
+            stats = { hits: 0, misses: 0, coalesced: 0 };
+            this.stats.set(target, stats);
+        }
+        return stats;
+    }
+
+    clear() {
+        this.entries.clear();
+        this.bytes = 0;
+    }
+
+    getStats() {
+        const byTarget = {};
+        let hits = 0;
+        let misses = 0;
+        let coalesced = 0;
+        for (const [target, s] of this.stats) {
+            byTarget[target] = { ...s };
+            hits += s.hits;
+            misses += s.misses;
+            coalesced += s.coalesced;
+        }
+        return {
+            enabled: this.enabled,
+            entries: this.entries.size,
+            bytes: this.bytes,
+            maxBytes: this.maxBytes,
+            inflight: this.inflight.size,
+            hits,
+            misses,
+            coalesced,
+            hitRate: hits + misses + coalesced ? (hits + coalesced) / (hits + misses + coalesced) : 0,
+            evictions: { ...this.evictions },
+            services: Array.from(this.services.keys()),
+            byTarget
+        };
+    }
+}
+
+// Shared cache for kernel services, configured from the environment
+const resultCache = new ResultCache({
+    enabled: process.env.RESULT_CACHE_ENABLED !== 'false',
+    maxBytes: (parseInt(process.env.RESULT_CACHE_MAX_MB || '0', 10) * MB) || undefined,
+    maxEntries: parseInt(process.env.RESULT_CACHE_MAX_ENTRIES || '0', 10) || undefined,
+    ttlMs: parseInt(process.env.RESULT_CACHE_TTL_MS || '0', 10) || undefined,
+});
+
+module.exports = {
+    ResultCache,
+    canonicalJSON,
+    cacheKey,
+    resultCache
+};
@@ -1,13 +1,49 @@
 const logger = require("./logger");
-const { logEnvelope } = require("./messageLogger");
+const { logEnvelope, logRouted } = require("./messageLogger");
 const smartRouter = require("./SmartRouter");
 const { runAIPipeline } = require("./ai/aiPipelineEngine");
+const { negotiateEncoding, encodeFor } = require("./codec/envelopeCodec");
 
 // Import service handlers (plugins)
 // We assume these are in ./services/
 const { handleEcho } = require("./services/echoService");
 const { handleMath } = require("./services/mathService");
 const { handleString } = require("./services/stringService");
+const { sendToPython } = require("./pythonAdapter");
+const { resultCache } = require("./resultCache");
+const { admission, priorityOf } = require("./admission");
+const { durableQueue } = require("./durableQueue");
+
+// Internal services get route metrics of their own (see SmartRouter.routeLabel)
+for (const target of ["echo-service", "math-service", "string-service", "python-adapter", "ai-service"]) {
+    smartRouter.declareTarget(target);
+}
+
+// Deterministic services: identical payloads are answered from the result cache
+resultCache.declare("echo-service");
+resultCache.declare("math-service");
+resultCache.declare("string-service");
+resultCache.declare("python-adapter", { when: isCacheablePythonTask });
+
+// Hashing and cloning a large input costs more than recomputing it
+const MAX_CACHED_PYTHON_INPUTS = 1024;
+
+/**
+ * Small math.* tasks only: math.batch, packed buffers and typed-array inputs
+ * (the shared-memory path) bypass the cache, as do long input lists.
+ */
+function isCacheablePythonTask(task) {
+    if (typeof task.task_name !== "string" || !task.task_name.startsWith("math.") || task.task_name === "math.batch") {
+        return false;
+    }
+    const data = task.data || {};
+    if (data.buffer !== undefined || data.shm !== undefined || ArrayBuffer.isView(data.inputs)) return false;
+    return !(Array.isArray(data.inputs) && data.inputs.length > MAX_CACHED_PYTHON_INPUTS);
+}
+
+// Pause before retrying a replay that failed while its target was connected
+const REPLAY_RETRY_MS = 1000;
+const replayRetries = new Map(); // queueId -> retry timer
 
 const serviceRegistry = {}; // Legacy registry, we should migrate to smartRouter fully but keeping for safety
 
@@ -40,6 +76,22 @@ function validateUDL(message) {
     return { valid: true };
 }
 
+/**
+ * Run a service through the result cache. Cached replies carry the trace id
+ * and timestamp of the request being answered, not the one that computed them.
+ * Hits are read-only; the top level is copied so these fields can be set.
+ */
+function fromCache(targetId, payload, traceId, compute) {
+    const withTrace = res => {
+        if (!res || typeof res !== "object") return res;
+        const reply = { ...res, trace_id: traceId };
+        if ("timestamp" in reply) reply.timestamp = new Date().toISOString();
+        return reply;
+    };
+    const result = resultCache.getOrCompute(targetId, payload, compute);
+    return result && typeof result.then === "function" ? result.then(withTrace) : withTrace(result);
+}
+
 /**
  * Core routing logic for UDL messages.
  */
@@ -51,8 +103,7 @@ function routeUDLToTarget(message) {
     const validation = validateUDL(message);
     if (!validation.valid) {
         logger.error("UDL Validation Failed", { errors: validation.errors, message });
-        const targetId = message && message.target ? message.target : 'unknown';
-        smartRouter.recordMessage(targetId, true);
+        smartRouter.recordMessage(smartRouter.routeLabel(message && message.target), true);
         return {
             error: true,
             error_code: "UDL_VALIDATION_FAILED",
@@ -99,25 +150,58 @@ function routeUDLToTarget(message) {
             });
     }
 
+    // 1.6) Tasks for the pooled stdin/stdout python-adapter (math.*, calc.binary, ...)
+    if (targetId === "python-adapter") {
+        const payload = message.payload || {};
+        const task = { task_name: payload.task_name, data: payload.data || {} };
+
+        // A cache hit comes back synchronously
+        return Promise.resolve(fromCache(targetId, task, traceId, () => {
+            const startedAt = process.hrtime.bigint();
+            return sendToPython(task).then(result => {
+                const latencyMs = Number(process.hrtime.bigint() - startedAt) / 1e6;
+                smartRouter.recordMessage("python-adapter", result?.status === "error", latencyMs);
+                return { ...result, service: "python-adapter", trace_id: traceId };
+            });
+        }))
+            .catch(err => {
+                logger.error("[Kernel] Python adapter task failed", { error: err.message, trace_id: traceId });
+                smartRouter.recordMessage("python-adapter", true);
+                return {
+                    status: "error",
+                    service: "python-adapter",
+                    error_code: "PYTHON_ADAPTER_FAILED",
+                    message: err.message,
+                    trace_id: traceId
+                };
+            });
+    }
+
     // 2) Route to internal plugin services
     // We wrap these in try-catch to ensure kernel never crashes
     try {
         if (targetId === "echo-service") {
-            const result = handleEcho(message, traceId);
-            smartRouter.recordMessage("echo-service", !!result?.error);
-            return result;
+            return fromCache(targetId, message.payload, traceId, () => {
+                const result = handleEcho(message, traceId);
+                smartRouter.recordMessage("echo-service", !!result?.error);
+                return result;
+            });
         }
 
         if (targetId === "math-service") {
-            const result = handleMath(message, traceId);
-            smartRouter.recordMessage("math-service", !!result?.error);
-            return result;
+            return fromCache(targetId, message.payload, traceId, () => {
+                const result = handleMath(message, traceId);
+                smartRouter.recordMessage("math-service", !!result?.error);
+                return result;
+            });
         }
 
         if (targetId === "string-service") {
-            const result = handleString(message, traceId);
-            smartRouter.recordMessage("string-service", !!result?.error);
-            return result;
+            return fromCache(targetId, message.payload, traceId, () => {
+                const result = handleString(message, traceId);
+                smartRouter.recordMessage("string-service", !!result?.error);
+                return result;
+            });
         }
     } catch (err) {
         logger.error(`[Kernel] Internal service crash: ${targetId}`, { error: err.message });
@@ -129,22 +213,29 @@ function routeUDLToTarget(message) {
         };
     }
 
-    // 3) Normal routing to registered WebSocket services (external)
-    const targetService = smartRouter.get(targetId);
+    // 3) Normal routing to registered WebSocket services (external).
+    //    Targets with a weighted/canary route resolve to one of their adapters.
+    const serviceId = smartRouter.resolve(targetId, traceId);
+    const targetService = smartRouter.get(serviceId);
+    // While a backlog is queued or replaying, new messages go behind it
+    if (durableQueue.hasBacklog(serviceId)) {
+        return queueForTarget(serviceId, message, traceId);
+    }
     if (targetService) {
         if (targetService.readyState === targetService.OPEN) {
+            // Don't queue more on a socket the adapter is not draining
+            if (!admission.socketWritable(targetService)) {
+                smartRouter.recordMessage(serviceId, true);
+                return admission.overloaded(serviceId, "socket_backpressure");
+            }
             try {
-                targetService.send(JSON.stringify(message));
-                logger.info("Message routed", {
-                    source: message.source,
-                    target: targetId,
-                    trace_id: traceId
-                });
-                smartRouter.recordMessage(targetId, false);
+                targetService.send(encodeFor(targetService, message));
+                logRouted(message, serviceId, traceId);
+                smartRouter.recordMessage(serviceId, false);
                 return { ok: true, routed: true };
             } catch (err) {
-                logger.error(`[Kernel] Failed to send to ${targetId}`, { error: err.message });
-                smartRouter.recordMessage(targetId, true);
+                logger.error(`[Kernel] Failed to send to ${serviceId}`, { error: err.message });
+                smartRouter.recordMessage(serviceId, true);
                 return {
                     error: true,
                     error_code: "SEND_FAILED",
@@ -152,8 +243,11 @@ function routeUDLToTarget(message) {
                 };
             }
         } else {
-            logger.error("Target service connection not open", { target: targetId });
-            smartRouter.recordMessage(targetId, true);
+            if (durableQueue.accepts(serviceId)) {
+                return queueForTarget(serviceId, message, traceId);
+            }
+            logger.error("Target service connection not open", { target: targetId, adapter: serviceId });
+            smartRouter.recordMessage(serviceId, true);
             return {
                 error: true,
                 error_code: "TARGET_CONNECTION_CLOSED",
@@ -161,6 +255,9 @@ function routeUDLToTarget(message) {
             };
         }
     } else {
+        if (durableQueue.accepts(targetId)) {
+            return queueForTarget(targetId, message, traceId);
+        }
         const availableAdapters = smartRouter.getAvailableAdapters();
         const adapterList = availableAdapters.length > 0
             ? availableAdapters.join(', ')
@@ -173,7 +270,7 @@ function routeUDLToTarget(message) {
             logger.error("Target service not found", { target: targetId, available: adapterList });
         }
 
-        smartRouter.recordMessage(targetId || 'unknown', true);
+        smartRouter.recordMessage(smartRouter.routeLabel(targetId), true);
         return {
             error: true,
             error_code: "TARGET_NOT_FOUND",
@@ -184,10 +281,155 @@ function routeUDLToTarget(message) {
 }
 
 /**
- * Public routing entry point.
+ * Store a message for an unreachable target (see durableQueue.js); it is
+ * delivered when the target registers again.
+ */
+function queueForTarget(queueId, message, traceId) {
+    const seq = durableQueue.enqueue(queueId, message);
+    if (seq === null) {
+        smartRouter.recordMessage(queueId, true);
+        return {
+            error: true,
+            error_code: "TARGET_QUEUE_FULL",
+            error_message: `Queue for unreachable target ${queueId} is full`
+        };
+    }
+    logger.debug("Queued message for unreachable target", { target: queueId, seq, traceId });
+    return { ok: true, queued: true, seq };
+}
+
+// Send one replayed message, honouring the same socket backpressure as live traffic
+function deliverQueued(queueId, message) {
+    const ws = smartRouter.get(smartRouter.resolve(queueId));
+    if (!ws || ws.readyState !== ws.OPEN) return "gone";
+    if (!admission.socketWritable(ws)) return "busy";
+    ws.send(encodeFor(ws, message));
+    logRouted(message, queueId, message.meta?.trace_id);
+    smartRouter.recordMessage(queueId, false);
+    return "sent";
+}
+
+function isReachable(queueId) {
+    const ws = smartRouter.get(smartRouter.resolve(queueId));
+    return !!ws && ws.readyState === ws.OPEN;
+}
+
+/**
+ * Replay one target's backlog. A replay that stops while the target is still
+ * connected (a read or send error) is retried after REPLAY_RETRY_MS, because
+ * live traffic for the target keeps queueing behind the backlog until it is empty.
+ */
+function replayTarget(queueId) {
+    durableQueue.replay(queueId, message => deliverQueued(queueId, message)).then(() => {
+        // Done, target gone again, another replay running or a retry already pending
+        if (!durableQueue.hasBacklog(queueId) || !isReachable(queueId)) return;
+        if (durableQueue.isReplaying(queueId) || replayRetries.has(queueId)) return;
+        const timer = setTimeout(() => {
+            replayRetries.delete(queueId);
+            if (isReachable(queueId)) replayTarget(queueId);
+        }, REPLAY_RETRY_MS);
+        if (timer.unref) timer.unref();
+        replayRetries.set(queueId, timer);
+    });
+}
+
+/**
+ * Start replaying the backlog of every queued target that is reachable again.
+ */
+function replayQueued() {
+    for (const queueId of durableQueue.backlogTargets()) {
+        if (isReachable(queueId)) replayTarget(queueId);
+    }
+}
+
+/**
+ * Public routing entry point. Calls are admitted per target (see
+ * admission.js): beyond the target's concurrency they wait in a bounded
+ * priority queue, and beyond that they get an OVERLOADED reply.
+ *
+ * Admission and route metrics are keyed by smartRouter.routeLabel(): targets
+ * nothing is registered for share the "unknown" state instead of each
+ * client-chosen name getting its own. Resolved once, so a target that
+ * registers mid-call is released and timed where it started.
  */
 function routeUDL(message) {
-    return routeUDLToTarget(message);
+    const targetId = smartRouter.routeLabel(message && message.target);
+    if (admission.tryAcquire(targetId)) {
+        return routeAdmitted(message, targetId);
+    }
+
+    const waiting = admission.enqueue(targetId, priorityOf(message));
+    if (!waiting) {
+        return rejectOverloaded(targetId, "queue_full");
+    }
+    return waiting.then(
+        () => routeAdmitted(message, targetId),
+        err => rejectOverloaded(targetId, err)
+    );
+}
+
+function rejectOverloaded(targetId, reason) {
+    smartRouter.finishRoute(targetId, smartRouter.startRoute(targetId), "OVERLOADED");
+    return admission.overloaded(targetId, reason);
+}
+
+function routeAdmitted(message, targetId) {
+    const admittedAt = Date.now();
+    const release = () => admission.release(targetId, Date.now() - admittedAt);
+
+    let result;
+    try {
+        result = routeTimed(message, targetId);
+    } catch (err) {
+        release();
+        throw err;
+    }
+    if (result && typeof result.then === "function") {
+        return result.then(
+            res => {
+                release();
+                return res;
+            },
+            err => {
+                release();
+                throw err;
+            }
+        );
+    }
+    release();
+    return result;
+}
+
+function routeTimed(message, targetId) {
+    const startedAt = smartRouter.startRoute(targetId);
+
+    let result;
+    try {
+        result = routeUDLToTarget(message);
+    } catch (err) {
+        smartRouter.finishRoute(targetId, startedAt, "ROUTING_EXCEPTION");
+        throw err;
+    }
+
+    if (result && typeof result.then === "function") {
+        return result.then(
+            res => {
+                smartRouter.finishRoute(targetId, startedAt, routeErrorCode(res));
+                return res;
+            },
+            err => {
+                smartRouter.finishRoute(targetId, startedAt, "ROUTING_EXCEPTION");
+                throw err;
+            }
+        );
+    }
+    smartRouter.finishRoute(targetId, startedAt, routeErrorCode(result));
+    return result;
+}
+
+function routeErrorCode(result) {
+    if (!result || !(result.error || result.status === "error")) return null;
+    return result.error_code || "UNKNOWN_ERROR";
 }
 
 /**
@@ -284,11 +526,14 @@ async function handleKernelControlMessage(envelope) {
         switch (intent) {
             case 'register_adapter':
                 logger.info(`[KernelControl] register_adapter -> ${payload?.adapterId || sourceId}`);
+                // After the ack (and the negotiated encoding) is in place
+                if (durableQueue.enabled) setImmediate(replayQueued);
                 return {
                     status: 'ok',
                     kind: 'kernel_control',
                     action: 'register_adapter_ack',
                     adapterId: payload?.adapterId || sourceId,
+                    encoding: negotiateEncoding(payload?.encodings),
                     trace_id: traceId
                 };
 
@@ -343,5 +588,6 @@ module.exports = {
     routeUDLToTarget,
     smartRouter,
     handleKernelControlMessage,
+    replayQueued,
     executePipeline
 };
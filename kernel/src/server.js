@@ -18,9 +18,21 @@ const logger = require("./logger");
 const { interpretUDLToUDM } = require("./antigravityCore");
 const IntelligenceEngine = require("./IntelligenceEngine");
 const AdapterManager = require("./adapterManager");
+const { decodeFrame, encodeFor } = require("./codec/envelopeCodec");
+const { renderMetrics, CONTENT_TYPE: METRICS_CONTENT_TYPE } = require("./metricsExporter");
+const { messageLog } = require("./logPipeline");
+const { resultCache } = require("./resultCache");
+const { admission, ConnectionFlow } = require("./admission");
+const { durableQueue } = require("./durableQueue");
+const config = require("./config/config");
+const { attachWorker } = require("./kernelCluster");
+const { routeBatch, streamNDJSON, writerFor } = require("./udlBatch");
 
 // Initialize Core Components
 const app = express();
+// Batches may be large; everything else keeps the default body limit.
+// The batch parser runs first and the global one skips bodies already parsed.
+app.use(`${HTTP_PATH}/batch`, express.json({ limit: config.batch.maxBodyBytes }));
 app.use(express.json());
 app.use(morgan("dev"));
 
@@ -32,40 +44,57 @@ app.get("/", (req, res) => {
         version: VERSION,
         api_version: API_VERSION,
         uptime: process.uptime(),
-        routes: ["/health", "/services", HTTP_PATH],
+        routes: ["/health", "/metrics", "/services", HTTP_PATH, `${HTTP_PATH}/batch`, `${HTTP_PATH}/stream`],
         websocket: WS_PATH
     });
 });
 
+// Clustered mode (kernelCluster.js): adapters on other workers are reachable
+// over IPC, and /health reports every worker
+const clusterWorker = attachWorker(smartRouter, {
+    stats: () => ({
+        queued: admission.getStats().queued,
+        result_cache_hits: resultCache.getStats().hits,
+    }),
+});
+
 // Health Check
-app.get("/health", (req, res) => {
-    const { VERSION, API_VERSION, BUILD_HASH } = require("./config");
-    const aiConfig = require("./ai/aiConfig");
-    const adapters = smartRouter.getRoutes().map(r => ({
-        id: r.id,
-        status: r.ws?.readyState === 1 ? "connected" : "disconnected",
-        messages: smartRouter.metrics.get(r.id)?.total || 0,
-        lastActive: smartRouter.metrics.get(r.id)?.lastActive || null,
-        errors: smartRouter.metrics.get(r.id)?.errors || 0
-    }));
+app.get("/health", async (req, res) => {
+    try {
+        const { VERSION, API_VERSION, BUILD_HASH } = require("./config");
+        const aiConfig = require("./ai/aiConfig");
+        const adapters = smartRouter.getAdapterSummary();
 
-    res.json({
-        status: "ok",
-        kernel_version: VERSION,
-        api_version: API_VERSION,
-        build_hash: BUILD_HASH,
-        uptime_seconds: process.uptime(),
-        timestamp: new Date().toISOString(),
-        memory: process.memoryUsage(),
-        adapters: adapters,
-        adapter_count: adapters.length,
-        ai: {
-            enabled: aiConfig.AI_ENABLED,
-            provider: aiConfig.AI_PROVIDER,
-            default_model: aiConfig.AI_DEFAULT_MODEL,
-            dev_mode: aiConfig.DEV_MODE
-        }
-    });
+        res.json({
+            status: "ok",
+            kernel_version: VERSION,
+            api_version: API_VERSION,
+            build_hash: BUILD_HASH,
+            uptime_seconds: process.uptime(),
+            timestamp: new Date().toISOString(),
+            memory: process.memoryUsage(),
+            adapters: adapters,
+            adapter_count: adapters.length,
+            result_cache: resultCache.getStats(),
+            admission: admission.getStats(),
+            durable_queue: durableQueue.getStats(),
+            ai: {
+                enabled: aiConfig.AI_ENABLED,
+                provider: aiConfig.AI_PROVIDER,
+                default_model: aiConfig.AI_DEFAULT_MODEL,
+                dev_mode: aiConfig.DEV_MODE
+            },
+            ...(clusterWorker ? { worker: clusterWorker.workerId, cluster: await clusterWorker.collectStats() } : {})
+        });
+    } catch (err) {
+        res.status(500).json({ status: "error", message: err.message });
+    }
+});
+
+// Prometheus metrics
+app.get("/metrics", (req, res) => {
+    res.set("Content-Type", METRICS_CONTENT_TYPE);
+    res.send(renderMetrics(smartRouter, { logStats: messageLog.getStats(), cacheStats: resultCache.getStats(), admissionStats: admission.getStats() }));
 });
 
 // Services Discovery
@@ -78,6 +107,15 @@ app.get("/services", (req, res) => {
     }
 });
 
+// OVERLOADED replies become 503 with Retry-After
+function sendRouteResult(res, result) {
+    if (result && result.error_code === "OVERLOADED") {
+        res.set("Retry-After", String(Math.ceil(result.retry_after_ms / 1000)));
+        return res.status(503).json(result);
+    }
+    return res.json(result);
+}
+
 // Main UDL Entrypoint
 app.post(HTTP_PATH, async (req, res) => {
     const message = req.body;
@@ -90,20 +128,54 @@ app.post(HTTP_PATH, async (req, res) => {
             // If Antigravity routed it to a service, we route the UDM
             if (interpretation.udm) {
                 const result = await routeUDL(interpretation.udm);
-                return res.json({ ...result, antigravity: true });
+                return sendRouteResult(res, { ...result, antigravity: true });
             }
             return res.status(501).json({ error: true, message: "Not implemented" });
         }
 
         // Standard Routing
         const result = await routeUDL(message);
-        return res.json(result);
+        return sendRouteResult(res, result);
     } catch (err) {
         logger.error("Error handling UDL request:", err);
         return res.status(500).json({ status: "error", message: err.message });
     }
 });
 
+// Batch entrypoint: JSON array (or { messages, concurrency }) routed concurrently
+app.post(`${HTTP_PATH}/batch`, async (req, res) => {
+    const body = req.body;
+    const messages = Array.isArray(body) ? body : body && body.messages;
+    if (!Array.isArray(messages)) {
+        return res.status(400).json({ status: "error", message: "Expected an array of UDL messages" });
+    }
+    if (messages.length > config.batch.maxMessages) {
+        return res.status(413).json({ status: "error", message: `At most ${config.batch.maxMessages} messages per batch` });
+    }
+    try {
+        const concurrency = Math.min(parseInt(body.concurrency, 10) || config.batch.concurrency, config.batch.concurrency);
+        const results = await routeBatch(messages, routeUDL, { concurrency });
+        return res.json({ status: "ok", count: results.length, results });
+    } catch (err) {
+        logger.error("Error handling UDL batch:", err);
+        return res.status(500).json({ status: "error", message: err.message });
+    }
+});
+
+// Streaming entrypoint: NDJSON in, one NDJSON result line per message as it completes
+app.post(`${HTTP_PATH}/stream`, async (req, res) => {
+    res.status(200).set("Content-Type", "application/x-ndjson");
+    res.on("close", () => req.destroy());
+    try {
+        const stats = await streamNDJSON(req, writerFor(res), routeUDL);
+        logger.info(`[Kernel] UDL stream: ${stats.received} received, ${stats.routed} routed, ${stats.invalid} invalid`);
+    } catch (err) {
+        logger.error("Error handling UDL stream:", err);
+        if (!res.writableEnded) res.write(JSON.stringify({ result: { error: true, error_code: "STREAM_ERROR", message: err.message } }) + "\n");
+    }
+    res.end();
+});
+
 // Server Setup
 const server = http.createServer(app);
 const wss = new WebSocket.Server({ server, path: WS_PATH });
@@ -117,15 +189,18 @@ wss.on("connection", (ws) => {
 
     let serviceId = null;
 
-    ws.on("message", async (raw) => {
+    // Inbound backpressure (see ConnectionFlow)
+    const flow = new ConnectionFlow(ws, admission, { maxInFlight: config.admission.maxInFlightPerConnection });
+
+    ws.on("message", async (raw, isBinary) => {
         let data;
 
         try {
-            data = JSON.parse(raw.toString());
+            data = decodeFrame(raw, isBinary);
         } catch (err) {
             logger.error("[Kernel] Failed to parse incoming message", {
                 error: err.message,
-                raw: raw.toString(),
+                raw: isBinary ? `<${raw.length} bytes>` : raw.toString(),
             });
             return;
         }
@@ -139,13 +214,18 @@ wss.on("connection", (ws) => {
 
                 if (serviceId) {
                     smartRouter.register(serviceId, ws);
+                    if (clusterWorker) clusterWorker.announce(serviceId);
                 }
             }
 
             handleKernelControlMessage(data)
                 .then((result) => {
                     if (result) {
+                        // Acks always go out as JSON; a negotiated encoding applies afterwards
                         ws.send(JSON.stringify(result));
+                        if (result.action === "register_adapter_ack" && result.encoding) {
+                            ws.encoding = result.encoding;
+                        }
                     }
                 })
                 .catch((err) => {
@@ -165,6 +245,7 @@ wss.on("connection", (ws) => {
 
         // 2) DATA PLANE (normal routing)
         // NOTE: routeUDL may return a Promise (e.g., for AI requests), so we must await it
+        flow.begin();
         try {
             const responsePayload = await routeUDL(data);
 
@@ -185,7 +266,7 @@ wss.on("connection", (ws) => {
                 };
 
                 try {
-                    ws.send(JSON.stringify(envelope));
+                    ws.send(encodeFor(ws, envelope, isBinary));
                 } catch (err) {
                     logger.error("[Kernel] Failed to send response envelope", {
                         error: err.message,
@@ -210,16 +291,20 @@ wss.on("connection", (ws) => {
                 },
             };
             try {
-                ws.send(JSON.stringify(errorEnvelope));
+                ws.send(encodeFor(ws, errorEnvelope, isBinary));
             } catch (sendErr) {
                 logger.error("[Kernel] Failed to send error envelope", { error: sendErr.message });
             }
+        } finally {
+            flow.end();
         }
     });
 
     ws.on("close", () => {
+        flow.close();
         if (serviceId) {
             smartRouter.unregister(serviceId);
+            if (clusterWorker) clusterWorker.withdraw(serviceId);
         } else {
             logger.info("[Kernel] WebSocket client disconnected.");
         }
@@ -235,14 +320,26 @@ process.on('unhandledRejection', (reason, promise) => {
     logger.error('UNHANDLED REJECTION! Kernel staying alive...', { reason });
 });
 
+// Write queued messages to disk before the process goes away
+function shutdown(signal) {
+    logger.info(`[Kernel] ${signal} received, shutting down`);
+    durableQueue.close();
+    process.exit(0);
+}
+
+process.on('SIGTERM', () => shutdown('SIGTERM'));
+process.on('SIGINT', () => shutdown('SIGINT'));
+process.on('beforeExit', () => durableQueue.close());
+
 server.listen(PORT, () => {
     const { VERSION, KERNEL_NAME } = require("./config");
     logger.info(`${KERNEL_NAME} v${VERSION} kernel started on port ${PORT}`);
     logger.info(`HTTP endpoint: ${HTTP_PATH}`);
     logger.info(`WebSocket endpoint: ${WS_PATH}`);
 
-    // Start Managers
-    adapterManager.scanAndStart();
+    // Start Managers (adapter processes once per cluster)
+    if (clusterWorker) clusterWorker.onLeader(() => adapterManager.scanAndStart());
+    else adapterManager.scanAndStart();
 
     // Start AI Engine
     const aiEngine = new IntelligenceEngine(smartRouter);
@@ -0,0 +1,136 @@
+// kernel/src/udlBatch.js
+// Bulk UDL entry points: a JSON array routed concurrently (/udl/batch) and
+// NDJSON streamed in and out line by line (/udl/stream).
+const crypto = require("crypto");
+const readline = require("readline");
+const config = require("./config/config");
+const ParallelExecutionEngine = require("./execution/ParallelExecutionEngine");
+
+// Results are correlated by trace_id; messages without one get one
+function withTraceId(message) {
+    if (!message || typeof message !== "object") return message;
+    const meta = message.meta || {};
+    if (meta.trace_id) return message;
+    return { ...message, meta: { ...meta, trace_id: crypto.randomUUID() } };
+}
+
+function batchItem(index, message, status, value) {
+    const item = { index, trace_id: message && message.meta ? message.meta.trace_id : undefined };
+    if (status === "fulfilled") {
+        item.result = value;
+    } else {
+        item.result = { error: true, error_code: "ROUTING_ERROR", message: value && value.message };
+    }
+    return item;
+}
+
+/**
+ * Route an array of UDL messages, at most `concurrency` at a time.
+ * @param {Array} messages
+ * @param {Function} route - routeUDL
+ * @param {Object} [options] - { concurrency }
+ * @returns {Promise<Array<{index, trace_id, result}>>} In input order
+ */
+async function routeBatch(messages, route, options = {}) {
+    const concurrency = options.concurrency || config.batch.concurrency;
+    const tasks = messages.map(withTraceId);
+    const engine = new ParallelExecutionEngine({ route }, { concurrency });
+    const settled = await engine.execute(tasks);
+    return settled.map((r, i) => batchItem(i, tasks[i], r.status, r.status === "fulfilled" ? r.value : r.reason));
+}
+
+/**
+ * Route NDJSON envelopes from a stream as they arrive and emit one result
+ * line per envelope as soon as it completes (so not in input order; use
+ * index / trace_id). Reading stops while `concurrency` envelopes are in
+ * flight or while `write` reports a full output buffer.
+ * @param {Readable} input - e.g. the HTTP request
+ * @param {Function} write - (line) => boolean | Promise, like res.write
+ * @param {Function} route - routeUDL
+ * @param {Object} [options] - { concurrency, maxMessages }
+ * @returns {Promise<{received, routed, invalid}>}
+ */
+async function streamNDJSON(input, write, route, options = {}) {
+    const concurrency = options.concurrency || config.batch.concurrency;
+    const maxMessages = options.maxMessages || config.batch.maxMessages;
+    const stats = { received: 0, routed: 0, invalid: 0 };
+    const lines = readline.createInterface({ input, crlfDelay: Infinity });
+
+    let inFlight = 0;
+    let slotFreed = null;
+    let output = Promise.resolve();
+    const emit = (item) => {
+        // Serialize writes and wait for drain before the next one
+        output = output.then(() => write(JSON.stringify(item) + "\n")).catch((err) => {
+            stats.writeError = err.message; // client went away; keep draining in-flight calls
+        });
+        return output;
+    };
+
+    for await (const line of lines) {
+        if (!line.trim()) continue;
+        const index = stats.received++;
+        if (index >= maxMessages) {
+            await emit({ index, result: { error: true, error_code: "BATCH_TOO_LARGE", message: `At most ${maxMessages} messages per stream` } });
+            break;
+        }
+        let message;
+        try {
+            message = withTraceId(JSON.parse(line));
+        } catch (err) {
+            stats.invalid++;
+            await emit({ index, result: { error: true, error_code: "INVALID_JSON", message: err.message } });
+            continue;
+        }
+
+        while (inFlight >= concurrency) {
+            await new Promise(resolve => { slotFreed = resolve; });
+        }
+        inFlight++;
+        Promise.resolve()
+            .then(() => route(message))
+            .then(value => batchItem(index, message, "fulfilled", value), err => batchItem(index, message, "rejected", err))
+            .then(item => emit(item))
+            .then(() => {
+                stats.routed++;
+                inFlight--;
+                if (slotFreed) {
+                    const resolve = slotFreed;
+                    slotFreed = null;
+                    resolve();
+                }
+            });
+    }
+
+    while (inFlight > 0) {
+        await new Promise(resolve => { slotFreed = resolve; });
+    }
+    await output;
+    return stats;
+}
+
+/**
+ * res.write that waits for 'drain' when the socket buffer is full (or for
+ * 'close' when the client is gone).
+ */
+function writerFor(res) {
+    return (chunk) => {
+        if (res.destroyed || res.write(chunk)) return undefined;
+        return new Promise((resolve) => {
+            const done = () => {
+                res.off("drain", done);
+                res.off("close", done);
+                resolve();
+            };
+            res.on("drain", done);
+            res.on("close", done);
+        });
+    };
+}
+
+module.exports = {
+    routeBatch,
+    streamNDJSON,
+    writerFor,
+    withTraceId
+};
@@ -0,0 +1,117 @@
+/**
+ * UMB Stream Bridge
+ * Carries UMB streams over a kernel WebSocket connection.
+ *
+ * Client -> kernel:
+ *   { cmd: 'stream_open', ref, source, target }      -> { cmd: 'stream_opened', ref, streamId }
+ *   { cmd: 'stream_write', streamId, chunks: [...] }  (kernel may answer stream_pause / stream_resume)
+ *   { cmd: 'stream_end', streamId }
+ *   { cmd: 'stream_subscribe', streamId, window }     -> stream_data { streamId, seq, chunks } ... stream_end
+ *   { cmd: 'stream_credit', streamId, credit }        grant more batches
+ *
+ * Buffer chunks travel as { $b64: '...' }. Outgoing data also waits while
+ * the socket's bufferedAmount is above config.umb.wsStreamBufferLimit.
+ */
+
+const config = require('../config/config');
+
+function encodeChunk(chunk) {
+    return Buffer.isBuffer(chunk) ? { $b64: chunk.toString('base64') } : chunk;
+}
+
+function decodeChunk(chunk) {
+    return chunk && typeof chunk === 'object' && typeof chunk.$b64 === 'string'
+        ? Buffer.from(chunk.$b64, 'base64')
+        : chunk;
+}
+
+class StreamBridge {
+    constructor(ws, umb) {
+        this.ws = ws;
+        this.umb = umb;
+        this.produced = new Set();   // streamIds opened by this client
+        this.consumers = new Map();  // streamId -> StreamConsumer
+        this.paused = new Set();     // streamIds this client was told to pause
+    }
+
+    send(frame) {
+        if (this.ws.readyState === this.ws.OPEN) {
+            this.ws.send(JSON.stringify(frame));
+        }
+    }
+
+    /**
+     * Handle a stream command. Returns false if `msg` is not one.
+     */
+    handle(msg) {
+        switch (msg.cmd) {
+            case 'stream_open': {
+                const streamId = this.umb.createStream(msg.source, msg.target, msg.options || {});
+                this.produced.add(streamId);
+                this.send({ cmd: 'stream_opened', ref: msg.ref, streamId });
+                return true;
+            }
+            case 'stream_write': {
+                let accepting = true;
+                for (const chunk of msg.chunks || []) {
+                    accepting = this.umb.streamPush(msg.streamId, decodeChunk(chunk));
+                }
+                if (!accepting && !this.paused.has(msg.streamId)) {
+                    this.paused.add(msg.streamId);
+                    this.send({ cmd: 'stream_pause', streamId: msg.streamId });
+                    this.umb.onStreamDrain(msg.streamId, () => {
+                        this.paused.delete(msg.streamId);
+                        this.send({ cmd: 'stream_resume', streamId: msg.streamId });
+                    });
+                }
+                return true;
+            }
+            case 'stream_end':
+                this.produced.delete(msg.streamId);
+                this.umb.streamClose(msg.streamId);
+                return true;
+            case 'stream_subscribe': {
+                const streamId = msg.streamId;
+                const consumer = this.umb.consumeStream(streamId, {
+                    window: msg.window,
+                    canReceive: () => this.ws.bufferedAmount < config.umb.wsStreamBufferLimit,
+                    onBatch: (batch) => this.send({
+                        cmd: 'stream_data',
+                        streamId,
+                        seq: batch.seq,
+                        chunks: batch.chunks.map(encodeChunk)
+                    }),
+                    onEnd: () => {
+                        this.consumers.delete(streamId);
+                        this.send({ cmd: 'stream_end', streamId });
+                    }
+                });
+                this.consumers.set(streamId, consumer);
+                return true;
+            }
+            case 'stream_credit': {
+                const consumer = this.consumers.get(msg.streamId);
+                if (consumer) consumer.grant(Math.max(1, msg.credit || 1));
+                return true;
+            }
+            default:
+                return false;
+        }
+    }
+
+    /**
+     * Release everything held for this connection.
+     */
+    close() {
+        for (const consumer of this.consumers.values()) consumer.detach();
+        this.consumers.clear();
+        for (const streamId of this.produced) this.umb.streamClose(streamId);
+        this.produced.clear();
+    }
+}
+
+module.exports = {
+    StreamBridge,
+    encodeChunk,
+    decodeChunk
+};
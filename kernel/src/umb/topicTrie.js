@@ -0,0 +1,120 @@
+/**
+ * Topic Trie
+ * Subscription index for wildcard topic patterns.
+ *
+ * Topics are split into segments on '.' or ':' ("adapter:python:execute",
+ * "metrics.cpu.load"). In a pattern, '*' matches exactly one segment and '#'
+ * matches zero or more trailing segments, so "adapter:*:execute" and
+ * "metrics.#" both work. '#' is only allowed as the last segment.
+ */
+
+const SEPARATOR = /[.:]/;
+
+function splitTopic(topic) {
+    return String(topic).split(SEPARATOR);
+}
+
+function isPattern(topic) {
+    return splitTopic(topic).some(s => s === '*' || s === '#');
+}
+
+class TrieNode {
+    constructor() {
+        this.children = new Map(); // segment -> TrieNode
+        this.star = null;          // '*' child
+        this.hash = null;          // '#' child (terminal)
+        this.callbacks = null;     // Set<callback>, created on first subscribe
+    }
+
+    isEmpty() {
+        return this.children.size === 0 && !this.star && !this.hash && !(this.callbacks && this.callbacks.size);
+    }
+}
+
+class TopicTrie {
+    constructor() {
+        this.root = new TrieNode();
+        this.size = 0; // number of (pattern, callback) pairs
+    }
+
+    add(pattern, callback) {
+        const segments = splitTopic(pattern);
+        let node = this.root;
+        segments.forEach((segment, i) => {
+            if (segment === '#') {
+                if (i !== segments.length - 1) {
+                    throw new Error(`'#' must be the last segment of a topic pattern: ${pattern}`);
+                }
+                node = node.hash || (node.hash = new TrieNode());
+            } else if (segment === '*') {
+                node = node.star || (node.star = new TrieNode());
+            } else {
+                let child = node.children.get(segment);
+                if (!child) {
+                    child = new TrieNode();
+                    node.children.set(segment, child);
+                }
+                node = child;
+            }
+        });
+        if (!node.callbacks) node.callbacks = new Set();
+        if (!node.callbacks.has(callback)) {
+            node.callbacks.add(callback);
+            this.size++;
+        }
+    }
+
+    remove(pattern, callback) {
+        const segments = splitTopic(pattern);
+        const path = [this.root];
+        let node = this.root;
+        for (const segment of segments) {
+            node = segment === '#' ? node.hash : segment === '*' ? node.star : node.children.get(segment);
+            if (!node) return false;
+            path.push(node);
+        }
+        if (!node.callbacks || !node.callbacks.delete(callback)) return false;
+        this.size--;
+
+        // Prune empty branches
+        for (let i = segments.length; i > 0; i--) {
+            const child = path[i];
+            if (!child.isEmpty()) break;
+            const parent = path[i - 1];
+            const segment = segments[i - 1];
+            if (segment === '#') parent.hash = null;
+            else if (segment === '*') parent.star = null;
+            else parent.children.delete(segment);
+        }
+        return true;
+    }
+
+    /**
+     * Call `visit(callback)` for every subscription matching a concrete topic.
+     * @param {string} topic
+     * @param {function} visit
+     */
+    match(topic, visit) {
+        if (this.size === 0) return;
+        this._match(this.root, splitTopic(topic), 0, visit);
+    }
+
+    _match(node, segments, i, visit) {
+        // '#' also matches zero remaining segments
+        if (node.hash && node.hash.callbacks) node.hash.callbacks.forEach(visit);
+
+        if (i === segments.length) {
+            if (node.callbacks) node.callbacks.forEach(visit);
+            return;
+        }
+        const child = node.children.get(segments[i]);
+        if (child) this._match(child, segments, i + 1, visit);
+        if (node.star) this._match(node.star, segments, i + 1, visit);
+    }
+}
+
+module.exports = {
+    TopicTrie,
+    splitTopic,
+    isPattern
+};
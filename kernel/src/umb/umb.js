@@ -1,86 +1,154 @@
 /**
  * Universal Message Bus (UMB)
  * Handles inter-component communication, streaming, and events.
+ *
+ * Subscriptions to plain topics live in a Map; wildcard patterns
+ * ("adapter:*:execute", "metrics.#") live in a segment trie, so publish()
+ * does one Map lookup plus a trie walk only when patterns exist. RPC replies
+ * are matched through a single pending-request map.
  */
 
 const EventEmitter = require('events');
-const { v4: uuidv4 } = require('uuid');
+const { Readable, Writable } = require('stream');
 const config = require('../config/config');
+const { TopicTrie, isPattern } = require('./topicTrie');
+const { UMBStream } = require('./umbStream');
+
+const RESPONSE_PREFIX = 'response:';
+
+// Monotonic ids, unique per process run
+const ID_PREFIX = `${process.pid.toString(36)}-${Date.now().toString(36)}`;
+let messageSeq = 0;
+let requestSeq = 0;
+let streamSeq = 0;
+
+/**
+ * Bus message. `id` and `timestamp` are derived on first access, so
+ * messages nobody inspects never format a date.
+ */
+class UMBMessage {
+    constructor(topic, payload, type, metadata) {
+        this.seq = ++messageSeq;
+        this.time = Date.now();
+        this.topic = topic;
+        this.type = type; // 'event', 'request', 'response'
+        this.payload = payload;
+        this.metadata = metadata;
+    }
+
+    get id() {
+        return `${ID_PREFIX}-${this.seq}`;
+    }
+
+    get timestamp() {
+        return new Date(this.time).toISOString();
+    }
+
+    toJSON() {
+        return {
+            id: this.id,
+            topic: this.topic,
+            type: this.type,
+            timestamp: this.timestamp,
+            payload: this.payload,
+            metadata: this.metadata
+        };
+    }
+}
 
 class UMB extends EventEmitter {
     constructor() {
         super();
         this.subscribers = new Map(); // topic -> Set<callback>
+        this.patterns = new TopicTrie(); // wildcard pattern subscriptions
         this.requestHandlers = new Map(); // topic -> callback
-        this.streams = new Map(); // streamId -> StreamData
+        this.pendingRequests = new Map(); // requestId -> { resolve, reject, timer, topic }
+        this.streams = new Map(); // streamId -> UMBStream
 
         console.log('[UMB] Initialized Universal Message Bus');
     }
 
     /**
      * Publish a message to a topic (Fire and Forget)
-     * @param {string} topic 
-     * @param {any} payload 
-     * @param {object} metadata 
+     * @param {string} topic
+     * @param {any} payload
+     * @param {object} metadata
      */
     publish(topic, payload, metadata = {}) {
-        const message = this._createMessage(topic, payload, 'event', metadata);
-        this.emit(topic, message);
-
-        // Also notify wildcard subscribers if we implement them later
-        this.emit('*', message);
+        metadata = metadata || {};
+        // Replies to request() (local handlers or remote adapters) settle the caller directly
+        if (topic.startsWith(RESPONSE_PREFIX) && this._settle(metadata.requestId || topic.slice(RESPONSE_PREFIX.length), payload, metadata)) {
+            return;
+        }
+        this._dispatch(this._createMessage(topic, payload, 'event', metadata));
     }
 
     /**
-     * Subscribe to a topic
-     * @param {string} topic 
-     * @param {function} callback 
+     * Subscribe to a topic or pattern. '*' matches one segment, '#' any
+     * number of trailing segments; a bare '*' subscribes to every message.
+     * @param {string} topic
+     * @param {function} callback
+     * @returns {function} Unsubscribe function
      */
     subscribe(topic, callback) {
-        if (!this.subscribers.has(topic)) {
-            this.subscribers.set(topic, new Set());
-            this.on(topic, (msg) => {
-                this.subscribers.get(topic).forEach(cb => cb(msg));
-            });
+        if (topic === '*' || isPattern(topic)) {
+            this.patterns.add(topic === '*' ? '#' : topic, callback);
+        } else {
+            let callbacks = this.subscribers.get(topic);
+            if (!callbacks) {
+                callbacks = new Set();
+                this.subscribers.set(topic, callbacks);
+            }
+            callbacks.add(callback);
         }
-        this.subscribers.get(topic).add(callback);
-        console.log(`[UMB] Subscribed to ${topic}`);
+        return () => this.unsubscribe(topic, callback);
+    }
+
+    /**
+     * Remove a subscription added with subscribe()
+     * @param {string} topic
+     * @param {function} callback
+     */
+    unsubscribe(topic, callback) {
+        if (topic === '*' || isPattern(topic)) {
+            return this.patterns.remove(topic === '*' ? '#' : topic, callback);
+        }
+        const callbacks = this.subscribers.get(topic);
+        if (!callbacks || !callbacks.delete(callback)) return false;
+        if (callbacks.size === 0) this.subscribers.delete(topic);
+        return true;
     }
 
     /**
      * Send a request and wait for a response (RPC style)
-     * @param {string} topic 
-     * @param {any} payload 
-     * @param {number} timeoutMs 
+     * @param {string} topic
+     * @param {any} payload
+     * @param {number} timeoutMs
      * @returns {Promise<any>}
      */
     async request(topic, payload, timeoutMs = 5000) {
-        const requestId = uuidv4();
-        const responseTopic = `response:${requestId}`;
+        const requestId = `${ID_PREFIX}-r${++requestSeq}`;
+        const responseTopic = `${RESPONSE_PREFIX}${requestId}`;
 
         return new Promise((resolve, reject) => {
             const timer = setTimeout(() => {
-                this.removeAllListeners(responseTopic);
+                this.pendingRequests.delete(requestId);
                 reject(new Error(`UMB Request Timeout: ${topic}`));
             }, timeoutMs);
 
-            this.once(responseTopic, (msg) => {
-                clearTimeout(timer);
-                if (msg.error) {
-                    reject(new Error(msg.error));
-                } else {
-                    resolve(msg.payload);
-                }
-            });
+            this.pendingRequests.set(requestId, { resolve, reject, timer, topic });
 
             const message = this._createMessage(topic, payload, 'request', { requestId, responseTopic });
-            this.emit(topic, message);
+            this._dispatch(message);
+
+            const handler = this.requestHandlers.get(topic);
+            if (handler) this._invokeHandler(handler, message);
         });
     }
 
     /**
      * Register a handler for requests on a topic
-     * @param {string} topic 
+     * @param {string} topic
      * @param {function} handler - async function(payload, metadata) returning response
      */
     handle(topic, handler) {
@@ -88,76 +156,181 @@ class UMB extends EventEmitter {
             throw new Error(`Handler already registered for ${topic}`);
         }
         this.requestHandlers.set(topic, handler);
-
-        this.on(topic, async (msg) => {
-            if (msg.type === 'request') {
-                try {
-                    const result = await handler(msg.payload, msg.metadata);
-                    this.publish(msg.metadata.responseTopic, result, { requestId: msg.metadata.requestId });
-                } catch (err) {
-                    this.publish(msg.metadata.responseTopic, null, {
-                        requestId: msg.metadata.requestId,
-                        error: err.message
-                    });
-                }
-            }
-        });
         console.log(`[UMB] Registered handler for ${topic}`);
     }
 
+    async _invokeHandler(handler, msg) {
+        const { requestId, responseTopic } = msg.metadata;
+        try {
+            const result = await handler(msg.payload, msg.metadata);
+            this.publish(responseTopic, result, { requestId });
+        } catch (err) {
+            this.publish(responseTopic, null, { requestId, error: err.message });
+        }
+    }
+
+    _settle(requestId, payload, metadata) {
+        const pending = this.pendingRequests.get(requestId);
+        if (!pending) return false;
+        this.pendingRequests.delete(requestId);
+        clearTimeout(pending.timer);
+        if (metadata.error) {
+            pending.reject(new Error(metadata.error));
+        } else {
+            pending.resolve(payload);
+        }
+        return true;
+    }
+
+    _dispatch(message) {
+        const callbacks = this.subscribers.get(message.topic);
+        if (callbacks) {
+            for (const cb of callbacks) this._deliver(cb, message);
+        }
+        if (this.patterns.size > 0) {
+            this.patterns.match(message.topic, cb => this._deliver(cb, message));
+        }
+    }
+
+    _deliver(callback, message) {
+        try {
+            callback(message);
+        } catch (err) {
+            console.error(`[UMB] Subscriber error on ${message.topic}:`, err);
+        }
+    }
+
     /**
      * Start a data stream
-     * @param {string} sourceId 
-     * @param {string} targetId 
+     * @param {string} sourceId
+     * @param {string} targetId
+     * @param {object} [options] - { highWaterMark, batchBytes, window } (see umbStream.js)
      * @returns {string} streamId
      */
-    createStream(sourceId, targetId) {
-        const streamId = uuidv4();
-        this.streams.set(streamId, {
-            id: streamId,
-            source: sourceId,
-            target: targetId,
-            active: true,
-            created: Date.now()
-        });
+    createStream(sourceId, targetId, options = {}) {
+        const streamId = `${ID_PREFIX}-s${++streamSeq}`;
+        const stream = new UMBStream(streamId, sourceId, targetId, options);
+        stream.once('finish', () => this.streams.delete(streamId));
+        this.streams.set(streamId, stream);
         console.log(`[UMB] Stream created: ${streamId} (${sourceId} -> ${targetId})`);
         return streamId;
     }
 
+    _getStream(streamId) {
+        const stream = this.streams.get(streamId);
+        if (!stream) {
+            throw new Error(`Stream ${streamId} not found`);
+        }
+        return stream;
+    }
+
     /**
      * Push data to a stream
-     * @param {string} streamId 
-     * @param {Buffer|string} chunk 
+     * @param {string} streamId
+     * @param {Buffer|string} chunk
+     * @returns {boolean} false when the stream is over its high-water mark;
+     *   wait for the stream's 'drain' (see onStreamDrain) before pushing more
      */
     streamPush(streamId, chunk) {
-        if (!this.streams.has(streamId)) {
-            throw new Error(`Stream ${streamId} not found`);
-        }
-        this.emit(`stream:${streamId}`, { streamId, chunk, timestamp: Date.now() });
+        return this._getStream(streamId).write(chunk);
     }
 
     /**
-     * Close a stream
-     * @param {string} streamId 
+     * Call `callback` once the stream drops below its high-water mark
+     * @param {string} streamId
+     * @param {function} callback
+     */
+    onStreamDrain(streamId, callback) {
+        this._getStream(streamId).once('drain', callback);
+    }
+
+    /**
+     * Attach a credit-based consumer to a stream. `onBatch({ seq, chunks, bytes })`
+     * is called in order while the consumer has credit; call `consumer.grant(n)`
+     * to receive more. Returns the consumer (use `consumer.detach()` to stop).
+     * @param {string} streamId
+     * @param {object} options - { onBatch, onEnd, window, canReceive }
+     */
+    consumeStream(streamId, options) {
+        return this._getStream(streamId).addConsumer(options);
+    }
+
+    /**
+     * Read a stream as a Node Readable (object mode, one chunk per read).
+     * Also usable with `for await (const chunk of umb.createReadStream(id))`.
+     * @param {string} streamId
+     * @param {object} [options] - { window, highWaterMark }
+     * @returns {Readable}
+     */
+    createReadStream(streamId, options = {}) {
+        const stream = this._getStream(streamId);
+        let consumer = null;
+        const readable = new Readable({
+            objectMode: true,
+            highWaterMark: options.highWaterMark || 64,
+            read() {
+                // Ask for one more batch once the current credit is used up
+                if (consumer && consumer.credit === 0) consumer.grant(1);
+            },
+            destroy(err, callback) {
+                if (consumer) consumer.detach();
+                callback(err);
+            }
+        });
+        consumer = stream.addConsumer({
+            window: options.window,
+            onBatch: (batch) => {
+                for (const chunk of batch.chunks) readable.push(chunk);
+            },
+            onEnd: () => readable.push(null)
+        });
+        return readable;
+    }
+
+    /**
+     * Write to a stream through a Node Writable; respects the stream's
+     * high-water mark and ends the stream on `end()`.
+     * @param {string} streamId
+     * @returns {Writable}
+     */
+    createWriteStream(streamId) {
+        const stream = this._getStream(streamId);
+        return new Writable({
+            objectMode: true,
+            write(chunk, encoding, callback) {
+                if (stream.write(chunk)) callback();
+                else stream.once('drain', () => callback());
+            },
+            final(callback) {
+                stream.end();
+                callback();
+            }
+        });
+    }
+
+    /**
+     * Close a stream. Consumers still receive everything already pushed.
+     * @param {string} streamId
      */
     streamClose(streamId) {
-        if (this.streams.has(streamId)) {
+        const stream = this.streams.get(streamId);
+        if (stream) {
             this.emit(`stream:${streamId}:end`, { streamId });
-            this.streams.delete(streamId);
+            if (stream.consumers.size === 0) {
+                stream.destroy();
+                this.streams.delete(streamId);
+            } else {
+                stream.end();
+            }
             console.log(`[UMB] Stream closed: ${streamId}`);
         }
     }
 
     _createMessage(topic, payload, type, metadata) {
-        return {
-            id: uuidv4(),
-            topic,
-            type, // 'event', 'request', 'response'
-            timestamp: new Date().toISOString(),
-            payload,
-            metadata
-        };
+        return new UMBMessage(topic, payload, type, metadata);
     }
 }
 
 module.exports = new UMB();
+module.exports.UMB = UMB;
+module.exports.UMBMessage = UMBMessage;
@@ -0,0 +1,238 @@
+/**
+ * UMB Stream
+ * Flow-controlled, ordered data stream between a producer and consumers.
+ *
+ * Chunks written in the same tick (or until `batchBytes`) are coalesced into
+ * one batch with a sequence number. Each consumer has a credit window counted
+ * in batches: a batch is delivered only while the consumer has credit, and the
+ * consumer grants more as it finishes. A batch is freed once every consumer
+ * has received it. write() returns false once `highWaterMark` bytes are
+ * buffered; the producer should wait for 'drain'.
+ */
+
+const EventEmitter = require('events');
+const config = require('../config/config');
+
+const DEFAULTS = {
+    highWaterMark: config.umb.streamHighWaterMark,
+    batchBytes: config.umb.streamBatchBytes,
+    window: config.umb.streamWindow
+};
+
+function chunkSize(chunk) {
+    if (chunk == null) return 0;
+    if (typeof chunk === 'string') return Buffer.byteLength(chunk);
+    if (typeof chunk.byteLength === 'number') return chunk.byteLength;
+    if (typeof chunk.length === 'number') return chunk.length;
+    return 64; // rough size for plain objects; avoids serializing them here
+}
+
+class StreamConsumer {
+    constructor(stream, options) {
+        this.stream = stream;
+        this.cursor = stream.baseSeq; // next batch seq to deliver
+        this.credit = options.window !== undefined ? options.window : stream.options.window;
+        this.onBatch = options.onBatch;
+        this.onEnd = options.onEnd || null;
+        this.canReceive = options.canReceive || null; // extra gate, e.g. socket buffer
+        this.ended = false;
+    }
+
+    /**
+     * Allow `n` more batches to be delivered.
+     */
+    grant(n = 1) {
+        this.credit += n;
+        this.stream.pump();
+    }
+
+    detach() {
+        this.stream.removeConsumer(this);
+    }
+}
+
+class UMBStream extends EventEmitter {
+    /**
+     * @param {string} id
+     * @param {string} source
+     * @param {string} target
+     * @param {Object} [options] - { highWaterMark, batchBytes, window }
+     */
+    constructor(id, source, target, options = {}) {
+        super();
+        this.id = id;
+        this.source = source;
+        this.target = target;
+        this.created = Date.now();
+        this.options = { ...DEFAULTS, ...options };
+
+        this.pending = [];       // chunks not yet sealed into a batch
+        this.pendingBytes = 0;
+        this.sealScheduled = false;
+
+        this.queue = [];         // sealed batches not yet received by every consumer
+        this.queuedBytes = 0;
+        this.baseSeq = 0;        // seq of queue[0]
+        this.nextSeq = 0;
+
+        this.consumers = new Set();
+        this.ended = false;
+        this.finished = false;
+        this.needDrain = false;
+        this.retryTimer = null;
+        this.stats = { chunks: 0, batches: 0, bytes: 0 };
+    }
+
+    get active() {
+        return !this.ended;
+    }
+
+    get bufferedBytes() {
+        return this.queuedBytes + this.pendingBytes;
+    }
+
+    /**
+     * Queue a chunk. Returns false when the producer should wait for 'drain'.
+     */
+    write(chunk) {
+        if (this.ended) {
+            throw new Error(`Stream ${this.id} is closed`);
+        }
+        const size = chunkSize(chunk);
+        this.pending.push(chunk);
+        this.pendingBytes += size;
+        this.stats.chunks++;
+        this.stats.bytes += size;
+
+        if (this.pendingBytes >= this.options.batchBytes) {
+            this.seal();
+        } else if (!this.sealScheduled) {
+            this.sealScheduled = true;
+            setImmediate(() => this.seal());
+        }
+
+        if (this.bufferedBytes >= this.options.highWaterMark) {
+            this.needDrain = true;
+            return false;
+        }
+        return true;
+    }
+
+    seal() {
+        this.sealScheduled = false;
+        if (this.pending.length === 0) return;
+        const batch = { streamId: this.id, seq: this.nextSeq++, chunks: this.pending, bytes: this.pendingBytes };
+        this.pending = [];
+        this.pendingBytes = 0;
+        this.queue.push(batch);
+        this.queuedBytes += batch.bytes;
+        this.stats.batches++;
+        this.pump();
+    }
+
+    /**
+     * Finish the stream; consumers get 'end' after the last batch.
+     */
+    end() {
+        if (this.ended) return;
+        this.seal();
+        this.ended = true;
+        this.pump();
+    }
+
+    addConsumer(options) {
+        const consumer = new StreamConsumer(this, options);
+        this.consumers.add(consumer);
+        this.pump();
+        return consumer;
+    }
+
+    removeConsumer(consumer) {
+        if (this.consumers.delete(consumer)) this.pump();
+    }
+
+    pump() {
+        let blocked = false;
+        for (const consumer of this.consumers) {
+            while (consumer.credit > 0 && consumer.cursor < this.nextSeq) {
+                if (consumer.canReceive && !consumer.canReceive()) {
+                    blocked = true;
+                    break;
+                }
+                const batch = this.queue[consumer.cursor - this.baseSeq];
+                consumer.cursor++;
+                consumer.credit--;
+                consumer.onBatch(batch);
+            }
+            if (this.ended && !consumer.ended && consumer.cursor === this.nextSeq && this.pending.length === 0) {
+                consumer.ended = true;
+                if (consumer.onEnd) consumer.onEnd();
+            }
+        }
+        this.trim();
+
+        // A consumer gated on something without an event (socket buffer): poll
+        if (blocked && !this.retryTimer) {
+            this.retryTimer = setTimeout(() => {
+                this.retryTimer = null;
+                this.pump();
+            }, 10);
+        }
+    }
+
+    trim() {
+        // Without consumers, keep data until one attaches (bounded by highWaterMark)
+        if (this.consumers.size === 0) return;
+        let minCursor = Infinity;
+        for (const consumer of this.consumers) {
+            if (consumer.cursor < minCursor) minCursor = consumer.cursor;
+        }
+        while (this.queue.length && this.baseSeq < minCursor) {
+            this.queuedBytes -= this.queue.shift().bytes;
+            this.baseSeq++;
+        }
+
+        if (this.needDrain && this.bufferedBytes < this.options.highWaterMark) {
+            this.needDrain = false;
+            this.emit('drain');
+        }
+        if (this.ended && !this.finished && this.queue.length === 0 && [...this.consumers].every(c => c.ended)) {
+            this.finished = true;
+            this.emit('finish');
+        }
+    }
+
+    /**
+     * Drop everything and close, e.g. when the producer goes away.
+     */
+    destroy() {
+        this.pending = [];
+        this.pendingBytes = 0;
+        this.queue = [];
+        this.queuedBytes = 0;
+        this.baseSeq = this.nextSeq;
+        for (const consumer of this.consumers) consumer.cursor = this.nextSeq;
+        this.end();
+        if (this.retryTimer) clearTimeout(this.retryTimer);
+    }
+
+    info() {
+        return {
+            id: this.id,
+            source: this.source,
+            target: this.target,
+            active: this.active,
+            created: this.created,
+            consumers: this.consumers.size,
+            bufferedBytes: this.bufferedBytes,
+            nextSeq: this.nextSeq,
+            ...this.stats
+        };
+    }
+}
+
+module.exports = {
+    UMBStream,
+    StreamConsumer,
+    chunkSize
+};
@@ -1,14 +1,38 @@
+const crypto = require('crypto');
 const logger = require('../logger');
+const { canonicalJSON } = require('../resultCache');
+
+// Legacy ordering for workflows that have no connections
+const TYPE_ORDER = { source: 0, transform: 1, validate: 2, route: 3, target: 4 };
+
+const DEFAULT_CONCURRENCY = 4;
+const DEFAULT_MEMO_SIZE = 1000;
 
 /**
  * Workflow Engine v8
- * Executes visual workflows and integrates with pipeline engine
+ * Executes visual workflows and integrates with pipeline engine.
+ *
+ * Workflows are DAGs built from `connections` ({ from, to }). Nodes run as
+ * soon as all their parents finished, up to `concurrency` at a time. A node
+ * with one parent receives that parent's output; a fan-in node receives
+ * `{ [parentId]: output }`; root nodes receive the workflow input. Nodes
+ * marked `deterministic: true` (or `config.memoize: true`) are memoized by
+ * a hash of their definition and input.
  */
 class WorkflowEngine {
-    constructor(pipelineEngine, smartRouter) {
+    /**
+     * @param {Object} pipelineEngine
+     * @param {Object} smartRouter
+     * @param {Object} [options] - { concurrency, memoSize }
+     */
+    constructor(pipelineEngine, smartRouter, options = {}) {
         this.pipelineEngine = pipelineEngine;
         this.smartRouter = smartRouter;
         this.workflows = new Map();
+        this.concurrency = options.concurrency || DEFAULT_CONCURRENCY;
+        this.memoSize = options.memoSize !== undefined ? options.memoSize : DEFAULT_MEMO_SIZE;
+        this.memo = new Map(); // input hash -> result, oldest first
+        this.memoStats = { hits: 0, misses: 0 };
     }
 
     /**
@@ -36,8 +60,11 @@ class WorkflowEngine {
 
     /**
      * Execute a workflow
+     * @param {string} workflowName
+     * @param {any} initialData - Input for root nodes
+     * @param {Object} [options] - { concurrency }
      */
-    async executeWorkflow(workflowName, initialData) {
+    async executeWorkflow(workflowName, initialData, options = {}) {
         const workflow = this.workflows.get(workflowName);
         if (!workflow) {
             throw new Error(`Workflow '${workflowName}' not found`);
@@ -46,31 +73,96 @@ class WorkflowEngine {
         logger.info(`[WorkflowEngine] Executing workflow: ${workflowName}`);
 
         const { graph } = workflow;
+        const limit = Math.max(1, options.concurrency || this.concurrency);
         const results = new Map(); // nodeId -> result
-        let currentData = initialData;
-
-        // Topological execution
-        for (const node of graph.executionOrder) {
-            logger.debug(`[WorkflowEngine] Executing node: ${node.id}`);
+        const remaining = new Map(graph.executionOrder.map(n => [n.id, graph.parents.get(n.id).length]));
+        const ready = graph.executionOrder.filter(n => remaining.get(n.id) === 0);
+        let running = 0;
+        let failure = null;
+
+        await new Promise((resolve) => {
+            const launch = () => {
+                while (!failure && running < limit && ready.length) {
+                    const node = ready.shift();
+                    running++;
+                    logger.debug(`[WorkflowEngine] Executing node: ${node.id}`);
+
+                    this.runNode(node, this.nodeInput(graph, node, results, initialData))
+                        .then(result => {
+                            results.set(node.id, result);
+                            for (const childId of graph.children.get(node.id)) {
+                                const left = remaining.get(childId) - 1;
+                                remaining.set(childId, left);
+                                if (left === 0) ready.push(graph.nodes.get(childId));
+                            }
+                        })
+                        .catch(err => {
+                            logger.error(`[WorkflowEngine] Node ${node.id} failed:`, err);
+                            if (!failure) failure = new Error(`Workflow failed at node ${node.id}: ${err.message}`);
+                        })
+                        .finally(() => {
+                            running--;
+                            launch();
+                        });
+                }
+                if (running === 0) resolve();
+            };
+            launch();
+        });
 
-            try {
-                const result = await this.executeNode(node, currentData);
-                results.set(node.id, result);
-                currentData = result; // Pass result to next node
+        if (failure) throw failure;
 
-            } catch (err) {
-                logger.error(`[WorkflowEngine] Node ${node.id} failed:`, err);
-                throw new Error(`Workflow failed at node ${node.id}: ${err.message}`);
-            }
-        }
+        const sinks = graph.sinks;
+        const finalResult = sinks.length === 1
+            ? results.get(sinks[0])
+            : Object.fromEntries(sinks.map(id => [id, results.get(id)]));
 
         return {
             success: true,
-            finalResult: currentData,
+            finalResult,
             nodeResults: Object.fromEntries(results)
         };
     }
 
+    /**
+     * Input for a node: the workflow input for roots, the parent's output for
+     * a single parent, or `{ [parentId]: output }` for fan-in.
+     */
+    nodeInput(graph, node, results, initialData) {
+        const parents = graph.parents.get(node.id);
+        if (parents.length === 0) return initialData;
+        if (parents.length === 1) return results.get(parents[0]);
+        return Object.fromEntries(parents.map(id => [id, results.get(id)]));
+    }
+
+    /**
+     * Execute a node, going through the memo for deterministic nodes.
+     */
+    async runNode(node, inputData) {
+        const memoize = this.memoSize > 0 && (node.deterministic === true || node.config?.memoize === true);
+        if (!memoize) return this.executeNode(node, inputData);
+
+        const key = crypto.createHash('sha256')
+            .update(canonicalJSON({ type: node.type, config: node.config, input: inputData }))
+            .digest('hex');
+
+        if (this.memo.has(key)) {
+            const cached = this.memo.get(key);
+            this.memo.delete(key);      // refresh LRU position
+            this.memo.set(key, cached);
+            this.memoStats.hits++;
+            return cached;
+        }
+
+        this.memoStats.misses++;
+        const result = await this.executeNode(node, inputData);
+        this.memo.set(key, result);
+        if (this.memo.size > this.memoSize) {
+            this.memo.delete(this.memo.keys().next().value);
+        }
+        return result;
+    }
+
     /**
      * Execute a single node
      */
@@ -181,16 +273,51 @@ class WorkflowEngine {
      * Build execution graph with topological order
      */
     buildExecutionGraph(nodes, connections = []) {
-        // For simplicity, assume linear execution for now
-        // In real implementation, use topological sort for DAG
+        const byId = new Map();
+        for (const node of nodes) {
+            if (!node.id) throw new Error('Invalid workflow definition: node without id');
+            if (byId.has(node.id)) throw new Error(`Invalid workflow definition: duplicate node ${node.id}`);
+            byId.set(node.id, node);
+        }
 
-        const executionOrder = nodes.sort((a, b) => {
-            // Source first, target last
-            const typeOrder = { source: 0, transform: 1, validate: 2, route: 3, target: 4 };
-            return (typeOrder[a.type] || 99) - (typeOrder[b.type] || 99);
-        });
+        let edges = (connections || []).map(c => [c.from, c.to]);
+        if (edges.length === 0) {
+            // No connections: chain the nodes by type (source first, target last)
+            const chain = [...nodes].sort((a, b) => (TYPE_ORDER[a.type] ?? 99) - (TYPE_ORDER[b.type] ?? 99));
+            edges = chain.slice(1).map((node, i) => [chain[i].id, node.id]);
+        }
+
+        const parents = new Map(nodes.map(n => [n.id, []]));
+        const children = new Map(nodes.map(n => [n.id, []]));
+        for (const [from, to] of edges) {
+            if (!byId.has(from) || !byId.has(to)) {
+                throw new Error(`Invalid workflow connection: ${from} -> ${to}`);
+            }
+            if (!children.get(from).includes(to)) {
+                children.get(from).push(to);
+                parents.get(to).push(from);
+            }
+        }
+
+        // Kahn's algorithm; leftovers mean a cycle
+        const inDegree = new Map(nodes.map(n => [n.id, parents.get(n.id).length]));
+        const queue = nodes.filter(n => inDegree.get(n.id) === 0).map(n => n.id);
+        const executionOrder = [];
+        while (queue.length) {
+            const id = queue.shift();
+            executionOrder.push(byId.get(id));
+            for (const child of children.get(id)) {
+                inDegree.set(child, inDegree.get(child) - 1);
+                if (inDegree.get(child) === 0) queue.push(child);
+            }
+        }
+        if (executionOrder.length !== nodes.length) {
+            const cyclic = nodes.filter(n => inDegree.get(n.id) > 0).map(n => n.id);
+            throw new Error(`Invalid workflow definition: cycle through ${cyclic.join(', ')}`);
+        }
 
-        return { executionOrder, connections };
+        const sinks = executionOrder.filter(n => children.get(n.id).length === 0).map(n => n.id);
+        return { executionOrder, nodes: byId, parents, children, sinks, connections };
     }
 
     listWorkflows() {